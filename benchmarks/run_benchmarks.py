@@ -0,0 +1,284 @@
+"""Benchmarks of the scoring, transpile and training hot paths of the labs
+
+Every case uses fixed seeds and fake backends, so runs on one machine are
+comparable. Timings are written to JSON and, with ``--baseline``, compared
+against a stored run; the script exits with status 1 when a case is slower
+than the baseline by more than ``--tolerance``.
+
+Timings only mean something on the machine that recorded them, so the
+baseline is not checked in: record it locally before a change and compare
+after it. Each run stores the machine and library versions, and the
+comparison refuses a baseline recorded in a different environment.
+
+    python benchmarks/run_benchmarks.py --output benchmarks/baseline.json   # record baseline
+    python benchmarks/run_benchmarks.py --baseline benchmarks/baseline.json
+    python benchmarks/run_benchmarks.py --quick --output bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import warnings
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, "lab_2"), os.path.join(ROOT, "lab_4"), os.path.join(ROOT, "lab_3", "vqe")]
+
+SEED = 10000
+
+
+def bench_transpile_scoring(quick):
+    """``util.transpile_scoring`` on the lab 2 random circuit, scheduled with delays"""
+    from qiskit.circuit.random import random_circuit
+    from qiskit.transpiler.preset_passmanagers import generate_preset_pass_manager
+    from qiskit_ibm_runtime.fake_provider import FakeSherbrooke, FakeTorino
+    from util import transpile_scoring
+
+    qc = random_circuit(6, 4, measure=True, seed=SEED)
+    for backend in [FakeTorino(), FakeSherbrooke()]:
+        pm = generate_preset_pass_manager(backend=backend, optimization_level=3,
+                                          scheduling_method="asap", seed_transpiler=SEED,
+                                          timing_constraints=backend.target.timing_constraints())
+        isa = pm.run(qc)
+        layout = isa.layout.final_index_layout()
+        yield (f"transpile_scoring[{backend.name}]",
+               lambda isa=isa, layout=layout, backend=backend: transpile_scoring(isa, layout, backend), {
+                   "size": isa.size(),
+               })
+
+
+def bench_preset_pass_managers(quick):
+    """Preset pass managers per optimization level and per layout/routing plugin"""
+    from qiskit.circuit.library import EfficientSU2
+    from qiskit.transpiler.preset_passmanagers import generate_preset_pass_manager
+    from qiskit.transpiler.preset_passmanagers.plugin import list_stage_plugins
+    from qiskit_ibm_runtime.fake_provider import FakeOsaka
+
+    backend = FakeOsaka()
+    circuit = EfficientSU2(21, entanglement="circular", reps=1).decompose()
+    circuit.assign_parameters(np.random.default_rng(SEED).uniform(0, 2 * np.pi, circuit.num_parameters),
+                              inplace=True)
+    configs = [(f"level={level}", {"optimization_level": level}) for level in range(4)]
+    if not quick:
+        configs += [(f"layout={option}", {"optimization_level": 3, "layout_method": option})
+                    for option in list_stage_plugins("layout")]
+        configs += [(f"routing={option}", {"optimization_level": 3, "routing_method": option})
+                    for option in list_stage_plugins("routing") if option != "none"]
+    for name, kwargs in configs:
+        pm = generate_preset_pass_manager(backend=backend, seed_transpiler=SEED, **kwargs)
+        yield f"preset_pm[{name}]", lambda pm=pm, circuit=circuit: pm.run(circuit), _isa_info(pm.run(circuit))
+
+
+def bench_efficient_su2(quick):
+    """Level 3 transpilation of the lab 3 circular EfficientSU2 circuits"""
+    from qiskit.circuit.library import EfficientSU2
+    from qiskit.transpiler.preset_passmanagers import generate_preset_pass_manager
+    from qiskit_ibm_runtime.fake_provider import FakeSherbrooke
+
+    pm = generate_preset_pass_manager(backend=FakeSherbrooke(), optimization_level=3, seed_transpiler=SEED)
+    for num_qubits in [11, 21] if quick else [11, 21, 41, 61, 81]:
+        circuit = EfficientSU2(num_qubits, entanglement="circular", reps=1).decompose()
+        yield f"efficient_su2[{num_qubits}]", lambda pm=pm, circuit=circuit: pm.run(circuit), _isa_info(pm.run(circuit))
+
+
+def bench_vqe_iteration(quick):
+    """One VQE cost evaluation through ``vqe.run`` on the lab 3 TwoLocal ansatz"""
+    from qiskit.circuit.library import TwoLocal
+    from qiskit.quantum_info import SparsePauliOp
+    from qiskit.transpiler.preset_passmanagers import generate_preset_pass_manager
+    from qiskit_aer import AerSimulator
+    from qiskit_ibm_runtime import EstimatorV2 as Estimator
+    from qiskit_ibm_runtime.fake_provider import FakeTorino
+    import vqe
+
+    ansatz = TwoLocal(3, ["ry", "rz"], "cz", "full", reps=1, insert_barriers=True)
+    pm = generate_preset_pass_manager(backend=FakeTorino(), optimization_level=2, seed_transpiler=SEED)
+    isa = pm.run(ansatz)
+    hamiltonian = SparsePauliOp(["ZII", "IZI", "IIZ"]).apply_layout(layout=isa.layout)
+    params = np.random.default_rng(SEED).uniform(0, 2 * np.pi, ansatz.num_parameters)
+    callback_dict = vqe.new_callback_dict()
+    for method in ["statevector", "density_matrix"]:
+        estimator = Estimator(backend=AerSimulator(method=method, seed_simulator=SEED))
+        yield (f"vqe_iteration[{method}]",
+               lambda estimator=estimator: vqe.run(params, isa, hamiltonian, estimator, callback_dict), {})
+
+
+def bench_vqc_cost(quick):
+    """One lab 4 VQC cost evaluation over the ten birds"""
+    import pandas as pd
+    from qiskit import QuantumCircuit
+    from qiskit.circuit.library import RealAmplitudes
+    from qiskit.primitives import StatevectorEstimator
+    from qiskit.providers.fake_provider import GenericBackendV2
+    from qiskit.quantum_info import SparsePauliOp
+    from qiskit.transpiler.preset_passmanagers import generate_preset_pass_manager
+    from embedding import compile_embedding
+
+    dataset = pd.read_csv(os.path.join(ROOT, "lab_4", "birds_dataset.csv"))
+    list_coefficients = [np.array(row, dtype=np.complex128) for row in dataset.values[:, 1:]]
+    list_labels = [1] * 5 + [0] * 5
+    ansatz = RealAmplitudes(num_qubits=5, reps=1, entanglement="full")
+    obs = SparsePauliOp("ZZZZZ")
+    params = np.load(os.path.join(ROOT, "lab_4", "opt_params_shallow_VQC.npy"))
+    pm = generate_preset_pass_manager(optimization_level=3, backend=GenericBackendV2(num_qubits=5, seed=SEED),
+                                      seed_transpiler=SEED)
+    estimator = StatevectorEstimator(seed=SEED)
+
+    def initialize(amplitudes):
+        qc = QuantumCircuit(5)
+        qc.initialize(amplitudes)
+        return qc
+
+    for name, embed in [("initialize", initialize), ("compile_embedding", compile_embedding)]:
+        def cost(embed=embed):
+            # Transpiles every classifier per evaluation, as the lab's cost_func does
+            pubs = []
+            for amplitudes in list_coefficients:
+                transpiled = pm.run(embed(amplitudes).compose(ansatz))
+                pubs.append((transpiled, obs.apply_layout(layout=transpiled.layout), params))
+            evs = np.array([float(result.data.evs) for result in estimator.run(pubs).result()])
+            return float(np.sum(np.abs(evs - list_labels)))
+
+        yield f"vqc_cost[{name}]", cost, {"cost": round(cost(), 6)}
+
+
+BENCHMARKS = {
+    "transpile_scoring": bench_transpile_scoring,
+    "preset_pass_managers": bench_preset_pass_managers,
+    "efficient_su2": bench_efficient_su2,
+    "vqe_iteration": bench_vqe_iteration,
+    "vqc_cost": bench_vqc_cost,
+}
+
+
+def _isa_info(circuit):
+    return {
+        "depth_2q": circuit.depth(lambda x: len(x.qubits) == 2),
+        "num_2q": circuit.num_nonlocal_gates(),
+    }
+
+
+def time_case(func, repeat):
+    """Return the per-call timings of ``func`` after one warm-up call"""
+    func()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def run(names, quick=False, repeat=3):
+    """Run the selected benchmark groups
+
+    Parameters:
+        names (list): Keys of ``BENCHMARKS`` to run
+        quick (bool): Use the smaller problem sizes only
+        repeat (int): Timed calls per case
+
+    Returns:
+        dict: Environment metadata and, per case, min/median seconds plus
+        case-specific info such as 2q depth
+    """
+    import qiskit
+    import qiskit_aer
+    import qiskit_ibm_runtime
+
+    cases = {}
+    for name in names:
+        for case, func, info in BENCHMARKS[name](quick):
+            timings = time_case(func, repeat)
+            cases[case] = {"min": min(timings), "median": statistics.median(timings), "info": info}
+            print(f"{case:45s} {cases[case]['min']:9.4f} s", flush=True)
+    return {
+        "meta": {
+            "machine": platform.node(),
+            "processor": platform.processor() or platform.machine(),
+            "cpu_count": os.cpu_count(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "qiskit": qiskit.__version__,
+            "qiskit_aer": qiskit_aer.__version__,
+            "qiskit_ibm_runtime": qiskit_ibm_runtime.__version__,
+            "quick": quick,
+            "repeat": repeat,
+        },
+        "cases": cases,
+    }
+
+
+ENVIRONMENT = ["machine", "processor", "cpu_count", "python", "qiskit", "qiskit_aer", "qiskit_ibm_runtime"]
+
+
+def environment_mismatch(results, baseline):
+    """List the environment fields in which two runs differ
+
+    Parameters:
+        results (dict): Output of ``run``
+        baseline (dict): Stored output of ``run``
+
+    Returns:
+        list: ``(field, baseline value, current value)`` per differing field
+    """
+    return [(key, baseline["meta"].get(key), results["meta"][key])
+            for key in ENVIRONMENT if baseline["meta"].get(key) != results["meta"][key]]
+
+
+def compare(results, baseline, tolerance):
+    """Compare minimum timings with a baseline run
+
+    Parameters:
+        results (dict): Output of ``run``
+        baseline (dict): Stored output of ``run``
+        tolerance (float): Allowed relative slowdown, e.g. 0.25 for 25%
+
+    Returns:
+        list: Names of the cases slower than the baseline beyond tolerance
+    """
+    regressions = []
+    for case, current in results["cases"].items():
+        if case not in baseline["cases"]:
+            continue
+        ratio = current["min"] / baseline["cases"][case]["min"]
+        flag = ""
+        if ratio > 1 + tolerance:
+            regressions.append(case)
+            flag = "REGRESSION"
+        print(f"{case:45s} {ratio:6.2f}x baseline {flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", nargs="+", choices=list(BENCHMARKS), default=list(BENCHMARKS))
+    parser.add_argument("--quick", action="store_true", help="smaller problem sizes only")
+    parser.add_argument("--repeat", type=int, default=3, help="timed calls per case")
+    parser.add_argument("--output", help="JSON file to write the results to")
+    parser.add_argument("--baseline", help="JSON results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative slowdown")
+    args = parser.parse_args()
+
+    warnings.filterwarnings("ignore")
+    results = run(args.only, quick=args.quick, repeat=args.repeat)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        mismatch = environment_mismatch(results, baseline)
+        if mismatch:
+            for key, recorded, current in mismatch:
+                print(f"Baseline {key} is {recorded}, this run has {current}")
+            sys.exit("Baseline was recorded in a different environment; record a new one locally")
+        if compare(results, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+import copy
+
+from qiskit.circuit.library import XGate, YGate
+from qiskit.converters import circuit_to_dag, dag_to_circuit
+from qiskit.passmanager.compilation_status import PropertySet
+from qiskit.transpiler import InstructionProperties
+from qiskit.transpiler.passes import ConstrainedReschedule, PadDelay, TimeUnitConversion
+from qiskit.transpiler.passes.scheduling import ALAPScheduleAnalysis, ASAPScheduleAnalysis, PadDynamicalDecoupling
+from qiskit.transpiler.passes.scheduling.padding.base_padding import BasePadding
+
+from util import fast_scoring, fidelity_table, spawn_pool, timing_table
+
+# DD engine of the current process: set by _init_worker in a worker, or by
+# score_dd itself when it runs in-process
+_worker = {}
+
+
+def dd_backend(backend, gates=(YGate(),), like="x"):
+    """Copy of a backend whose target also offers the given DD gates
+
+    Replaces the lab's per-qubit loop that copies the ``x`` properties into a
+    new ``YGate`` entry with a single ``add_instruction`` call on a copy, so the
+    caller's backend is left untouched.
+
+    Parameters:
+        backend (BackendV2): Backend of interest, e.g. ``FakeTorino()``
+        gates (tuple): Gates to add where missing
+        like (str): Instruction whose duration and error the new gates take
+
+    Returns:
+        BackendV2: The extended copy
+    """
+    backend = copy.deepcopy(backend)
+    target = backend.target
+    for gate in gates:
+        if gate.name in target.operation_names:
+            continue
+        properties = {
+            qargs: InstructionProperties(duration=props.duration, error=props.error)
+            for qargs, props in target[like].items()
+            if qargs is not None and props is not None
+        }
+        target.add_instruction(gate, properties)
+    return backend
+
+
+def dd_engine(backend, sequences=None, scheduling_method="asap"):
+    """Precompute everything needed to schedule and pad circuits for one backend
+
+    Parameters:
+        backend (BackendV2): Backend of interest; a copy extended by
+            ``dd_backend`` with every gate of the sequences is used
+        sequences (dict): Name to list of DD gates. ``None`` as a value (or
+            an empty list) pads with plain delays. Defaults to no DD, ``XX``
+            and the lab's ``XYXY``
+        scheduling_method (str): ``"asap"`` or ``"alap"``
+
+    Returns:
+        dict: Extended ``backend``, its ``timing`` table (``util.timing_table``),
+        ``fidelity`` table (``util.fidelity_table``), the scheduling passes and
+        one padding pass per sequence
+    """
+    if sequences is None:
+        sequences = {"none": None, "XX": [XGate(), XGate()], "XYXY": [XGate(), YGate(), XGate(), YGate()]}
+    gates = {gate.name: gate for sequence in sequences.values() for gate in sequence or []}
+    backend = dd_backend(backend, tuple(gates.values()))
+    target = backend.target
+    timing = timing_table(backend)
+
+    analysis = {"asap": ASAPScheduleAnalysis, "alap": ALAPScheduleAnalysis}[scheduling_method]
+    passes = [TimeUnitConversion(target=target), analysis(target=target)]
+    if timing["pulse_alignment"] != 1 or timing["acquire_alignment"] != 1:
+        passes.append(ConstrainedReschedule(acquire_alignment=timing["acquire_alignment"],
+                                            pulse_alignment=timing["pulse_alignment"]))
+    pads = {
+        name: _CachedPadDynamicalDecoupling(target=target, dd_sequence=list(sequence))
+        if sequence else PadDelay(target=target)
+        for name, sequence in sequences.items()
+    }
+    return {
+        "backend": backend,
+        "timing": timing,
+        "fidelity": fidelity_table(backend),
+        "schedule": passes,
+        "pads": pads,
+    }
+
+
+def pad_circuits(circuits, engine):
+    """Schedule each ISA circuit once and pad it with every sequence
+
+    Parameters:
+        circuits (list): Transpiled (physical) circuits, e.g. ``pm.run(qc)``
+        engine (dict): Output of ``dd_engine``
+
+    Returns:
+        list: One dict per circuit mapping sequence name to padded circuit
+    """
+    padded = []
+    for circ in circuits:
+        # Timing passes replace each op they annotate by a mutable copy, so the
+        # input circuit is safe without copying every operation up front
+        dag = circuit_to_dag(circ, copy_operations=False)
+        property_set = PropertySet()
+        for scheduling_pass in engine["schedule"]:
+            scheduling_pass.property_set = property_set
+            dag = scheduling_pass.run(dag) or dag
+        start_times = property_set["node_start_time"]
+
+        variants = {}
+        for name, pad in engine["pads"].items():
+            pad.property_set = PropertySet(property_set)
+            # Padding clears the start times it is given, so each pass gets a copy
+            pad.property_set["node_start_time"] = dict(start_times)
+            out = dag_to_circuit(pad.run(dag), copy_operations=False)
+            out._layout = circ.layout
+            variants[name] = out
+        padded.append(variants)
+    return padded
+
+
+def score_dd(circuits, engine=None, backend=None, sequences=None, scheduling_method="asap", max_workers=1):
+    """Pad circuits with several DD sequences and score every variant
+
+    Parameters:
+        circuits (list): Transpiled (physical) circuits
+        engine (dict): Output of ``dd_engine``, used in-process
+        backend (BackendV2): Backend to build the engine from when ``engine`` is
+            omitted or when running in worker processes
+        sequences (dict): DD sequences, see ``dd_engine``
+        scheduling_method (str): ``"asap"`` or ``"alap"``
+        max_workers (int): Number of worker processes, 1 runs in-process
+
+    Returns:
+        list: One dict per circuit with ``circuits`` and ``fidelity`` (both keyed
+        by sequence name, fidelities from ``util.fast_scoring``) and the ``best``
+        sequence name
+    """
+    if max_workers == 1:
+        if engine is None:
+            engine = dd_engine(backend, sequences, scheduling_method)
+        _worker["engine"] = engine
+        return [_score_one(circ) for circ in circuits]
+
+    if backend is None:
+        raise ValueError("Parallel scoring needs the backend to build an engine in each worker")
+    # Each worker builds its engine once from the backend, not once per circuit
+    with spawn_pool(max_workers, _init_worker, (backend, sequences, scheduling_method)) as pool:
+        return pool.map(_score_one, circuits)
+
+
+def _init_worker(backend, sequences, scheduling_method):
+    _worker["engine"] = dd_engine(backend, sequences, scheduling_method)
+
+
+def _score_one(circ):
+    engine = _worker["engine"]
+    variants = pad_circuits([circ], engine)[0]
+    fidelity = {
+        name: fast_scoring(padded, engine["backend"], engine["fidelity"])
+        for name, padded in variants.items()
+    }
+    return {"circuits": variants, "fidelity": fidelity, "best": max(fidelity, key=fidelity.get)}
+
+
+class _CachedPadDynamicalDecoupling(PadDynamicalDecoupling):
+    """PadDynamicalDecoupling that validates and measures its sequence once per register
+
+    The parent recomputes the per-qubit sequence lengths from the target on
+    every run. ISA circuits of one backend share the same physical register,
+    so after the first run only the base padding checks are repeated.
+    """
+
+    def _pre_runhook(self, dag):
+        register = tuple(dag.qregs.values())
+        if getattr(self, "_prepared_for", None) == register:
+            BasePadding._pre_runhook(self, dag)
+            return
+        super()._pre_runhook(dag)
+        self._prepared_for = register
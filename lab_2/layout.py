@@ -0,0 +1,254 @@
+import numpy as np
+import rustworkx as rx
+
+from util import qubit_error
+
+
+def interaction_graph(circ):
+    """Count the gates acting on each qubit and on each pair of qubits
+
+    Gates on three or more qubits count once for every pair they touch.
+
+    Parameters:
+        circ (QuantumCircuit): Circuit of interest
+
+    Returns:
+        dict: ``edges`` (pairs x 2 virtual qubits), ``counts`` (2q gates per
+        pair), ``single`` (1q gates per qubit), ``measured`` (bool per qubit)
+        and ``depth`` of the circuit
+    """
+    pairs = {}
+    single = np.zeros(circ.num_qubits)
+    measured = np.zeros(circ.num_qubits, dtype=bool)
+    for item in circ.data:
+        if item.operation.name in ("barrier", "delay"):
+            continue
+        qubits = [circ.find_bit(q).index for q in item.qubits]
+        if item.operation.name == "measure":
+            measured[qubits[0]] = True
+        elif len(qubits) == 1:
+            single[qubits[0]] += 1
+        for k, a in enumerate(qubits):
+            for b in qubits[k + 1:]:
+                key = (min(a, b), max(a, b))
+                pairs[key] = pairs.get(key, 0) + 1
+    return {
+        "edges": np.array(list(pairs), dtype=np.int64).reshape(-1, 2),
+        "counts": np.array(list(pairs.values()), dtype=float),
+        "single": single,
+        "measured": measured,
+        "depth": circ.depth(),
+    }
+
+
+def error_model(backend):
+    """Gather the backend error rates into arrays for vectorized scoring
+
+    Parameters:
+        backend (BackendV2): Backend of interest
+
+    Returns:
+        dict: ``cx_error`` (qubits x qubits, symmetric, 1 off the coupling
+        map), ``sx_error``, ``readout_error``, ``t1`` and ``t2`` per qubit,
+        ``gate_time`` (mean 2q gate duration in seconds) and the undirected
+        coupling ``graph``
+    """
+    target = backend.target
+    num_qubits = backend.num_qubits
+    cx_error = np.ones((num_qubits, num_qubits))
+    durations = []
+    two_qubit = [name for name in target.operation_names if target.operation_from_name(name).num_qubits == 2]
+    for name in two_qubit:
+        for qargs, props in target[name].items():
+            if qargs is None or props is None:
+                continue
+            a, b = qargs
+            error = props.error or 0.0
+            cx_error[a, b] = cx_error[b, a] = min(cx_error[a, b], error)
+            if props.duration:
+                durations.append(props.duration)
+
+    def per_qubit(name, default=0.0):
+        values = np.full(num_qubits, default)
+        if name in target:
+            for qargs, props in target[name].items():
+                if qargs is not None and props is not None and props.error is not None:
+                    values[qargs[0]] = props.error
+        return values
+
+    properties = [backend.qubit_properties(q) for q in range(num_qubits)]
+    graph = backend.coupling_map.graph.to_undirected(multigraph=False)
+    return {
+        "cx_error": cx_error,
+        "sx_error": per_qubit("sx"),
+        "readout_error": per_qubit("measure"),
+        "t1": np.array([p.t1 if p and p.t1 else np.inf for p in properties]),
+        "t2": np.array([p.t2 if p and p.t2 else np.inf for p in properties]),
+        "gate_time": float(np.mean(durations)) if durations else 0.0,
+        "graph": graph,
+        "distance": rx.distance_matrix(graph),
+    }
+
+
+def score_layouts(layouts, interactions, model):
+    """Estimated log-fidelity of placing the circuit on each candidate layout
+
+    Gates between adjacent physical qubits pay their edge error. A gate
+    between distant qubits is charged three CX errors per SWAP at the mean
+    error of the device. Every qubit pays its 1q and readout errors plus T1/T2
+    decay over ``depth`` two-qubit gate times.
+
+    Parameters:
+        layouts (ndarray): Candidates x virtual qubits array of physical qubits
+        interactions (dict): Output of ``interaction_graph``
+        model (dict): Output of ``error_model``
+
+    Returns:
+        ndarray: Log-fidelity of every candidate, higher is better
+    """
+    layouts = np.atleast_2d(layouts)
+    cx_error = model["cx_error"]
+    mean_error = cx_error[cx_error < 1].mean()
+    score = np.zeros(len(layouts))
+
+    if len(interactions["edges"]):
+        a = layouts[:, interactions["edges"][:, 0]]
+        b = layouts[:, interactions["edges"][:, 1]]
+        hops = model["distance"][a, b]
+        edge_error = np.where(hops == 1, cx_error[a, b], mean_error)
+        gates = 1 + 3 * np.maximum(hops - 1, 0)
+        score += (interactions["counts"] * gates * np.log1p(-np.minimum(edge_error, 1 - 1e-12))).sum(axis=1)
+
+    score += (interactions["single"] * np.log1p(-model["sx_error"][layouts])).sum(axis=1)
+    score += (interactions["measured"] * np.log1p(-model["readout_error"][layouts])).sum(axis=1)
+    duration = interactions["depth"] * model["gate_time"]
+    idle = qubit_error(duration, model["t1"][layouts], model["t2"][layouts])
+    score += np.log1p(-np.minimum(idle, 1 - 1e-12)).sum(axis=1)
+    return score
+
+
+def candidate_layouts(circ, backend, model=None, max_candidates=20000, call_limit=None):
+    """Enumerate placements of the circuit qubits on the device
+
+    Exact embeddings of the interaction graph into the coupling map are
+    enumerated with VF2. If there are none, a placement is grown from every
+    physical qubit instead, each virtual qubit going next to its already
+    placed neighbours.
+
+    Parameters:
+        circ (QuantumCircuit): Circuit of interest
+        backend (BackendV2): Backend of interest
+        model (dict): Output of ``error_model``, computed if omitted
+        max_candidates (int): Largest number of VF2 mappings kept
+        call_limit (int): VF2 state visits per search, unlimited if omitted
+
+    Returns:
+        ndarray: Candidates x virtual qubits array of physical qubits
+    """
+    model = error_model(backend) if model is None else model
+    interactions = interaction_graph(circ)
+    virtual = rx.PyGraph()
+    virtual.add_nodes_from(range(circ.num_qubits))
+    virtual.add_edges_from_no_data([tuple(edge) for edge in interactions["edges"]])
+
+    layouts = []
+    mappings = rx.vf2_mapping(model["graph"], virtual, subgraph=True, induced=False, call_limit=call_limit)
+    for mapping in mappings:
+        layout = np.empty(circ.num_qubits, dtype=np.int64)
+        for physical, v in mapping.items():
+            layout[v] = physical
+        layouts.append(layout)
+        if len(layouts) >= max_candidates:
+            break
+    if layouts:
+        return np.array(layouts)
+    return np.array([_grow_layout(start, interactions, model, circ.num_qubits)
+                     for start in range(backend.num_qubits)])
+
+
+def preselect_layouts(circ, backend, top_k=5, max_candidates=20000, call_limit=None):
+    """Rank candidate layouts with the error model without transpiling
+
+    Parameters:
+        circ (QuantumCircuit): Circuit of interest, ideally already in 1q/2q gates
+        backend (BackendV2): Backend of interest
+        top_k (int): Number of layouts to return
+        max_candidates (int): Largest number of VF2 mappings scored
+        call_limit (int): VF2 state visits per search, unlimited if omitted
+
+    Returns:
+        list: Up to ``top_k`` (layout, log-fidelity) pairs, best first, where
+        each layout is a list usable as ``initial_layout``
+    """
+    model = error_model(backend)
+    layouts = candidate_layouts(circ, backend, model, max_candidates, call_limit)
+    scores = score_layouts(layouts, interaction_graph(circ), model)
+    order = np.argsort(-scores, kind="stable")
+    best, seen = [], set()
+    for i in order:
+        key = tuple(layouts[i])
+        if key in seen:
+            continue
+        seen.add(key)
+        best.append((list(map(int, key)), float(scores[i])))
+        if len(best) == top_k:
+            break
+    return best
+
+
+def transpile_preselected(circ, backend, top_k=3, optimization_level=3, seed_transpiler=None, **kwargs):
+    """Transpile with each pre-selected layout and keep the best scoring result
+
+    This replaces one full transpilation per layout plugin with ``top_k``
+    transpilations seeded with ``initial_layout``.
+
+    Parameters:
+        circ (QuantumCircuit): Circuit of interest
+        backend (BackendV2): Backend of interest
+        top_k (int): Number of pre-selected layouts to transpile
+        optimization_level (int): Preset pass manager level
+        seed_transpiler (int): Transpiler seed
+        **kwargs: Further ``generate_preset_pass_manager`` arguments
+
+    Returns:
+        tuple: (transpiled circuit, fidelity from ``transpile_scoring``)
+    """
+    from qiskit.transpiler.preset_passmanagers import generate_preset_pass_manager
+    from util import transpile_scoring
+
+    best = (None, -np.inf)
+    for layout, _ in preselect_layouts(circ, backend, top_k):
+        pm = generate_preset_pass_manager(backend=backend, optimization_level=optimization_level,
+                                          initial_layout=layout, seed_transpiler=seed_transpiler, **kwargs)
+        transpiled = pm.run(circ)
+        fidelity = transpile_scoring(transpiled, transpiled.layout.final_index_layout(), backend)
+        if fidelity > best[1]:
+            best = (transpiled, fidelity)
+    return best
+
+
+def _grow_layout(start, interactions, model, num_virtual):
+    """Greedy placement from one physical qubit, heaviest interactions first"""
+    weights = np.zeros((num_virtual, num_virtual))
+    for (a, b), count in zip(interactions["edges"], interactions["counts"]):
+        weights[a, b] += count
+        weights[b, a] += count
+
+    distance = model["distance"]
+    free = np.ones(len(distance), dtype=bool)
+    layout = np.full(num_virtual, -1, dtype=np.int64)
+    first = int(np.argmax(weights.sum(axis=1)))
+    layout[first] = start
+    free[start] = False
+    for _ in range(num_virtual - 1):
+        placed = layout >= 0
+        # Next virtual qubit: the one most tied to those already placed
+        ties = np.where(placed, -1, weights[:, placed].sum(axis=1))
+        v = int(np.argmax(ties))
+        cost = weights[v, placed] @ distance[layout[placed]]
+        cost = cost + distance[start] * 1e-3 + model["cx_error"].min(axis=1) * 1e-6
+        cost[~free] = np.inf
+        physical = int(np.argmin(cost))
+        layout[v] = physical
+        free[physical] = False
+    return layout
@@ -0,0 +1,114 @@
+import numpy as np
+from qiskit.circuit.equivalence_library import SessionEquivalenceLibrary
+from qiskit.passmanager import ConditionalController, DoWhileController
+from qiskit.transpiler import AnalysisPass, PassManager, TransformationPass
+from qiskit.transpiler.passes import (
+    BasisTranslator,
+    Collect2qBlocks,
+    CommutativeCancellation,
+    ConsolidateBlocks,
+    GatesInBasis,
+    MinimumPoint,
+    Optimize1qGatesDecomposition,
+    UnitarySynthesis,
+)
+
+from util import fidelity_table, log_fidelity
+
+
+class FidelityAnalysis(AnalysisPass):
+    """Score the DAG with the transpile_scoring error model
+
+    Sets ``fidelity`` and ``infidelity`` (1 - fidelity, for passes that
+    minimize such as ``MinimumPoint``) in the property set. The fidelity
+    table of the backend is built once per pass instance.
+    """
+
+    def __init__(self, backend, table=None):
+        """
+        Parameters:
+            backend (BackendV2): Backend of interest
+            table (dict): Output of ``util.fidelity_table``, computed if omitted
+        """
+        super().__init__()
+        self.table = fidelity_table(backend) if table is None else table
+
+    def run(self, dag):
+        index = {bit: i for i, bit in enumerate(dag.qubits)}
+        instructions = ((node.op, tuple(index[q] for q in node.qargs)) for node in dag.topological_op_nodes())
+        fidelity = float(np.exp(log_fidelity(instructions, self.table)))
+        self.property_set["fidelity"] = fidelity
+        self.property_set["infidelity"] = 1 - fidelity
+
+
+class _RestoreMinimumPoint(TransformationPass):
+    """Return the best DAG ``MinimumPoint`` kept if the loop stopped before reaching it"""
+
+    def __init__(self, prefix):
+        super().__init__()
+        self.prefix = prefix
+
+    def run(self, dag):
+        state = self.property_set[f"{self.prefix}_minimum_point_state"]
+        if self.property_set[f"{self.prefix}_minimum_point"] or state is None or state.dag is None:
+            return dag
+        return state.dag
+
+
+def fidelity_optimization(backend, passes=None, patience=1, max_iterations=20, table=None):
+    """Optimization stage that loops only while the fidelity improves
+
+    Same structure as the level 3 preset optimization stage, with the
+    depth/size ``MinimumPoint`` check replaced by one on the infidelity. The
+    loop stops once ``patience`` iterations in a row fail to improve the
+    fidelity (or hit the same score again), or after ``max_iterations``
+    iterations, and the best DAG seen is kept.
+
+    Parameters:
+        backend (BackendV2): Backend of interest
+        passes (list): Passes run in each iteration, the level 3 ones if omitted
+        patience (int): Non-improving iterations allowed before stopping
+        max_iterations (int): Largest number of iterations
+        table (dict): Output of ``util.fidelity_table``, computed if omitted
+
+    Returns:
+        PassManager: Stage to use e.g. as ``staged_pm.optimization``
+    """
+    target = backend.target
+    table = fidelity_table(backend) if table is None else table
+    if passes is None:
+        passes = [
+            Collect2qBlocks(),
+            ConsolidateBlocks(target=target),
+            UnitarySynthesis(target=target),
+            Optimize1qGatesDecomposition(target=target),
+            CommutativeCancellation(target=target),
+        ]
+
+    def _unroll_condition(property_set):
+        return not property_set["all_gates_in_basis"]
+
+    def _loop_condition(property_set):
+        # Counted here so the limit ends the loop instead of raising PassManagerError
+        property_set["fidelity_loop_iterations"] = (property_set["fidelity_loop_iterations"] or 0) + 1
+        return (not property_set["fidelity_loop_minimum_point"]
+                and property_set["fidelity_loop_iterations"] < max_iterations)
+
+    # Translate back to the target if an optimization left non-native gates
+    unroll = [
+        GatesInBasis(target=target),
+        ConditionalController(
+            [BasisTranslator(SessionEquivalenceLibrary, target.operation_names, target=target)],
+            condition=_unroll_condition,
+        ),
+    ]
+    check = [
+        FidelityAnalysis(backend, table),
+        # MinimumPoint counts the iteration that set the best score, hence the + 1
+        MinimumPoint(["infidelity"], "fidelity_loop", backtrack_depth=patience + 1),
+    ]
+    optimization = PassManager(check)
+    optimization.append(DoWhileController(list(passes) + unroll + check, do_while=_loop_condition,
+                                          options={"max_iteration": max_iterations}))
+    optimization.append(_RestoreMinimumPoint("fidelity_loop"))
+    return optimization
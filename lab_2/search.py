@@ -0,0 +1,151 @@
+import itertools
+import queue
+import time
+
+from qiskit.transpiler.preset_passmanagers import generate_preset_pass_manager
+from qiskit.transpiler.preset_passmanagers.plugin import list_stage_plugins
+
+from util import fast_scoring, fidelity_table, spawn_pool
+
+# Circuit, backend, fidelity table and shared pass manager arguments of the
+# search, set by _init_worker in each worker (or in-process)
+_worker = {}
+
+# Routing plugins left out of the default search space: on large circuits one
+# of their runs can take far longer than a sabre run and use up the budget alone
+SLOW_ROUTING = ("lookahead", "stochastic")
+
+
+def search_space(seeds=range(8), layout_methods=None, routing_methods=None, translation_methods=None):
+    """List the transpiler configurations tried by ``transpile_search``
+
+    Plugin combinations vary fastest, so a truncated search covers every
+    combination before trying more seeds of the same one.
+
+    Parameters:
+        seeds (iterable): Values of ``seed_transpiler``
+        layout_methods (list): Layout plugins, all installed ones if omitted
+        routing_methods (list): Routing plugins, all installed ones except
+            ``none`` and ``SLOW_ROUTING`` if omitted
+        translation_methods (list): Translation plugins, all installed ones
+            if omitted
+
+    Returns:
+        list: Keyword dictionaries for ``generate_preset_pass_manager``
+    """
+    layout_methods = list_stage_plugins("layout") if layout_methods is None else layout_methods
+    if routing_methods is None:
+        routing_methods = [option for option in list_stage_plugins("routing")
+                           if option != "none" and option not in SLOW_ROUTING]
+    translation_methods = list_stage_plugins("translation") if translation_methods is None else translation_methods
+    seeds = list(seeds)
+    combos = list(itertools.product(layout_methods, routing_methods, translation_methods))
+    return [
+        {"layout_method": layout, "routing_method": routing, "translation_method": translation,
+         "seed_transpiler": seed}
+        for seed in seeds
+        for layout, routing, translation in combos
+    ]
+
+
+def transpile_search(circ, backend, configs=None, optimization_level=3, time_budget=None, max_workers=1,
+                     **kwargs):
+    """Transpile under many seeds and plugins and keep the highest-fidelity ISA circuit
+
+    Every candidate is transpiled in full. Its ``fast_scoring`` then runs
+    against the best fidelity found when it was submitted, so scoring a
+    worse candidate stops as soon as its running fidelity falls below it and
+    its circuit is not sent back. This saves scoring and transfer time only:
+    later optimization passes can remove gates, so a partially transpiled
+    circuit gives no bound on the final fidelity and candidates are not cut
+    short inside the pipeline.
+
+    With worker processes ``time_budget`` is a deadline: no candidate is
+    started after it, and candidates still running are terminated and listed
+    in ``cancelled``. In-process (``max_workers=1``) the budget is soft: the
+    candidate running at the deadline is finished first, which can take as
+    long as one transpilation.
+
+    Parameters:
+        circ (QuantumCircuit): Circuit of interest
+        backend (BackendV2): Backend of interest
+        configs (list): Candidates from ``search_space``, its default if omitted
+        optimization_level (int): Preset pass manager level
+        time_budget (float): Seconds the search may take, see above
+        max_workers (int): Number of worker processes, 1 runs in-process
+        **kwargs: Further ``generate_preset_pass_manager`` arguments shared by
+            every candidate, e.g. ``scheduling_method``
+
+    Returns:
+        dict: ``circuit`` and ``fidelity`` of the best candidate, its
+        ``config``, ``history`` of (config, fidelity or None if pruned,
+        seconds) for every finished candidate and the ``cancelled`` configs
+        that were submitted but stopped by the deadline
+    """
+    configs = search_space() if configs is None else configs
+    initargs = (circ, backend, optimization_level, kwargs)
+    deadline = None if time_budget is None else time.perf_counter() + time_budget
+    best = {"circuit": None, "fidelity": 0.0, "config": None, "history": [], "cancelled": []}
+
+    def record(config, outcome):
+        fidelity, circuit, elapsed = outcome
+        best["history"].append((config, None if circuit is None else fidelity, elapsed))
+        if circuit is not None and fidelity > best["fidelity"]:
+            best.update(circuit=circuit, fidelity=fidelity, config=config)
+
+    def remaining():
+        return None if deadline is None else max(0.0, deadline - time.perf_counter())
+
+    if max_workers == 1:
+        _init_worker(*initargs)
+        for config in configs:
+            if remaining() == 0.0:
+                break
+            record(config, _evaluate(config, best["fidelity"]))
+        return best
+
+    # Results come back through the pool's callbacks; the key is the submission index
+    finished = queue.SimpleQueue()
+    pending = enumerate(configs)
+    running = {}
+    with spawn_pool(max_workers, _init_worker, initargs) as pool:
+        while True:
+            # Keep every worker busy with one queued task to spare
+            while len(running) < 2 * max_workers and remaining() != 0.0:
+                index, config = next(pending, (None, None))
+                if config is None:
+                    break
+                running[index] = config
+                pool.apply_async(_evaluate, (config, best["fidelity"]),
+                                 callback=lambda outcome, index=index: finished.put((index, outcome)),
+                                 error_callback=lambda error, index=index: finished.put((index, error)))
+            if not running:
+                break
+            try:
+                index, outcome = finished.get(timeout=remaining())
+            except queue.Empty:
+                # Deadline: leaving the block terminates the workers and their candidates
+                break
+            config = running.pop(index)
+            if isinstance(outcome, BaseException):
+                raise outcome
+            record(config, outcome)
+    best["cancelled"] = list(running.values())
+    return best
+
+
+def _init_worker(circ, backend, optimization_level, kwargs):
+    _worker.update(circ=circ, backend=backend, optimization_level=optimization_level, kwargs=kwargs,
+                   table=fidelity_table(backend))
+
+
+def _evaluate(config, threshold):
+    """Return (fidelity, ISA circuit or None when pruned, elapsed seconds) for one candidate"""
+    start = time.perf_counter()
+    pm = generate_preset_pass_manager(backend=_worker["backend"], optimization_level=_worker["optimization_level"],
+                                      **config, **_worker["kwargs"])
+    circuit = pm.run(_worker["circ"])
+    fidelity = fast_scoring(circuit, _worker["backend"], _worker["table"], threshold)
+    if fidelity <= threshold:
+        circuit = None
+    return fidelity, circuit, time.perf_counter() - start
@@ -1,3 +1,5 @@
+import multiprocessing
+
 import numpy as np
 from qiskit import transpile, QuantumCircuit
 
@@ -73,9 +75,324 @@ def qubit_error(time, t1, t2):
     Returns:
         float: Idle error
     """
-    t2 = min(t1, t2)
+    t2 = np.minimum(t1, t2)
     rate1 = 1/t1
     rate2 = 1/t2
     p_reset = 1-np.exp(-time*rate1)
     p_z = (1-p_reset)*(1-np.exp(-time*(rate2-rate1)))/2
-    return p_z + p_reset
\ No newline at end of file
+    return p_z + p_reset
+
+def fidelity_table(backend):
+    """Precompute the scoring data of a backend for ``fast_scoring``
+
+    Parameters:
+        backend (IBMQBackend): An IBM Quantum backend instance
+
+    Returns:
+        dict: ``log_fid`` mapping (gate name, physical qubits) to log(1 - error),
+        plus per-qubit ``t1``/``t2`` lists and ``dt``
+    """
+    log_fid = {}
+    for name in backend.operation_names:
+        if name == 'delay':
+            continue
+        for qargs, props in (backend.target[name] or {}).items():
+            if qargs is not None and props is not None and props.error is not None:
+                log_fid[(name, qargs)] = np.log1p(-min(props.error, 1 - 1e-12))
+    num_qubits = backend.num_qubits
+    return {
+        "log_fid": log_fid,
+        "t1": [backend.qubit_properties(qq).t1 for qq in range(num_qubits)],
+        "t2": [backend.qubit_properties(qq).t2 for qq in range(num_qubits)],
+        "dt": backend.dt,
+    }
+
+
+def fast_scoring(circ, backend, table=None, threshold=0.0):
+    """
+    Table-driven version of transpile_scoring with early termination
+
+    Every factor of the fidelity is at most 1, so once the running product
+    drops below ``threshold`` the circuit cannot beat it and scoring stops.
+
+    Parameters:
+        circ (QuantumCircuit): circuit of interest
+        backend (IBMQBackend): An IBM Quantum backend instance
+        table (dict): Output of fidelity_table, computed if omitted
+        threshold (float): Fidelity below which scoring may stop early
+
+    Returns:
+        float: Fidelity of circ, or an upper bound below threshold if pruned
+    """
+    table = fidelity_table(backend) if table is None else table
+    index = {bit: i for i, bit in enumerate(circ.qubits)}
+    instructions = ((item.operation, tuple(index[q] for q in item.qubits)) for item in circ.data)
+    return float(np.exp(log_fidelity(instructions, table, threshold)))
+
+
+def log_fidelity(instructions, table, threshold=0.0):
+    """Log of the transpile_scoring fidelity of a stream of instructions
+
+    Shared by ``fast_scoring`` and the DAG-based ``passes.FidelityAnalysis``.
+
+    Parameters:
+        instructions (iterable): (operation, physical qubit indices) pairs in
+            circuit order
+        table (dict): Output of fidelity_table
+        threshold (float): Fidelity below which scoring may stop early
+
+    Returns:
+        float: Log-fidelity, or an upper bound below log(threshold) if pruned
+    """
+    log_fid = table["log_fid"]
+    t1s, t2s, dt = table["t1"], table["t2"], table["dt"]
+    limit = np.log(threshold) if threshold > 0 else -np.inf
+
+    total = 0.0
+    touched = set()
+    for operation, qargs in instructions:
+        name = operation.name
+        if name == 'delay':
+            # Ignore delays that occur before gates, as transpile_scoring does
+            q0 = qargs[0]
+            if q0 in touched:
+                total += np.log1p(-qubit_error(operation.duration * dt, t1s[q0], t2s[q0]))
+        elif (name, qargs) in log_fid:
+            total += log_fid[(name, qargs)]
+            touched.update(qargs)
+        else:
+            continue
+        if total < limit:
+            break
+    return total
+
+
+def timing_table(backend):
+    """Gate durations and timing constraints of a backend as arrays
+
+    Parameters:
+        backend (IBMQBackend): An IBM Quantum backend instance
+
+    Returns:
+        dict: ``durations`` mapping each single-qubit instruction (including
+        measure and reset) to a per-qubit array, ``durations_2q`` mapping each
+        two-qubit gate to a qubits x qubits array, both in units of dt with
+        NaN where unsupported, plus ``dt``, ``granularity``, ``min_length``,
+        ``pulse_alignment`` and ``acquire_alignment``
+    """
+    target = backend.target
+    num_qubits = backend.num_qubits
+    dt = backend.dt
+    durations = {}
+    durations_2q = {}
+    for name in target.operation_names:
+        if name == 'delay' or not isinstance(target[name], dict):
+            continue
+        for qargs, props in target[name].items():
+            if qargs is None or props is None or props.duration is None:
+                continue
+            if len(qargs) == 1:
+                table = durations.setdefault(name, np.full(num_qubits, np.nan))
+            elif len(qargs) == 2:
+                table = durations_2q.setdefault(name, np.full((num_qubits, num_qubits), np.nan))
+            else:
+                continue
+            table[qargs] = round(props.duration / dt)
+    constraints = target.timing_constraints()
+    return {
+        "durations": durations,
+        "durations_2q": durations_2q,
+        "dt": dt,
+        "granularity": constraints.granularity,
+        "min_length": constraints.min_length,
+        "pulse_alignment": constraints.pulse_alignment,
+        "acquire_alignment": constraints.acquire_alignment,
+    }
+
+
+def idle_intervals(circ, timing, scheduling_method="asap"):
+    """Schedule a physical circuit from gate durations and list the gaps on every qubit
+
+    Follows ``ASAPScheduleAnalysis``/``ALAPScheduleAnalysis`` without latencies:
+    an instruction starts once all of its qubits and clbits are free.
+    Existing delays only take up time, so a gap is the whole stretch between
+    two other instructions on a qubit, as a padding pass would fill it.
+
+    Parameters:
+        circ (QuantumCircuit): Transpiled (physical) circuit
+        timing (dict): Output of timing_table
+        scheduling_method (str): ``"asap"`` or ``"alap"``
+
+    Returns:
+        dict: Per gap ``qubit``, ``start`` and ``length`` in dt, ``after_op``
+        (a gate or barrier, not the circuit start or a reset, precedes it),
+        ``touched`` (a scored gate precedes it, as ``transpile_scoring``
+        requires to charge a delay), plus the circuit ``duration``
+    """
+    if scheduling_method not in ("asap", "alap"):
+        raise ValueError(f"Unknown scheduling method {scheduling_method}")
+    durations, durations_2q, dt = timing["durations"], timing["durations_2q"], timing["dt"]
+    index = {bit: i for i, bit in enumerate(circ.qubits)}
+    offset = len(circ.qubits)
+    index.update({bit: offset + i for i, bit in enumerate(circ.clbits)})
+
+    items = list(circ.data)
+    if scheduling_method == "alap":
+        items.reverse()
+    clock = np.zeros(offset + len(circ.clbits))
+    event_qubit, event_start, event_end, event_kind = [], [], [], []
+    for item in items:
+        operation = item.operation
+        name = operation.name
+        qargs = [index[q] for q in item.qubits]
+        bits = qargs + [index[c] for c in item.clbits]
+        if name == 'delay':
+            length = operation.duration if operation.unit == 'dt' else operation.duration / dt
+        elif len(qargs) == 1 and name in durations:
+            length = durations[name][qargs[0]]
+        elif len(qargs) == 2 and name in durations_2q:
+            length = durations_2q[name][qargs[0], qargs[1]]
+        else:
+            length = 0.0
+        length = 0.0 if np.isnan(length) else length
+        t0 = clock[bits].max()
+        clock[bits] = t0 + length
+        if name == 'delay':
+            continue
+        # 2: scored gate, 1: barrier or other directive, 0: reset
+        kind = 0 if name == 'reset' else 2 if (name in durations or name in durations_2q) else 1
+        for q in qargs:
+            event_qubit.append(q)
+            event_start.append(t0)
+            event_end.append(t0 + length)
+            event_kind.append(kind)
+
+    duration = clock.max() if len(clock) else 0.0
+    if not event_qubit:
+        empty = np.zeros(0)
+        return {"qubit": empty.astype(np.int64), "start": empty, "length": empty,
+                "after_op": empty.astype(bool), "touched": empty.astype(bool), "duration": duration}
+    qubit = np.array(event_qubit, dtype=np.int64)
+    start = np.array(event_start)
+    end = np.array(event_end)
+    kind = np.array(event_kind, dtype=np.int64)
+    if scheduling_method == "alap":
+        # The reversed sweep measured time back from the end
+        qubit, kind, start, end = qubit[::-1], kind[::-1], duration - end[::-1], duration - start[::-1]
+    # Events are in circuit order, so a stable sort keeps each qubit's in time order
+    order = np.argsort(qubit, kind="stable")
+    qubit, start, end, kind = qubit[order], start[order], end[order], kind[order]
+
+    # Each event closes the gap before it, and every qubit has a gap until the end
+    first = np.r_[True, qubit[1:] != qubit[:-1]]
+    last = np.r_[qubit[1:] != qubit[:-1], True]
+    gap_qubit = np.r_[qubit, qubit[last]]
+    gap_start = np.r_[np.where(first, 0.0, np.r_[0.0, end[:-1]]), end[last]]
+    gap_end = np.r_[start, np.full(last.sum(), duration)]
+    prev_kind = np.r_[np.where(first, -1, np.r_[-1, kind[:-1]]), kind[last]]
+
+    # A gap is touched once a scored gate came before it on the same qubit
+    scored = np.cumsum(kind == 2)
+    before = scored - (kind == 2)
+    group_start = np.maximum.accumulate(np.where(first, np.arange(len(qubit)), 0))
+    base = before[group_start]
+    touched = np.r_[before - base, scored[last] - base[last]] > 0
+
+    keep = gap_end - gap_start > 0
+    return {
+        "qubit": gap_qubit[keep],
+        "start": gap_start[keep],
+        "length": (gap_end - gap_start)[keep],
+        "after_op": prev_kind[keep] > 0,
+        "touched": touched[keep],
+        "duration": duration,
+    }
+
+
+def timeline_scoring(circ, backend, scheduling_method="asap", dd_sequence=None, table=None, timing=None):
+    """
+    Schedule-aware version of transpile_scoring that needs no scheduling pass
+
+    The idle time of every qubit is taken from a timeline built from the
+    target gate durations instead of from explicit delays, so unscheduled,
+    ASAP-, ALAP- and DD-padded variants of a circuit are all scored alike.
+    The result equals ``fast_scoring`` of the circuit after the matching
+    schedule analysis and ``PadDelay`` or ``PadDynamicalDecoupling`` passes.
+
+    Parameters:
+        circ (QuantumCircuit): Transpiled (physical) circuit, with or without delays
+        backend (IBMQBackend): An IBM Quantum backend instance; its target must
+            offer the DD gates, see ``dd.dd_backend``
+        scheduling_method (str): ``"asap"`` or ``"alap"``
+        dd_sequence (list): Names (or gates) of a DD sequence with an even
+            number of gates to place in idle gaps, none if omitted
+        table (dict): Output of fidelity_table, computed if omitted
+        timing (dict): Output of timing_table, computed if omitted
+
+    Returns:
+        float: Fidelity of circ
+    """
+    table = fidelity_table(backend) if table is None else table
+    timing = timing_table(backend) if timing is None else timing
+    log_fid = table["log_fid"]
+    t1s, t2s, dt = np.asarray(table["t1"]), np.asarray(table["t2"]), table["dt"]
+    index = {bit: i for i, bit in enumerate(circ.qubits)}
+
+    total = 0.0
+    for item in circ.data:
+        key = (item.operation.name, tuple(index[q] for q in item.qubits))
+        if key in log_fid:
+            total += log_fid[key]
+
+    gaps = idle_intervals(circ, timing, scheduling_method)
+    qubit, length, touched = gaps["qubit"], gaps["length"], gaps["touched"]
+    # Pieces of idle time: one row per gap, several columns once DD splits it
+    pieces = length[:, None]
+    charged = touched[:, None]
+    names = [getattr(gate, "name", gate) for gate in dd_sequence or []]
+    if len(names) > 1:
+        sequence = np.array([timing["durations"].get(name, np.full(len(t1s), np.nan)) for name in names])
+        pulse_fid = np.array([[log_fid.get((name, (q,)), np.nan) for q in range(len(t1s))] for name in names])
+        slack = length - sequence[:, qubit].sum(axis=0)
+        padded = gaps["after_op"] & (slack > 0) & ~np.isnan(slack) & ~np.isnan(pulse_fid[:, qubit].sum(axis=0))
+
+        # Spacing, alignment and slack distribution as in PadDynamicalDecoupling
+        num = len(names)
+        spacing = np.array([0.5 / num] + [1 / num] * (num - 1) + [0.5 / num])
+        align = timing["pulse_alignment"]
+        taus = align * np.floor(slack[:, None] * spacing / align)
+        extra = slack - taus.sum(axis=1)
+        middle = num // 2
+        to_middle = align * np.floor(extra / align)
+        taus[:, middle] += to_middle
+        taus[:, -1] += extra - to_middle
+
+        pieces = np.where(padded[:, None], taus, np.c_[length, np.zeros((len(length), num))])
+        charged = np.c_[touched, np.repeat((touched | padded)[:, None], num, axis=1)]
+        total += np.nansum(pulse_fid[:, qubit[padded]])
+
+    time = pieces * dt
+    errors = qubit_error(time, t1s[qubit][:, None], t2s[qubit][:, None])
+    total += np.log1p(-errors[charged & (pieces > 0)]).sum()
+    return float(np.exp(total))
+
+
+def spawn_pool(max_workers, initializer=None, initargs=()):
+    """Process pool whose workers are started with ``spawn``
+
+    Forking a notebook kernel copies the locks of its running Aer/OpenMP
+    threads and can hang the children, so the lab's parallel helpers start
+    fresh interpreters instead. Each worker runs ``initializer(*initargs)``
+    once; leaving the ``with`` block terminates the workers, including
+    tasks still running.
+
+    Parameters:
+        max_workers (int): Number of worker processes
+        initializer (callable): Sets up the per-worker state
+        initargs (tuple): Arguments of ``initializer``
+
+    Returns:
+        multiprocessing.pool.Pool: Pool to use as a context manager
+    """
+    context = multiprocessing.get_context("spawn")
+    return context.Pool(max_workers, initializer=initializer, initargs=initargs)
@@ -0,0 +1,359 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import dill
+import numpy as np
+from qiskit import QuantumCircuit
+from qiskit.circuit import Parameter, ParameterExpression
+
+# Pass manager of a transpiler worker process, set once by the pool initializer
+_worker_pm = None
+
+
+def structure_key(circuit):
+    """Hashable key that is equal for structurally identical circuits
+
+    Parameters are compared exactly: numbers and arrays (``UnitaryGate``
+    matrices, ``StatePreparation`` amplitudes, ...) by their dtype, shape and
+    bytes, and nested circuits by their own key.
+
+    Parameters:
+        circuit (QuantumCircuit): Circuit of interest
+
+    Returns:
+        tuple: Register sizes plus every instruction's name, parameters,
+        qubit indices and clbit indices
+    """
+    qubits = {bit: i for i, bit in enumerate(circuit.qubits)}
+    clbits = {bit: i for i, bit in enumerate(circuit.clbits)}
+    return (
+        circuit.num_qubits,
+        tuple((reg.name, reg.size) for reg in circuit.cregs),
+        tuple(
+            (
+                item.operation.name,
+                tuple(_param_key(p) for p in item.operation.params),
+                tuple(qubits[q] for q in item.qubits),
+                tuple(clbits[c] for c in item.clbits),
+            )
+            for item in circuit.data
+        ),
+    )
+
+
+def _param_key(param):
+    if isinstance(param, Parameter):
+        return param
+    if isinstance(param, ParameterExpression):
+        return str(param)
+    if isinstance(param, QuantumCircuit):
+        return structure_key(param)
+    # Arrays (unitaries, amplitudes) compare by their exact bytes
+    array = np.asarray(param)
+    return (array.dtype.str, array.shape, array.tobytes())
+
+
+def deduplicate(sub_experiments):
+    """Group structurally identical sub-experiments
+
+    Parameters:
+        sub_experiments (list): Sub-experiment circuits
+
+    Returns:
+        tuple: (keys, unique) where ``keys[i]`` is the structure key of
+        sub-experiment ``i`` and ``unique`` maps each key to its first circuit
+    """
+    keys = [structure_key(circuit) for circuit in sub_experiments]
+    unique = {}
+    for key, circuit in zip(keys, sub_experiments):
+        unique.setdefault(key, circuit)
+    return keys, unique
+
+
+def transpile_sub_experiments(sub_experiments, pm, cache=None, num_processes=None):
+    """Transpile sub-experiments once per distinct structure, in parallel
+
+    Only structures missing from ``cache`` are transpiled. They are spread
+    in chunks over a process pool that receives ``pm`` once per worker,
+    rather than once per circuit as with ``pm.run(list)``. Reusing ``cache``
+    across calls with the same pass manager (e.g. the 1-cut and 2-cut
+    Toffoli experiments) skips every structure seen before.
+
+    Parameters:
+        sub_experiments (list): Sub-experiment circuits
+        pm (PassManager): Pass manager producing ISA circuits
+        cache (dict): Structure key to ISA circuit, updated in place
+        num_processes (int): Maximum number of transpiler processes
+
+    Returns:
+        list: ISA circuit for every sub-experiment, in input order
+    """
+    cache = {} if cache is None else cache
+    keys, unique = deduplicate(sub_experiments)
+    missing = [key for key in unique if key not in cache]
+    circuits = [unique[key] for key in missing]
+    num_processes = min(num_processes or os.cpu_count() or 1, len(circuits))
+    if num_processes <= 1:
+        transpiled = [pm.run(circuit) for circuit in circuits]
+    else:
+        context = multiprocessing.get_context("spawn")
+        chunksize = max(1, len(circuits) // (4 * num_processes))
+        with ProcessPoolExecutor(max_workers=num_processes, mp_context=context,
+                                 initializer=_init_worker, initargs=(dill.dumps(pm),)) as pool:
+            transpiled = list(pool.map(_transpile, circuits, chunksize=chunksize))
+    cache.update(zip(missing, transpiled))
+    return [cache[key] for key in keys]
+
+
+def _init_worker(pm_bin):
+    # Preset pass managers hold local closures, so they travel as dill bytes
+    global _worker_pm
+    _worker_pm = dill.loads(pm_bin)
+
+
+def _transpile(circuit):
+    return _worker_pm.run(circuit)
+
+
+def sample_sub_experiments(sampler, isa_circuits, batch_size=100, shots=None):
+    """Stream sub-experiments through the sampler in batched jobs
+
+    Sub-experiments sharing one ISA circuit object (as returned from the
+    transpile cache) are sampled once. All batches are submitted before
+    the first result is awaited, so the jobs queue back to back, and the
+    results are yielded batch by batch as they are collected.
+
+    Parameters:
+        sampler (SamplerV2): Sampler primitive instance
+        isa_circuits (list): ISA sub-experiments, e.g. from
+            ``transpile_sub_experiments``
+        batch_size (int): Number of PUBs per sampler job
+        shots (int or list): Shots per PUB, the sampler default when omitted.
+            A list gives the shots of every sub-experiment (e.g. from
+            ``qpd.allocate_shots``); a shared PUB takes the largest count of
+            its sub-experiments and PUBs with zero shots are skipped
+
+    Returns:
+        generator: (indices, pub_results) pairs, where ``indices`` lists the
+        sub-experiments sharing each PUB result
+    """
+    positions = {}
+    for i, circuit in enumerate(isa_circuits):
+        positions.setdefault(id(circuit), []).append(i)
+
+    per_experiment = np.ndim(shots) > 0
+    pubs = []
+    for indices in positions.values():
+        circuit = isa_circuits[indices[0]]
+        if not per_experiment:
+            pubs.append((indices, circuit))
+            continue
+        count = int(max(shots[i] for i in indices))
+        if count > 0:
+            pubs.append((indices, (circuit, None, count)))
+
+    jobs = []
+    for start in range(0, len(pubs), batch_size):
+        batch = pubs[start:start + batch_size]
+        job = sampler.run([pub for _, pub in batch], shots=None if per_experiment else shots)
+        jobs.append(([indices for indices, _ in batch], job))
+
+    for batch, job in jobs:
+        result = job.result()
+        yield batch, [result[i] for i in range(len(batch))]
+
+
+def sampling_overhead(circuit, cut_indices):
+    """Quasi-probability sampling overhead of cutting the given gates
+
+    Parameters:
+        circuit (QuantumCircuit): Circuit of interest
+        cut_indices (list): Indices into ``circuit.data`` of the cut gates
+
+    Returns:
+        float: Product of gamma**2 over the cut gates, the factor by which the
+        shot count grows to keep the same precision
+    """
+    return float(np.prod([_gate_gamma(circuit.data[i].operation) ** 2 for i in cut_indices]))
+
+
+def find_cuts(circuit, coupling_map=None, layout=None, qubit_budget=None, depth_target=None,
+              max_exhaustive=10):
+    """Choose the two-qubit gates to cut, ready to pass to ``cut_gates``
+
+    With ``qubit_budget``, the qubit interaction graph (edges weighted by the
+    log sampling overhead of the gates between two qubits) is bisected
+    along the best ratio cut of its Fiedler vector until every part fits
+    the budget.
+
+    With ``coupling_map``, the remaining gates between qubits that are not
+    adjacent under ``layout`` become candidates. Each uncut candidate is
+    charged three layers per SWAP needed to route it, so the routed depth is
+    estimated without transpiling. The search keeps the candidate set of
+    lowest sampling overhead meeting ``depth_target``, or without a target
+    minimizes ``sampling_overhead * estimated_depth``. Up to ``max_exhaustive``
+    candidates every subset is tried, beyond that candidates are added
+    greedily, longest routes first.
+
+    Parameters:
+        circuit (QuantumCircuit): Circuit to cut, e.g. the decomposed Toffoli
+        coupling_map (CouplingMap): Device coupling map
+        layout (list): Physical qubit of each circuit qubit, identity if omitted
+        qubit_budget (int): Largest number of qubits allowed in one partition
+        depth_target (int): Largest acceptable estimated routed depth
+        max_exhaustive (int): Largest candidate count searched exhaustively
+
+    Returns:
+        list: Sorted indices into ``circuit.data`` of the gates to cut
+
+    Raises:
+        ValueError: If a gate on three or more qubits would have to be split
+            to meet ``qubit_budget``, or if no cut set meets ``depth_target``
+    """
+    qubit_index = {bit: i for i, bit in enumerate(circuit.qubits)}
+    ops = [
+        (i, tuple(qubit_index[q] for q in item.qubits))
+        for i, item in enumerate(circuit.data)
+        if item.operation.name != "barrier"
+    ]
+    pairs = {i: qubits for i, qubits in ops if len(qubits) == 2}
+
+    cuts = set()
+    if qubit_budget is not None:
+        cuts |= _partition_cuts(circuit, ops, pairs, qubit_budget)
+    if coupling_map is None:
+        return sorted(cuts)
+
+    layout = list(range(circuit.num_qubits)) if layout is None else list(layout)
+    distance = coupling_map.distance_matrix
+    routing = {}
+    for i, (a, b) in pairs.items():
+        hops = int(distance[layout[a], layout[b]])
+        if hops > 1 and i not in cuts:
+            routing[i] = 3 * (hops - 1)
+    candidates = sorted(routing, key=routing.get, reverse=True)
+    log_gamma = {i: 2 * np.log(_gate_gamma(circuit.data[i].operation)) for i in candidates}
+
+    def cost(chosen):
+        depth = _estimated_depth(ops, circuit.num_qubits, routing, cuts | chosen)
+        overhead = sum(log_gamma[i] for i in chosen)
+        if depth_target is not None:
+            return (depth > depth_target, overhead, depth)
+        return (False, overhead + np.log(depth), depth)
+
+    best = frozenset()
+    if len(candidates) <= max_exhaustive:
+        for mask in range(1, 2 ** len(candidates)):
+            chosen = frozenset(c for k, c in enumerate(candidates) if mask >> k & 1)
+            if cost(chosen) < cost(best):
+                best = chosen
+    else:
+        for candidate in candidates:
+            if depth_target is not None and not cost(best)[0]:
+                break
+            chosen = best | {candidate}
+            if depth_target is not None or cost(chosen) < cost(best):
+                best = chosen
+    if cost(best)[0]:
+        lowest = cost(frozenset(candidates))[2]
+        raise ValueError(f"No cut set reaches depth {depth_target}, the lowest estimated depth is {lowest}")
+    return sorted(cuts | best)
+
+
+def _gate_gamma(operation):
+    """QPD gamma of a two-qubit gate, 3 for Clifford entanglers such as CX/CZ/ECR"""
+    if operation.name in ("rzz", "rxx", "ryy", "rzx"):
+        return 1 + 2 * abs(np.sin(float(operation.params[0])))
+    if operation.name in ("crx", "cry", "crz", "cp"):
+        return 1 + 2 * abs(np.sin(float(operation.params[0]) / 2))
+    if operation.name in ("swap", "iswap"):
+        return 7.0
+    return 3.0
+
+
+def _estimated_depth(ops, num_qubits, routing, cuts):
+    """Depth with routed gates charged their SWAP layers and cut gates made local"""
+    level = [0] * num_qubits
+    for i, qubits in ops:
+        if i in cuts:
+            for q in qubits:
+                level[q] += 1
+            continue
+        top = max(level[q] for q in qubits) + 1 + routing.get(i, 0)
+        for q in qubits:
+            level[q] = top
+    return max(level, default=0)
+
+
+def _partition_cuts(circuit, ops, pairs, qubit_budget):
+    """Cut gates along repeated balanced bisections until every part fits the budget"""
+    weights = np.zeros((circuit.num_qubits, circuit.num_qubits))
+    for i, qubits in ops:
+        if len(qubits) == 2:
+            a, b = qubits
+            weight = 2 * np.log(_gate_gamma(circuit.data[i].operation))
+            weights[a, b] += weight
+            weights[b, a] += weight
+        else:
+            # Gates on three or more qubits cannot be cut, keep their qubits together
+            for k, a in enumerate(qubits):
+                for b in qubits[k + 1:]:
+                    weights[a, b] = weights[b, a] = 1e6
+
+    parts = [np.arange(circuit.num_qubits)]
+    label = np.zeros(circuit.num_qubits, dtype=int)
+    num_parts = 0
+    while parts:
+        part = parts.pop()
+        if len(part) <= qubit_budget:
+            label[part] = num_parts
+            num_parts += 1
+            continue
+        parts += _bisect(weights[np.ix_(part, part)], part)
+
+    for i, qubits in ops:
+        if len(qubits) > 2 and len(set(label[list(qubits)])) > 1:
+            raise ValueError(f"Gate {i} ({circuit.data[i].operation.name}) on qubits {qubits} cannot be cut "
+                             f"and does not fit a budget of {qubit_budget} qubits")
+    return {i for i, (a, b) in pairs.items() if label[a] != label[b]}
+
+
+def _bisect(weights, part):
+    """Split a part into its connected components, or by a Fiedler-vector ratio cut"""
+    components = _components(weights)
+    if len(components) > 1:
+        return [part[component] for component in components]
+
+    laplacian = np.diag(weights.sum(axis=1)) - weights
+    _, vectors = np.linalg.eigh(laplacian)
+    order = np.argsort(vectors[:, 1], kind="stable")
+    # Cut weight of every prefix of the Fiedler ordering, updated incrementally
+    inside = np.zeros(len(order), dtype=bool)
+    cut = 0.0
+    best, best_ratio = 1, np.inf
+    for k, node in enumerate(order[:-1], start=1):
+        cut += weights[node, ~inside].sum() - weights[node, node] - weights[node, inside].sum()
+        inside[node] = True
+        ratio = cut / min(k, len(order) - k)
+        if ratio < best_ratio:
+            best, best_ratio = k, ratio
+    return [part[np.sort(order[:best])], part[np.sort(order[best:])]]
+
+
+def _components(weights):
+    seen = np.zeros(len(weights), dtype=bool)
+    components = []
+    for start in range(len(weights)):
+        if seen[start]:
+            continue
+        stack, members = [start], []
+        seen[start] = True
+        while stack:
+            node = stack.pop()
+            members.append(node)
+            for other in np.flatnonzero((weights[node] > 0) & ~seen):
+                seen[other] = True
+                stack.append(other)
+        components.append(np.array(sorted(members)))
+    return components
@@ -0,0 +1,235 @@
+import hashlib
+
+import numpy as np
+from qiskit.utils.units import apply_prefix
+
+
+# Default repetition delay between shots on IBM Quantum backends, in seconds
+DEFAULT_REP_DELAY = 250e-6
+
+
+def instruction_table(backend):
+    """Durations and errors of every target instruction
+
+    Parameters:
+        backend (BackendV2): Backend of interest
+
+    Returns:
+        dict: ``durations`` mapping (instruction name, physical qubits) to
+        seconds, ``log_fid`` mapping them to log(1 - error), the backend ``dt``
+        and ``key``, a hash of the contents that identifies the table in the
+        metrics cache
+    """
+    durations = {}
+    log_fid = {}
+    target = backend.target
+    for name in target.operation_names:
+        properties = target[name]
+        if not isinstance(properties, dict):
+            continue
+        for qargs, props in properties.items():
+            if qargs is None or props is None:
+                continue
+            if props.duration is not None:
+                durations[(name, qargs)] = props.duration
+            if props.error is not None and name != "delay":
+                log_fid[(name, qargs)] = np.log1p(-min(props.error, 1 - 1e-12))
+    table = {"durations": durations, "log_fid": log_fid, "dt": backend.dt}
+    table["key"] = _table_key(table)
+    return table
+
+
+def circuit_metrics(circ, backend=None, table=None, refresh=False):
+    """Depth, 2q depth, op counts, nonlocal gates and critical path of a circuit in one pass
+
+    ``depth`` and ``depth_2q`` follow ``circ.depth()`` and
+    ``circ.depth(lambda x: len(x.qubits) == 2)``, ``count_ops`` and
+    ``num_nonlocal_gates`` the methods of the same name. The result is kept
+    on the circuit, so asking again is free until instructions are appended
+    or removed. Copies of the circuit do not share it, and metrics computed
+    with durations also answer later calls without them. Pass
+    ``refresh=True`` after replacing instructions in place, or after
+    changing a backend's target in place when passing the backend (its
+    cached metrics are matched by backend name and version).
+
+    Parameters:
+        circ (QuantumCircuit): Circuit of interest, physical if durations are used
+        backend (BackendV2): Backend whose instruction durations weight the
+            critical path, none if omitted
+        table (dict): Output of ``instruction_table``, taken from ``backend``
+            if omitted
+        refresh (bool): Recompute even if the circuit holds cached metrics
+
+    Returns:
+        dict: ``depth``, ``depth_2q``, ``size``, ``count_ops``,
+        ``num_nonlocal_gates``, per-qubit ``occupancy`` (fraction of the depth
+        layers holding an instruction on the qubit), and with a backend
+        ``duration`` (critical path in seconds), ``critical_path``
+        (instruction indices along it) and ``fidelity`` (product of the gate
+        and readout fidelities, without idle errors)
+    """
+    # Copies inherit the attribute, so the circuit's id is part of the key
+    key = (id(circ), len(circ._data), _source_key(backend, table))
+    cache = getattr(circ, "_metrics_cache", None)
+    if cache is not None and not refresh and cache[0][:2] == key[:2] \
+            and (cache[0][2] == key[2] or (key[2] is None and "duration" in cache[1])):
+        return cache[1]
+    if table is None and backend is not None:
+        table = instruction_table(backend)
+    durations = None if table is None else table["durations"]
+    log_fid = None if table is None else table["log_fid"]
+
+    qubit_index = {bit: i for i, bit in enumerate(circ.qubits)}
+    offset = len(circ.qubits)
+    bit_index = dict(qubit_index)
+    bit_index.update({bit: offset + i for i, bit in enumerate(circ.clbits)})
+    num_bits = offset + len(circ.clbits)
+
+    # Plain lists: per-instruction updates touch only a few bits each
+    level = [0] * num_bits
+    level_2q = [0] * num_bits
+    finish = [0.0] * num_bits
+    # Instruction that last finished on every bit, to trace the critical path back
+    last = [-1] * num_bits
+    parent = [-1] * len(circ._data)
+    busy = [0] * offset
+    counts = {}
+    size = 0
+    nonlocal_gates = 0
+    total_log_fid = 0.0
+    for i, item in enumerate(circ._data):
+        operation = item.operation
+        name = operation.name
+        counts[name] = counts.get(name, 0) + 1
+        qargs = [qubit_index[q] for q in item.qubits]
+        bits = qargs + [bit_index[c] for c in item.clbits]
+        # Condition bits always add a level, as in QuantumCircuit.depth
+        read = [] if not getattr(operation, "condition", None) else \
+            [b for b in (bit_index[c] for c in operation.condition_bits) if b not in bits]
+        if not bits and not read:
+            continue
+        directive = getattr(operation, "_directive", False)
+        if not directive:
+            size += 1
+            for q in qargs:
+                busy[q] += 1
+            if len(qargs) > 1:
+                nonlocal_gates += 1
+
+        step, step_2q = (0 if directive else 1), (1 if len(qargs) == 2 else 0)
+        new_level = max([level[b] + step for b in bits] + [level[b] + 1 for b in read])
+        new_level_2q = max([level_2q[b] + step_2q for b in bits] + [level_2q[b] + 1 for b in read])
+        bits += read
+        for b in bits:
+            level[b] = new_level
+            level_2q[b] = new_level_2q
+
+        if durations is not None:
+            first = max(bits, key=finish.__getitem__)
+            parent[i] = last[first]
+            if name == "delay":
+                length = operation.duration * table["dt"] if operation.unit == "dt" \
+                    else apply_prefix(operation.duration, operation.unit)
+            else:
+                length = durations.get((name, tuple(qargs)), 0.0)
+                total_log_fid += log_fid.get((name, tuple(qargs)), 0.0)
+            end = finish[first] + length
+            for b in bits:
+                finish[b] = end
+                last[b] = i
+
+    depth = max(level, default=0)
+    metrics = {
+        "depth": depth,
+        "depth_2q": max(level_2q, default=0),
+        "size": size,
+        "count_ops": dict(sorted(counts.items(), key=lambda kv: kv[1], reverse=True)),
+        "num_nonlocal_gates": nonlocal_gates,
+        "occupancy": np.array(busy) / depth if depth else np.zeros(offset),
+    }
+    if durations is not None:
+        path = []
+        node = last[int(np.argmax(finish))] if num_bits else -1
+        while node >= 0:
+            path.append(node)
+            node = parent[node]
+        metrics["duration"] = max(finish, default=0.0)
+        metrics["critical_path"] = path[::-1]
+        metrics["fidelity"] = float(np.exp(total_log_fid))
+    circ._metrics_cache = (key, metrics)
+    return metrics
+
+
+def estimate_runtime(circuits, backend=None, table=None, shots=None, rep_delay=DEFAULT_REP_DELAY):
+    """Expected execution time of circuits from their duration-weighted critical paths
+
+    Parameters:
+        circuits (list): Transpiled (physical) circuits
+        backend (BackendV2): Backend of interest
+        table (dict): Output of ``instruction_table``, taken from ``backend``
+            if omitted
+        shots (int): Shots per circuit; if given, the time of the whole job
+            including the repetition delay after every shot is returned
+        rep_delay (float): Delay between shots in seconds
+
+    Returns:
+        ndarray: Seconds per shot, or per job when ``shots`` is given
+    """
+    table = instruction_table(backend) if table is None else table
+    seconds = np.array([circuit_metrics(circ, table=table)["duration"] for circ in circuits])
+    if shots is not None:
+        seconds = shots * (seconds + rep_delay)
+    return seconds
+
+
+def rank_circuits(circuits, backend=None, objective="time", table=None, metrics=None):
+    """Order circuits from best to worst by depth, runtime or runtime per fidelity
+
+    ``"time_fidelity"`` divides the critical-path time by the estimated
+    fidelity, i.e. QPU seconds per shot that ran without an error.
+
+    Parameters:
+        circuits (list): Transpiled (physical) circuits
+        backend (BackendV2): Backend of interest, not needed for ``"depth"``
+        objective (str): ``"depth"``, ``"time"`` or ``"time_fidelity"``
+        table (dict): Output of ``instruction_table``, taken from ``backend``
+            if omitted
+        metrics (list): ``circuit_metrics`` of every circuit, with durations
+            for the time objectives; computed if omitted
+
+    Returns:
+        tuple: (indices best first, score of every circuit, lower is better)
+    """
+    if objective not in ("depth", "time", "time_fidelity"):
+        raise ValueError(f"Unknown objective {objective}")
+    if objective != "depth" and backend is None and table is None and (
+            metrics is None or any("duration" not in m for m in metrics)):
+        raise ValueError(f"objective '{objective}' requires a backend")
+    if metrics is None:
+        if objective != "depth" and table is None:
+            table = instruction_table(backend)
+        metrics = [circuit_metrics(circ, table=table) for circ in circuits]
+    if objective == "depth":
+        scores = np.array([m["depth"] for m in metrics], dtype=float)
+    else:
+        scores = np.array([m["duration"] for m in metrics])
+        if objective == "time_fidelity":
+            scores = scores / np.maximum([m["fidelity"] for m in metrics], 1e-300)
+    return np.argsort(scores, kind="stable"), scores
+
+
+def _source_key(backend, table):
+    """Identify where the durations and errors of ``circuit_metrics`` come from"""
+    if table is not None:
+        return table.get("key") or _table_key(table)
+    if backend is not None:
+        return backend.name, getattr(backend, "backend_version", None)
+    return None
+
+
+def _table_key(table):
+    digest = hashlib.blake2b(digest_size=16)
+    for name in ("durations", "log_fid"):
+        digest.update(repr(sorted(table[name].items())).encode())
+    digest.update(repr(table["dt"]).encode())
+    return digest.hexdigest()
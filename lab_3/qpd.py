@@ -0,0 +1,230 @@
+import numpy as np
+
+# Number of set bits of every byte value, used for vectorized parities
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def qpd_accumulator(coefficients, observables):
+    """Create the running state of a QPD expectation-value reconstruction
+
+    Sub-experiments are indexed as in ``generate_cutting_experiments``: one
+    per coefficient and commuting observable group, ``i * num_groups + k``.
+
+    Parameters:
+        coefficients (list): (coefficient, WeightType) pairs from
+            ``generate_cutting_experiments``
+        observables (PauliList): Observables passed to
+            ``generate_cutting_experiments``
+
+    Returns:
+        dict: Accumulator holding the Pauli masks of every group and the
+        per-sub-experiment sums of +-1 outcomes and shot counts
+    """
+    from circuit_knitting.utils.observable_grouping import ObservableCollection
+
+    if any(pauli.phase != 0 for pauli in observables):
+        raise ValueError("An input observable has a phase not equal to 1.")
+    collection = ObservableCollection(observables)
+    groups = collection.groups
+    width = max(1, (max(len(group.pauli_indices) for group in groups) + 7) // 8)
+
+    masks = np.zeros((len(groups), len(observables), width), dtype=np.uint8)
+    weights = np.zeros((len(groups), len(observables)))
+    for o, pauli in enumerate(observables):
+        # An observable measured by several groups is averaged over them
+        places = collection.lookup[pauli]
+        for group, position in places:
+            mask = groups[group].pauli_bitmasks[position]
+            masks[group, o] = np.frombuffer(mask.to_bytes(width, "big"), dtype=np.uint8)
+            weights[group, o] = 1 / len(places)
+
+    num_experiments = len(coefficients) * len(groups)
+    return {
+        "coefficients": np.array([coefficient for coefficient, _ in coefficients], dtype=float),
+        "masks": masks,
+        "weights": weights,
+        "sums": np.zeros((num_experiments, len(observables))),
+        "shots": np.zeros(num_experiments, dtype=np.int64),
+    }
+
+
+def accumulate(accumulator, indices, pub_results):
+    """Fold a batch of sampler results into the accumulator
+
+    The packed ``observable_measurements`` and ``qpd_measurements`` bit
+    arrays of the whole batch are concatenated, and the observable parities
+    of every shot are computed with one byte-wise AND and popcount lookup.
+    Results may arrive in any order and a sub-experiment may receive
+    several batches; its shots simply add up.
+
+    Parameters:
+        accumulator (dict): State from ``qpd_accumulator``, updated in place
+        indices (list): Sub-experiment index, or list of indices sharing the
+            result, for each PUB result (as yielded by
+            ``knitting.sample_sub_experiments``)
+        pub_results (list): ``SamplerPubResult`` for each entry of ``indices``
+
+    Returns:
+        dict: The updated accumulator
+    """
+    groups = [np.atleast_1d(index) for index in indices]
+    masks = accumulator["masks"]
+    num_groups = masks.shape[0]
+
+    obs_arrays = [result.data.observable_measurements.array for result in pub_results]
+    qpd_arrays = [result.data.qpd_measurements.array for result in pub_results]
+    shots = np.array([len(array) for array in obs_arrays])
+    obs = _concat_padded(obs_arrays, masks.shape[2])
+    qpd = _concat_padded(qpd_arrays, max(array.shape[1] for array in qpd_arrays))
+
+    pub_of_shot = np.repeat(np.arange(len(groups)), shots)
+    group_of_pub = np.array([group[0] % num_groups for group in groups])
+    qpd_sign = 1 - 2 * (_POPCOUNT[qpd].sum(axis=1, dtype=np.int64) & 1)
+    parity = _POPCOUNT[obs[:, None, :] & masks[group_of_pub[pub_of_shot]]].sum(axis=2, dtype=np.int64) & 1
+    values = qpd_sign[:, None] * (1 - 2 * parity)
+    offsets = np.concatenate([[0], np.cumsum(shots)[:-1]])
+    pub_sums = np.add.reduceat(values, offsets, axis=0)
+
+    experiments = np.concatenate(groups)
+    pub_of_experiment = np.repeat(np.arange(len(groups)), [len(group) for group in groups])
+    np.add.at(accumulator["sums"], experiments, pub_sums[pub_of_experiment])
+    np.add.at(accumulator["shots"], experiments, shots[pub_of_experiment])
+    return accumulator
+
+
+def reconstruct(accumulator):
+    """Quasi-probability-weighted expectation values from the accumulated shots
+
+    Parameters:
+        accumulator (dict): State from ``qpd_accumulator`` and ``accumulate``
+
+    Returns:
+        tuple: (expvals, variances) arrays with one entry per observable. A
+        sub-experiment without shots yet contributes 0 to the expectation
+        value and the worst-case variance 1
+    """
+    coefficients = accumulator["coefficients"]
+    weights = accumulator["weights"]
+    num_groups, num_obs = weights.shape
+    shots = accumulator["shots"][:, None]
+
+    means = accumulator["sums"] / np.maximum(shots, 1)
+    variances = np.where(shots > 0, (1 - means**2) / np.maximum(shots, 1), 1.0)
+    means = means.reshape(len(coefficients), num_groups, num_obs)
+    variances = variances.reshape(len(coefficients), num_groups, num_obs)
+
+    expvals = coefficients @ (means * weights).sum(axis=1)
+    variance = coefficients**2 @ (variances * weights**2).sum(axis=1)
+    return expvals, variance
+
+
+def reconstruct_expectation_values(results, coefficients, observables):
+    """One-shot vectorized replacement for the toolbox reconstruction
+
+    Parameters:
+        results (PrimitiveResult): Sampler results of all sub-experiments, in
+            ``generate_cutting_experiments`` order
+        coefficients (list): (coefficient, WeightType) pairs
+        observables (PauliList): Observables of the cut circuit
+
+    Returns:
+        tuple: (expvals, variances) arrays with one entry per observable
+    """
+    accumulator = qpd_accumulator(coefficients, observables)
+    accumulate(accumulator, list(range(len(results))), list(results))
+    return reconstruct(accumulator)
+
+
+def _concat_padded(arrays, width):
+    """Stack big-endian packed bit arrays, left-padding narrower ones with zero bytes"""
+    return np.concatenate([
+        np.pad(array, ((0, 0), (width - array.shape[1], 0))) for array in arrays
+    ])
+
+
+def allocate_shots(accumulator, total_shots, min_shots=1):
+    """Split a shot budget over sub-experiments to minimize the reconstruction variance
+
+    Sub-experiment ``(i, k)`` contributes ``c_i**2 * sigma**2 / n`` to the
+    variance, so for a fixed total the optimum is ``n`` proportional to
+    ``|c_i| * sigma``. Without shots yet every ``sigma`` is 1 and the split
+    follows the coefficient magnitudes; after a pilot round the measured
+    standard deviations are used, and the shots already taken count towards
+    each target so only the extra shots are returned.
+
+    Parameters:
+        accumulator (dict): State from ``qpd_accumulator``, possibly holding
+            pilot results
+        total_shots (int): Budget of the whole experiment, pilot included
+        min_shots (int): Floor of every sub-experiment with a nonzero
+            coefficient and no shots yet, so none is left unestimated
+
+    Returns:
+        ndarray: Additional shots of every sub-experiment, summing to the
+        remaining budget (or to the ``min_shots`` floors when they exceed
+        it), for ``knitting.sample_sub_experiments``
+    """
+    coefficients = accumulator["coefficients"]
+    weights = accumulator["weights"]
+    num_groups, num_obs = weights.shape
+    taken = accumulator["shots"]
+    remaining = max(int(total_shots - taken.sum()), 0)
+
+    means = accumulator["sums"] / np.maximum(taken, 1)[:, None]
+    # A pilot of a few shots can look noiseless, keep a 1/(n+1) variance floor
+    variances = np.where(taken[:, None] > 0, np.maximum(1 - means**2, 1 / (taken[:, None] + 1)), 1.0)
+    variances = variances.reshape(len(coefficients), num_groups, num_obs)
+    sigma = np.sqrt((variances * weights**2).sum(axis=2)).ravel()
+    score = np.repeat(np.abs(coefficients), num_groups) * sigma
+    if remaining == 0 or not score.any():
+        return np.zeros(len(taken), dtype=np.int64)
+
+    target = (taken.sum() + remaining) * score / score.sum()
+    extra = np.maximum(target - taken, 0)
+    extra *= remaining / extra.sum()
+    floor = np.where((taken == 0) & (score > 0), min_shots, 0)
+    extra = np.maximum(extra, floor)
+    return _round_to_total(extra, remaining, floor)
+
+
+def sample_adaptive(sampler, isa_circuits, accumulator, total_shots, pilot_fraction=0.2, batch_size=100):
+    """Spend a shot budget in a pilot round and a variance-weighted second round
+
+    Parameters:
+        sampler (SamplerV2): Sampler primitive instance
+        isa_circuits (list): ISA sub-experiments in ``generate_cutting_experiments`` order
+        accumulator (dict): State from ``qpd_accumulator``, updated in place
+        total_shots (int): Budget of both rounds together
+        pilot_fraction (float): Share of the budget spent on the pilot round,
+            0 skips the pilot
+        batch_size (int): Number of PUBs per sampler job
+
+    Returns:
+        dict: The updated accumulator, ready for ``reconstruct``
+    """
+    from knitting import sample_sub_experiments
+
+    rounds = [int(total_shots * pilot_fraction), total_shots] if pilot_fraction > 0 else [total_shots]
+    for budget in rounds:
+        shots = allocate_shots(accumulator, budget)
+        for indices, pub_results in sample_sub_experiments(sampler, isa_circuits, batch_size, shots):
+            accumulate(accumulator, indices, pub_results)
+    return accumulator
+
+
+def _round_to_total(values, total, floor):
+    """Round non-negative values to integers summing to total by largest remainder"""
+    counts = np.maximum(np.floor(values).astype(np.int64), floor)
+    short = int(total - counts.sum())
+    if short > 0:
+        order = np.argsort(-(values - np.floor(values)), kind="stable")
+        counts[order[:short]] += 1
+    elif short < 0:
+        # The floors overshot the budget, take shots back from the largest counts
+        for i in np.argsort(-counts, kind="stable"):
+            take = min(-short, int(counts[i] - floor[i]))
+            counts[i] -= take
+            short += take
+            if short == 0:
+                break
+    return counts
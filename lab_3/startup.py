@@ -0,0 +1,118 @@
+import multiprocessing
+import re
+import subprocess
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+# Modules the serverless entry points need on their hot paths
+DEFAULT_PREWARM = ("qiskit", "qiskit.transpiler.preset_passmanagers", "qiskit_aer.primitives", "scipy.optimize")
+
+# Written to stderr right before the profiled statement runs
+_MARKER = "-- import_profile --"
+
+_IMPORT_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+# Prewarmed pools by (max_workers, modules), reused across calls
+_pools = {}
+
+
+def import_profile(statement, top=15, python=sys.executable):
+    """Profile the imports of a statement in a fresh interpreter
+
+    Runs ``python -X importtime -c statement``, so nothing already imported
+    by the caller hides the cost, e.g. ``import_profile("import vqe")`` from
+    the ``lab_3/vqe`` directory.
+
+    Parameters:
+        statement (str): Python code to time, usually imports
+        top (int): Number of modules to report, all of them if None
+        python (str): Interpreter to run
+
+    Returns:
+        dict: ``total`` seconds of all imports and ``modules``, the ``top``
+        (module, cumulative seconds, own seconds) triples, slowest first
+    """
+    # The interpreter's own start-up imports (site, encodings, ...) are
+    # reported before the marker and are not part of the statement's cost
+    code = f"import sys; sys.stderr.write({_MARKER!r} + '\\n'); sys.stderr.flush()\n{statement}"
+    completed = subprocess.run([python, "-X", "importtime", "-c", code], capture_output=True, text=True)
+    if completed.returncode:
+        raise RuntimeError(completed.stderr.strip().splitlines()[-1])
+    lines = completed.stderr.splitlines()
+    rows = []
+    total = 0
+    for line in lines[lines.index(_MARKER) + 1:]:
+        match = _IMPORT_LINE.match(line)
+        if not match:
+            continue
+        own, cumulative, indent, name = match.groups()
+        rows.append((name, int(cumulative) * 1e-6, int(own) * 1e-6))
+        if len(indent) <= 1:
+            # Top-level imports (nesting adds two spaces); their cumulative times add up to the total
+            total += int(cumulative)
+    rows.sort(key=lambda row: row[1], reverse=True)
+    return {"total": total * 1e-6, "modules": rows[:top]}
+
+
+def format_import_profile(profile):
+    """Render the output of ``import_profile`` as a table
+
+    Parameters:
+        profile (dict): Output of ``import_profile``
+
+    Returns:
+        str: One line per module with cumulative and own milliseconds
+    """
+    lines = [f"total import time: {profile['total'] * 1e3:.0f} ms",
+             f"{'cumulative ms':>14} {'own ms':>8}  module"]
+    lines += [f"{cumulative * 1e3:14.1f} {own * 1e3:8.1f}  {name}" for name, cumulative, own in profile["modules"]]
+    return "\n".join(lines)
+
+
+def prewarmed_pool(max_workers=None, modules=DEFAULT_PREWARM):
+    """Process pool whose workers have already imported the given modules
+
+    The pool is created once per (max_workers, modules) and returned again
+    on later calls, so repeated local runs (e.g. ``transpile_parallel_local``
+    over many circuits) do not pay the interpreter and import start-up for
+    every task. All workers are started before this returns.
+
+    Parameters:
+        max_workers (int): Number of worker processes, the CPU count if omitted
+        modules (tuple): Modules to import in every worker
+
+    Returns:
+        ProcessPoolExecutor: Pool ready to accept tasks
+    """
+    max_workers = max_workers or multiprocessing.cpu_count()
+    key = (max_workers, tuple(modules))
+    pool = _pools.get(key)
+    if pool is None:
+        # Spawned workers start with a clean interpreter, so only what _prewarm
+        # imports is loaded before the first task
+        context = multiprocessing.get_context("spawn")
+        pool = ProcessPoolExecutor(max_workers=max_workers, mp_context=context,
+                                   initializer=_prewarm, initargs=(key[1],))
+        # One task per worker makes the pool start them all now
+        for future in [pool.submit(_ready) for _ in range(max_workers)]:
+            future.result()
+        _pools[key] = pool
+    return pool
+
+
+def shutdown_pools():
+    """Shut down every pool created by ``prewarmed_pool``"""
+    while _pools:
+        _, pool = _pools.popitem()
+        pool.shutdown()
+
+
+def _prewarm(modules):
+    import importlib
+
+    for module in modules:
+        importlib.import_module(module)
+
+
+def _ready():
+    return True
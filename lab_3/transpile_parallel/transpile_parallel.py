@@ -1,61 +1,94 @@
 # transpile_parallel.py
 
-from qiskit import QuantumCircuit
-from qiskit.transpiler.preset_passmanagers import generate_preset_pass_manager
-from qiskit_transpiler_service.transpiler_service import TranspilerService
-from qiskit_serverless import get_arguments, save_result, distribute_task, get
-from qiskit_ibm_runtime import QiskitRuntimeService
 from timeit import default_timer as timer
 
+from qiskit_serverless import get_arguments, save_result, distribute_task, get
+
+# Only the serverless API is imported up front; qiskit_ibm_runtime and
+# qiskit_transpiler_service load when the configs that need them are built.
+# See lab_3/startup.py for the import-time profile.
+
 @distribute_task(target={"cpu": 2})
-def transpile_parallel(circuit: QuantumCircuit, config):
+def transpile_parallel(circuit, config):
     """Distributed transpilation for an abstract circuit into an ISA circuit for a given backend."""
     transpiled_circuit = config.run(circuit)
     return transpiled_circuit
 
 
-# Get program arguments
-arguments = get_arguments()
-circuits = arguments.get("circuits")
-backend_name = arguments.get("backend_name")
+def get_backend(backend_name):
+    """Backend by name, without contacting IBM Quantum for fake backends
+
+    Parameters:
+        backend_name (str): e.g. ``"ibm_brisbane"`` or ``"fake_sherbrooke"``
+
+    Returns:
+        BackendV2: The backend
+    """
+    if backend_name.startswith("fake_"):
+        from qiskit_ibm_runtime.fake_provider import FakeProviderForBackendV2
+        return FakeProviderForBackendV2().backend(backend_name)
+    from qiskit_ibm_runtime import QiskitRuntimeService
+    service = QiskitRuntimeService(channel="ibm_quantum")
+    return service.get_backend(backend_name)
+
+
+def main():
+    # Get program arguments
+    arguments = get_arguments()
+    # Arguments packed by transport.encode (transport.py sits next to this file in the working_dir)
+    # are decoded lazily, and the results are then packed the same way
+    encoded = "__transport__" in arguments
+    if encoded:
+        from transport import decode, encode
+        arguments = decode(arguments)
+    circuits = arguments.get("circuits")
+    backend_name = arguments.get("backend_name")
+
+    # Get backend
+    backend = get_backend(backend_name)
+
+    # Define Configs
+    from qiskit.transpiler.preset_passmanagers import generate_preset_pass_manager
+    optimization_levels = [1, 2, 3]
+    pass_managers = [generate_preset_pass_manager(optimization_level=level, backend=backend) for level in optimization_levels]
 
-# Get backend
-service = QiskitRuntimeService(channel="ibm_quantum")
-backend = service.get_backend(backend_name)
+    # Set "transpiler_service": False to skip the service configs and their import
+    transpiler_services = []
+    if arguments.get("transpiler_service", True):
+        from qiskit_transpiler_service.transpiler_service import TranspilerService
+        transpiler_services = [
+                TranspilerService(optimization_level=3, ai=False, backend_name=backend_name),
+                TranspilerService(optimization_level=3, ai=True, backend_name=backend_name),
+            ]
 
-# Define Configs
-optimization_levels = "# Add your code here"
-pass_managers = [generate_preset_pass_manager(optimization_level=level, backend=backend) for level in optimization_levels]
+    configs = pass_managers + transpiler_services
 
-transpiler_services = [
-        TranspilerService( "# Add your code here" ),
-        TranspilerService( "# Add your code here" ),
-    ]
+    # Start process 
+    print("Starting timer")
+    start = timer()
 
-configs = pass_managers + transpiler_services
+    # run distributed tasks as async function
+    # we get task references as a return type
+    sample_task_references = []
+    for circuit in circuits:
+        sample_task_references.append([transpile_parallel(circuit, config) for config in configs])
 
-# Start process 
-print("Starting timer")
-start = timer()
 
-# run distributed tasks as async function
-# we get task references as a return type
-sample_task_references = []
-for circuit in circuits:
-    sample_task_references.append([transpile_parallel(circuit, config) for config in configs])
+    # now we need to collect results from task references
+    results = get([task for subtasks in sample_task_references for task in subtasks])
 
+    end = timer()
 
-# now we need to collect results from task references
-results = get([task for subtasks in sample_task_references for task in subtasks])
+    # Record execution time
+    execution_time_serverless = end-start
+    print("Execution time: ", execution_time_serverless)
 
-end = timer()
+    result = {
+        "transpiled_circuits": results,
+        "execution_time" : execution_time_serverless
+    }
+    save_result(encode(result) if encoded else result)
 
-# Record execution time
-execution_time_serverless = end-start
-print("Execution time: ", execution_time_serverless)
 
-save_result({
-    "transpiled_circuits": results,
-    "execution_time" : execution_time_serverless
-    
-})
\ No newline at end of file
+if __name__ == "__main__":
+    main()
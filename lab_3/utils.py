@@ -1,3 +1,7 @@
+import matplotlib.pyplot as plt
+
+from metrics import circuit_metrics, instruction_table, rank_circuits
+
 
 def plot_execution_times(execution_time_serverless, execution_time_local):
     """
@@ -30,21 +34,26 @@ def plot_execution_times(execution_time_serverless, execution_time_local):
     plt.grid(axis='y', linestyle='--', alpha=0.7)
     plt.show()
 
-import matplotlib.pyplot as plt
 
-def process_transpiled_circuits(configs, result):
+def process_transpiled_circuits(configs, result, backend=None, objective="depth"):
     """
     Processes transpiled circuits, plots the depths for each configuration chunk, and stores the best circuits.
 
     Parameters:
     configs (list): List of configuration dictionaries.
     result (dict): Dictionary containing transpiled circuits.
+    backend (BackendV2): Backend whose instruction durations and errors are used by the "time" objectives.
+    objective (str): Selection criterion, "depth", "time" (critical-path runtime) or "time_fidelity"
+        (runtime divided by estimated fidelity), see metrics.rank_circuits.
 
     Returns:
     best_circuits (list): List of best transpiled circuits.
     best_depths (list): List of depths of the best transpiled circuits.
     best_methods (list): List of methods used to obtain the best depths.
     """
+    if objective != "depth" and backend is None:
+        raise ValueError(f"objective '{objective}' requires a backend")
+
     # Helper function to create configuration names
     def get_config_name(config):
         if 'service' in config:
@@ -63,17 +72,28 @@ def process_transpiled_circuits(configs, result):
     best_depths = []
     best_methods = []
 
+    # Shared by every chunk so each circuit's metrics are computed once
+    table = instruction_table(backend) if backend is not None else None
+    labels = {"depth": "Transpiled Circuit Depth", "time": "Estimated Runtime (us)",
+              "time_fidelity": "Estimated Runtime / Fidelity (us)"}
+
     # Process each chunk of results
     for chunk_start in range(0, len(result), chunk_size):
         chunk_end = chunk_start + chunk_size
         current_chunk = result[chunk_start:chunk_end]
         current_configs = full_configs[chunk_start:chunk_end]
 
-        depths = [transpiled_circuit.depth() for transpiled_circuit in current_chunk]
+        metrics = [circuit_metrics(transpiled_circuit, table=table) for transpiled_circuit in current_chunk]
+        depths = [m["depth"] for m in metrics]
         config_names = [get_config_name(config) for config in current_configs]
         
-        # Find the index of the minimum depth
-        min_depth_index = depths.index(min(depths))
+        # Find the index of the best score (minimum depth by default)
+        order, scores = rank_circuits(current_chunk, backend, objective, table, metrics)
+        min_depth_index = int(order[0])
+        if objective == "depth":
+            values = depths
+        else:
+            values = [round(score * 1e6, 1) for score in scores]
         
         # Store the best circuit, depth, and method
         best_circuit = current_chunk[min_depth_index]
@@ -85,9 +105,9 @@ def process_transpiled_circuits(configs, result):
         
         # Plotting
         plt.figure(figsize=(12, 8))
-        bars = plt.bar(range(len(depths)), depths, tick_label=config_names, color='skyblue')
+        bars = plt.bar(range(len(values)), values, tick_label=config_names, color='skyblue')
         
-        # Highlight the bar with the minimum depth
+        # Highlight the bar with the best score
         bars[min_depth_index].set_color('green')
         
         # Add annotations to highlight the minimum depth
@@ -96,7 +116,7 @@ def process_transpiled_circuits(configs, result):
                      ha='center', va='bottom', color='black')
         
         plt.xlabel('Configuration')
-        plt.ylabel('Transpiled Circuit Depth')
+        plt.ylabel(labels[objective])
         plt.title(f'Transpiled result for circuit {chunk_start // chunk_size}')
         plt.xticks(rotation=45, ha='right')
         plt.grid(axis='y', linestyle='--', alpha=0.7)
@@ -0,0 +1,330 @@
+import hashlib
+
+import numpy as np
+
+# Number of set bits of every byte value, used for vectorized parities
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+# Plans by (grouping kind, operator fingerprint), reused across iterations and calls
+_plans = {}
+
+# Upper bound on the elements of one temporary (rows x terms x bytes) array
+_BLOCK_ELEMENTS = 1 << 24
+
+
+def group_paulis(paulis, kind="qubitwise"):
+    """Partition Pauli terms into groups that can be measured together
+
+    Terms conflict when they do not commute (``"commuting"``) or do not
+    commute qubit by qubit (``"qubitwise"``). The conflict graph is coloured
+    greedily, highest degree first (Welsh-Powell); every colour is a group.
+    Conflicts are evaluated on bit-packed symplectic rows one block at a
+    time, so the full graph is never stored.
+
+    Parameters:
+        paulis (PauliList): Terms, e.g. ``operator.paulis``
+        kind (str): ``"qubitwise"`` or ``"commuting"``
+
+    Returns:
+        list: Term indices (ndarray) of every group, largest group first
+    """
+    if kind not in ("qubitwise", "commuting"):
+        raise ValueError(f"Unknown grouping kind {kind}")
+    x = np.packbits(paulis.x, axis=1)
+    z = np.packbits(paulis.z, axis=1)
+    num_terms = len(x)
+    if num_terms == 0:
+        return []
+
+    rows = max(1, _BLOCK_ELEMENTS // max(1, num_terms * x.shape[1]))
+    degree = np.concatenate([
+        _conflicts(x[i:i + rows], z[i:i + rows], x, z, kind).sum(axis=1)
+        for i in range(0, num_terms, rows)
+    ])
+    colour = np.full(num_terms, -1)
+    num_colours = 0
+    for term in np.argsort(-degree, kind="stable"):
+        neighbours = colour[_conflicts(x[term:term + 1], z[term:term + 1], x, z, kind)[0]]
+        taken = np.zeros(num_colours + 1, dtype=bool)
+        taken[neighbours[neighbours >= 0]] = True
+        colour[term] = np.argmin(taken)
+        num_colours = max(num_colours, colour[term] + 1)
+
+    groups = [np.flatnonzero(colour == c) for c in range(num_colours)]
+    groups.sort(key=len, reverse=True)
+    return groups
+
+
+def measurement_plan(operator, kind="qubitwise"):
+    """Groups, basis-change circuits and parity masks to measure an operator
+
+    The plan only depends on the Pauli terms, not on the coefficients, and is
+    cached by a hash of the terms, so building it again for the same
+    Hamiltonian (every VQE iteration, or every call of a long-lived worker)
+    is a dictionary lookup.
+
+    ``"qubitwise"`` groups need one layer of single-qubit rotations.
+    ``"commuting"`` groups are fewer but their diagonalizing Clifford
+    circuits contain two-qubit gates, which add noise on hardware.
+
+    Parameters:
+        operator (SparsePauliOp): Operator to measure
+        kind (str): ``"qubitwise"`` or ``"commuting"``
+
+    Returns:
+        dict: ``groups`` (term indices), ``circuits`` (basis change of every
+        group, without measurements), ``masks`` (bytes selecting the measured
+        bits of each term, in ``BitArray`` layout), ``signs`` (+-1 per term of
+        the group after the basis change), ``num_qubits`` and ``kind``
+    """
+    key = (kind, _fingerprint(operator.paulis))
+    plan = _plans.get(key)
+    if plan is None:
+        plan = _plans[key] = _build_plan(operator.paulis, kind)
+    return plan
+
+
+def measurement_circuits(ansatz, plan, pm=None):
+    """Ansatz followed by the basis change and measurements of every group
+
+    The ansatz and the planned operator must act on the same qubits. Build
+    the plan on the virtual operator and pass a pass manager to transpile
+    the finished circuits, so the basis changes are laid out with the
+    ansatz; ``measure_all`` keeps classical bit ``i`` on virtual qubit ``i``.
+
+    Parameters:
+        ansatz (QuantumCircuit): Parameterized ansatz circuit
+        plan (dict): Output of ``measurement_plan``
+        pm (PassManager): Transpiles the circuits if given
+
+    Returns:
+        list: One circuit per group, measured into the ``meas`` register
+    """
+    circuits = []
+    for basis in plan["circuits"]:
+        circ = ansatz.compose(basis)
+        circ.measure_all()
+        circuits.append(circ)
+    return pm.run(circuits) if pm is not None else circuits
+
+
+def grouped_energy(plan, coeffs, bit_arrays):
+    """Energy from the sampler results of the measurement circuits
+
+    Repeated outcomes are merged first, then the parity of every outcome
+    under every term mask comes from one byte-wise AND and popcount lookup.
+
+    Parameters:
+        plan (dict): Output of ``measurement_plan``
+        coeffs (ndarray): Coefficients of the operator, e.g. ``operator.coeffs``
+        bit_arrays (list): ``BitArray`` of every group in plan order, e.g.
+            ``[pub.data.meas for pub in result]``; leading (parameter sweep)
+            dimensions are kept
+
+    Returns:
+        float or ndarray: Energy, with the shape of the bit arrays
+    """
+    coeffs = np.asarray(coeffs)
+    energy = 0.0
+    for group, masks, signs, bits in zip(plan["groups"], plan["masks"], plan["signs"], bit_arrays):
+        expectations = parity_expectations(bits.array, masks)
+        energy = energy + np.real(expectations @ (signs * coeffs[group]))
+    return float(energy) if np.ndim(energy) == 0 else energy
+
+
+def parity_expectations(array, masks):
+    """Mean of (-1)^parity over the shots for every mask
+
+    Parameters:
+        array (ndarray): ``BitArray.array``, shape (..., shots, bytes)
+        masks (ndarray): uint8 masks, shape (terms, bytes)
+
+    Returns:
+        ndarray: Expectations, shape (..., terms)
+    """
+    shape = array.shape[:-2]
+    flat = array.reshape(-1, *array.shape[-2:])
+    out = np.empty((len(flat), len(masks)))
+    for p, shots in enumerate(flat):
+        outcomes, counts = np.unique(shots, axis=0, return_counts=True)
+        rows = max(1, _BLOCK_ELEMENTS // max(1, masks.size))
+        total = np.zeros(len(masks))
+        for i in range(0, len(outcomes), rows):
+            ones = _POPCOUNT[outcomes[i:i + rows, None, :] & masks[None, :, :]].sum(axis=2)
+            total += counts[i:i + rows] @ (1 - 2 * (ones & 1).astype(np.int64))
+        out[p] = total / len(shots)
+    return out.reshape(*shape, len(masks))
+
+
+def z_masks(z):
+    """Pack Z positions into masks for ``parity_expectations``
+
+    Parameters:
+        z (ndarray): Boolean (terms x qubits), qubit 0 first as in ``PauliList.z``
+
+    Returns:
+        ndarray: uint8 (terms x bytes) in ``BitArray`` layout, qubit 0 in the
+        lowest bit of the last byte
+    """
+    num_qubits = z.shape[1]
+    pad = (-num_qubits) % 8
+    bits = np.concatenate([np.zeros((len(z), pad), dtype=bool), z[:, ::-1]], axis=1)
+    return np.packbits(bits, axis=1)
+
+
+def _fingerprint(paulis, coeffs=None):
+    """Hash of the Pauli terms, and of their coefficients if given, as a cache key"""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(np.int64(paulis.num_qubits).tobytes())
+    digest.update(np.packbits(paulis.z, axis=1).tobytes())
+    digest.update(np.packbits(paulis.x, axis=1).tobytes())
+    if coeffs is not None:
+        digest.update(np.ascontiguousarray(coeffs).tobytes())
+    return digest.hexdigest()
+
+
+def _conflicts(x_rows, z_rows, x, z, kind):
+    """Boolean (rows x terms) matrix of the pairs that cannot share a group"""
+    if kind == "qubitwise":
+        # Both act on a qubit with different Paulis
+        support = (x_rows | z_rows)[:, None, :] & (x | z)[None, :, :]
+        differ = (x_rows[:, None, :] ^ x[None, :, :]) | (z_rows[:, None, :] ^ z[None, :, :])
+        return (support & differ).any(axis=2)
+    # Anticommute: odd symplectic product
+    product = (x_rows[:, None, :] & z[None, :, :]) ^ (z_rows[:, None, :] & x[None, :, :])
+    return (_POPCOUNT[product].sum(axis=2) & 1).astype(bool)
+
+
+def _build_plan(paulis, kind):
+    from qiskit import QuantumCircuit
+
+    num_qubits = paulis.num_qubits
+    groups = group_paulis(paulis, kind)
+    plan = {"num_qubits": num_qubits, "kind": kind, "groups": groups, "circuits": [], "masks": [], "signs": []}
+    for group in groups:
+        terms = paulis[group]
+        if kind == "qubitwise":
+            basis = _qubitwise_basis(terms)
+        else:
+            basis = _diagonalizing_circuit(terms)
+        circuit = QuantumCircuit(num_qubits)
+        for name, qubits in basis:
+            getattr(circuit, name)(*qubits)
+        images = terms.evolve(circuit, frame="s")
+        if images.x.any():
+            raise RuntimeError("Basis change did not diagonalize a measurement group")
+        # Phase 2 is a -1 sign; Hermitian terms never map to +-i
+        plan["signs"].append(1 - (images.phase == 2) * 2)
+        plan["masks"].append(z_masks(images.z))
+        plan["circuits"].append(circuit)
+    return plan
+
+
+def _qubitwise_basis(terms):
+    """Single-qubit rotations taking every term of a qubit-wise group to Z-strings"""
+    x = terms.x.any(axis=0)
+    y = (terms.x & terms.z).any(axis=0)
+    gates = []
+    for q in np.flatnonzero(x):
+        if y[q]:
+            gates.append(("sdg", (int(q),)))
+        gates.append(("h", (int(q),)))
+    return gates
+
+
+def _diagonalizing_circuit(terms):
+    """H, S, CX and CZ gates taking a group of commuting Paulis to Z-strings
+
+    Works on an independent generating set: Hadamards make its X block full
+    rank, CXs reduce the X block to one pivot qubit per generator, CZs and
+    Ss clear the Z block and final Hadamards turn each generator into a
+    single Z on its pivot.
+    """
+    x, z = _independent_rows(terms.x.astype(np.uint8), terms.z.astype(np.uint8))
+    gates = []
+
+    def h(q):
+        x[:, q], z[:, q] = z[:, q].copy(), x[:, q].copy()
+        gates.append(("h", (q,)))
+
+    # Generators without X support get Hadamards on qubits outside the X pivots
+    pivots = _row_reduce(x, z, x)
+    rest = np.array([r for r in range(len(x)) if not x[r].any()], dtype=int)
+    if len(rest):
+        free = np.array([q for q in range(x.shape[1]) if q not in pivots], dtype=int)
+        sub_x, sub_z = x[rest], z[rest]
+        for q in free[_row_reduce(sub_x, sub_z, sub_z[:, free])]:
+            h(int(q))
+    pivots = _row_reduce(x, z, x)
+
+    for row, pivot in enumerate(pivots):
+        for q in map(int, np.flatnonzero(x[row])):
+            if q != pivot:
+                x[:, q] ^= x[:, pivot]
+                z[:, pivot] ^= z[:, q]
+                gates.append(("cx", (pivot, q)))
+    pivot_set = set(pivots)
+    for row, pivot in enumerate(pivots):
+        for q in map(int, np.flatnonzero(z[row])):
+            if q not in pivot_set:
+                z[:, q] ^= x[:, pivot]
+                gates.append(("cz", (pivot, q)))
+    for row, pivot in enumerate(pivots):
+        for other in range(row + 1, len(pivots)):
+            if z[row, pivots[other]]:
+                z[:, pivots[other]] ^= x[:, pivot]
+                z[:, pivot] ^= x[:, pivots[other]]
+                gates.append(("cz", (pivot, pivots[other])))
+        if z[row, pivot]:
+            z[:, pivot] ^= x[:, pivot]
+            gates.append(("s", (pivot,)))
+    for pivot in pivots:
+        h(pivot)
+    return gates
+
+
+def _independent_rows(x, z):
+    """Rows of a generating set of the group spanned by the (x, z) rows"""
+    x, z = x.copy(), z.copy()
+    _row_reduce(x, z, np.concatenate([x, z], axis=1))
+    keep = (x | z).any(axis=1)
+    return x[keep], z[keep]
+
+
+def _row_reduce(x, z, key):
+    """Gauss-Jordan elimination over GF(2) driven by the columns of ``key``
+
+    Row operations are applied to ``x``, ``z`` and ``key`` in place (``key``
+    may be ``x``, ``z`` or an array holding selected columns of them) and
+    rows are reordered so that row ``i`` owns pivot ``i``.
+
+    Returns:
+        list: Pivot column of every leading row
+    """
+    pivots = []
+    row = 0
+    for column in range(key.shape[1]):
+        hits = np.flatnonzero(key[row:, column]) + row
+        if not len(hits):
+            continue
+        swap = [row, hits[0]]
+        for array in _distinct(x, z, key):
+            array[swap] = array[swap[::-1]]
+        for other in np.flatnonzero(key[:, column]):
+            if other != row:
+                for array in _distinct(x, z, key):
+                    array[other] ^= array[row]
+        pivots.append(column)
+        row += 1
+        if row == len(key):
+            break
+    return pivots
+
+
+def _distinct(*arrays):
+    """The arrays, skipping any that is the same object as an earlier one"""
+    seen = []
+    for array in arrays:
+        if not any(array is other for other in seen):
+            seen.append(array)
+    return seen
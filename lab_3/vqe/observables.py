@@ -0,0 +1,123 @@
+import numpy as np
+
+from measurement import _fingerprint
+
+# Laid-out operators by (operator fingerprint, physical indices, width)
+_laid_out = {}
+
+# Entries kept in _laid_out before the oldest are dropped
+MAX_CACHED = 256
+
+
+def layout_indices(layout, num_qubits=None):
+    """Physical qubit of every virtual qubit and the width of the laid-out operator
+
+    Parameters:
+        layout (TranspileLayout or list): ``isa_circuit.layout``, or the
+            physical index of every virtual qubit
+        num_qubits (int): Width to expand to; defaults to the number of
+            circuit qubits for a ``TranspileLayout``
+
+    Returns:
+        tuple: (tuple of physical indices, number of qubits)
+    """
+    from qiskit.transpiler import TranspileLayout
+
+    width = None
+    if isinstance(layout, TranspileLayout):
+        width = len(layout._output_qubit_list)
+        # Includes the permutation left by routing, like SparsePauliOp.apply_layout
+        layout = layout.final_index_layout()
+    indices = tuple(int(q) for q in layout)
+    if num_qubits is not None:
+        if width is not None and num_qubits < width:
+            raise ValueError(f"A {width} qubit layout cannot be applied to {num_qubits} qubits")
+        width = num_qubits
+    if width is None:
+        width = len(indices)
+    if len(set(indices)) != len(indices) or any(q < 0 or q >= width for q in indices):
+        raise ValueError(f"Layout {indices} is not a set of distinct qubits below {width}")
+    return indices, width
+
+
+def apply_layout(operator, layout, num_qubits=None):
+    """Same result as ``operator.apply_layout(layout, num_qubits)``, memoized
+
+    The Pauli terms are moved to their physical qubits with one column
+    gather on the symplectic ``x`` and ``z`` arrays, instead of composing the operator
+    into an identity of the full width. Results are cached by the operator
+    contents and the layout, so repeating the call (every iteration, every
+    restart, every classifier sharing a layout) is a hash and a lookup. The
+    returned operator is shared with the cache and must not be modified in
+    place.
+
+    Parameters:
+        operator (SparsePauliOp): Operator on the virtual qubits
+        layout (TranspileLayout or list): See ``layout_indices``; ``None``
+            keeps every qubit in place, as in Qiskit
+        num_qubits (int): Width of the result, see ``layout_indices``
+
+    Returns:
+        SparsePauliOp: Operator on the physical qubits
+    """
+    return apply_layout_batch([operator], layout, num_qubits)[0]
+
+
+def apply_layout_batch(operators, layout, num_qubits=None):
+    """Lay out several operators with one layout in a single gather
+
+    Parameters:
+        operators (list): SparsePauliOps on the same virtual qubits
+        layout (TranspileLayout or list): See ``layout_indices``; ``None``
+            keeps every qubit in place, as in Qiskit
+        num_qubits (int): Width of the results, see ``layout_indices``
+
+    Returns:
+        list: Laid-out operators, in the order given
+    """
+    if layout is None:
+        if num_qubits is None:
+            return [op.copy() for op in operators]
+        # The trivial layout, padded with identities up to num_qubits
+        layout = range(operators[0].num_qubits) if operators else []
+    indices, width = layout_indices(layout, num_qubits)
+    results = [None] * len(operators)
+    missing = []
+    keys = []
+    for i, op in enumerate(operators):
+        if op.num_qubits != len(indices):
+            raise ValueError(f"A {len(indices)} qubit layout cannot be applied to a "
+                             f"{op.num_qubits} qubit operator")
+        key = (_fingerprint(op.paulis, op.coeffs), indices, width)
+        keys.append(key)
+        results[i] = _laid_out.get(key)
+        if results[i] is None:
+            missing.append(i)
+    if not missing:
+        return results
+
+    from qiskit.quantum_info import PauliList, SparsePauliOp
+
+    # All terms of all missing operators are moved together. Rows hold the
+    # virtual x bits, a zero column, the virtual z bits and another zero
+    # column; gathering columns (contiguous reads) is much faster than
+    # scattering them into a wide zero array
+    num_virtual = len(indices)
+    bounds = np.cumsum([0] + [len(operators[i]) for i in missing])
+    rows = np.zeros((bounds[-1], 2 * num_virtual + 2), dtype=bool)
+    for i, start, stop in zip(missing, bounds[:-1], bounds[1:]):
+        rows[start:stop, :num_virtual] = operators[i].paulis.x
+        rows[start:stop, num_virtual + 1:-1] = operators[i].paulis.z
+    source = np.full(width, num_virtual)
+    source[list(indices)] = np.arange(num_virtual)
+    moved = np.take(rows, np.concatenate([source, source + num_virtual + 1]), axis=1)
+    new_x, new_z = moved[:, :width], moved[:, width:]
+    for i, start, stop in zip(missing, bounds[:-1], bounds[1:]):
+        paulis = PauliList.from_symplectic(np.ascontiguousarray(new_z[start:stop]),
+                                           np.ascontiguousarray(new_x[start:stop]))
+        results[i] = SparsePauliOp(paulis, operators[i].coeffs.copy(), ignore_pauli_phase=True, copy=False)
+        while len(_laid_out) >= MAX_CACHED:
+            _laid_out.pop(next(iter(_laid_out)))
+        _laid_out[keys[i]] = results[i]
+    return results
+
@@ -0,0 +1,106 @@
+import numpy as np
+
+
+def precision_schedule(initial=0.05, final=0.005, factor=0.5, patience=5, noise_scale=1.0, evaluation=None):
+    """Create the state of a precision schedule for a noisy optimization
+
+    The optimizer starts at a loose estimator ``precision`` (standard error
+    of each expectation value; the runtime Estimator turns precision ``p``
+    into about ``1 / p**2`` shots). It is tightened by ``factor`` whenever
+    the best cost has not improved by more than the current noise level
+    over ``patience`` evaluations, and it follows the optimizer's step
+    size: when the median of the recent steps falls to a fraction of the
+    first steps, the precision is scaled down by the same fraction. It
+    never gets looser and never goes below ``final``. The optimal point is
+    then re-evaluated once at ``evaluation``.
+
+    Parameters:
+        initial (float): Precision of the first evaluations
+        final (float): Tightest precision
+        factor (float): Multiplier applied when progress stalls
+        patience (int): Evaluations without a significant improvement
+            before tightening, also the window of the step-size median
+        noise_scale (float): Noise of the cost in units of the precision,
+            e.g. ``sum(abs(coeffs))`` bounds it for a sum of separately
+            estimated terms and ``sqrt(n)`` fits a sum of ``n`` independent ones
+        evaluation (float): Precision of the final re-evaluation, ``final`` if omitted
+
+    Returns:
+        dict: Schedule state, with the current ``precision``, ``history`` of
+        (precision, cost) per evaluation and the estimated ``shots`` per PUB
+    """
+    return {
+        "precision": initial,
+        "initial": initial,
+        "final": final,
+        "evaluation": final if evaluation is None else evaluation,
+        "factor": factor,
+        "patience": patience,
+        "noise_scale": noise_scale,
+        "best": np.inf,
+        "since_best": 0,
+        "prev_params": None,
+        "steps": [],
+        "history": [],
+        "shots": 0,
+    }
+
+
+def update_precision(schedule, params, cost):
+    """Record one evaluation and tighten the precision if progress calls for it
+
+    Parameters:
+        schedule (dict): State from ``precision_schedule``, updated in place
+        params (ndarray): Parameters of the evaluation
+        cost (float): Cost measured at ``schedule["precision"]``
+
+    Returns:
+        float: Precision for the next evaluation
+    """
+    precision = schedule["precision"]
+    schedule["history"].append((precision, float(cost)))
+    schedule["shots"] += int(np.ceil(1 / precision ** 2))
+
+    params = np.asarray(params, dtype=float)
+    if schedule["prev_params"] is not None:
+        schedule["steps"].append(float(np.linalg.norm(params - schedule["prev_params"])))
+    schedule["prev_params"] = params.copy()
+
+    # Improvements below the noise of the estimates do not count as progress
+    if cost < schedule["best"] - schedule["noise_scale"] * precision:
+        schedule["best"] = cost
+        schedule["since_best"] = 0
+    else:
+        schedule["best"] = min(schedule["best"], cost)
+        schedule["since_best"] += 1
+    if schedule["since_best"] >= schedule["patience"]:
+        precision *= schedule["factor"]
+        schedule["since_best"] = 0
+
+    patience = schedule["patience"]
+    steps = schedule["steps"]
+    if len(steps) >= 2 * patience:
+        # The first steps set the scale; later ones shrink as the optimizer converges
+        ratio = np.median(steps[-patience:]) / max(np.median(steps[:patience]), 1e-12)
+        precision = min(precision, schedule["initial"] * ratio)
+
+    schedule["precision"] = max(schedule["final"], precision)
+    return schedule["precision"]
+
+
+def scheduled_cost(cost, schedule):
+    """Turn ``cost(params, precision)`` into a one-argument cost following the schedule
+
+    Parameters:
+        cost (callable): Cost evaluated at a given estimator precision
+        schedule (dict): State from ``precision_schedule``
+
+    Returns:
+        callable: Cost of ``params`` for ``scipy.optimize.minimize``
+    """
+    def evaluate(params):
+        value = cost(params, schedule["precision"])
+        update_precision(schedule, params, value)
+        return value
+
+    return evaluate
@@ -0,0 +1,155 @@
+import numpy as np
+
+from measurement import parity_expectations, z_masks
+
+# Basis codes of random_bases
+X_BASIS, Y_BASIS, Z_BASIS = 0, 1, 2
+
+
+def shadow_template(ansatz, pm=None):
+    """Measured ansatz whose per-qubit measurement basis is set by parameters
+
+    Every qubit gets ``rx(b)`` and ``ry(a)`` before its measurement:
+    ``ry(-pi/2)`` measures X, ``rx(pi/2)`` measures Y and zero angles
+    measure Z. Any set of random bases is then one parameter sweep of the
+    same circuit, so the template is built and transpiled once per ansatz
+    and a whole shadow is a single PUB.
+
+    Parameters:
+        ansatz (QuantumCircuit): Parameterized ansatz circuit, virtual
+        pm (PassManager): Transpiles the template if given
+
+    Returns:
+        dict: ``circuit``, the column of every ansatz parameter
+        (``ansatz_columns``) and of every qubit's ``ry`` and ``rx`` angle
+        (``y_columns``, ``x_columns``) in the circuit's parameter order, and
+        ``num_qubits``
+    """
+    from qiskit.circuit import ParameterVector
+
+    num_qubits = ansatz.num_qubits
+    ry_angles = ParameterVector("_shadow_ry", num_qubits)
+    rx_angles = ParameterVector("_shadow_rx", num_qubits)
+    circuit = ansatz.copy()
+    for q in range(num_qubits):
+        circuit.rx(rx_angles[q], q)
+        circuit.ry(ry_angles[q], q)
+    circuit.measure_all()
+    if pm is not None:
+        circuit = pm.run(circuit)
+    column = {param.name: i for i, param in enumerate(circuit.parameters)}
+    return {
+        "circuit": circuit,
+        "ansatz_columns": np.array([column[param.name] for param in ansatz.parameters], dtype=int),
+        "y_columns": np.array([column[param.name] for param in ry_angles], dtype=int),
+        "x_columns": np.array([column[param.name] for param in rx_angles], dtype=int),
+        "num_qubits": num_qubits,
+    }
+
+
+def random_bases(num_bases, num_qubits, seed=None):
+    """Uniformly random Pauli measurement basis of every qubit
+
+    Parameters:
+        num_bases (int): Number of random settings
+        num_qubits (int): Number of qubits
+        seed (int): Seed of the random generator
+
+    Returns:
+        ndarray: int8 (settings x qubits) of ``X_BASIS``, ``Y_BASIS`` or ``Z_BASIS``
+    """
+    return np.random.default_rng(seed).integers(0, 3, size=(num_bases, num_qubits), dtype=np.int8)
+
+
+def shadow_pub(template, params, bases, shots=None):
+    """Sampler PUB measuring the ansatz at ``params`` in every random basis
+
+    Parameters:
+        template (dict): Output of ``shadow_template``
+        params (ndarray): Ansatz parameters
+        bases (ndarray): Output of ``random_bases``
+        shots (int): Shots per basis, the sampler default if omitted
+
+    Returns:
+        tuple: (circuit, parameter values of shape (settings, parameters), shots)
+    """
+    values = np.zeros((len(bases), template["circuit"].num_parameters))
+    values[:, template["ansatz_columns"]] = params
+    values[:, template["y_columns"]] = np.where(bases == X_BASIS, -np.pi / 2, 0.0)
+    values[:, template["x_columns"]] = np.where(bases == Y_BASIS, np.pi / 2, 0.0)
+    return template["circuit"], values, shots
+
+
+def shadow_expectations(bases, bit_array, paulis, median_of_means=1):
+    """Estimate Pauli expectation values from a classical shadow
+
+    A setting contributes to a Pauli only if it measured every qubit of the
+    Pauli's support in the matching basis; it then contributes ``3**weight``
+    times the mean parity of its shots on that support. Matches are
+    found with one vectorized comparison of all settings against all
+    Paulis, and the parities come from the same byte-wise popcount as
+    ``measurement.grouped_energy``.
+
+    Parameters:
+        bases (ndarray): Settings the shadow was taken in
+        bit_array (BitArray): Sampler data of ``shadow_pub``, e.g.
+            ``result[0].data.meas``, with one entry per setting
+        paulis (PauliList): Paulis to estimate; phases are ignored
+        median_of_means (int): Number of batches of settings whose means are
+            combined by a median, which bounds the effect of outliers
+
+    Returns:
+        tuple: (estimates, standard errors) per Pauli
+    """
+    x, z = paulis.x, paulis.z
+    support = x | z
+    code = np.where(x & z, Y_BASIS, np.where(x, X_BASIS, Z_BASIS))
+    # (settings x Paulis): every supported qubit measured in the Pauli's basis
+    match = ~((bases[:, None, :] != code[None, :, :]) & support[None, :, :]).any(axis=2)
+    weight = support.sum(axis=1)
+
+    parities = parity_expectations(bit_array.array, z_masks(support))
+    values = np.where(match, parities, 0.0) * 3.0 ** weight
+    batches = np.array_split(values, median_of_means)
+    estimates = np.median([batch.mean(axis=0) for batch in batches], axis=0)
+    errors = values.std(axis=0) / np.sqrt(len(values))
+    return estimates, errors
+
+
+def shadow_energy(bases, bit_array, operator, median_of_means=1):
+    """Energy of an operator from a classical shadow
+
+    Parameters:
+        bases (ndarray): Settings the shadow was taken in
+        bit_array (BitArray): Sampler data of ``shadow_pub``
+        operator (SparsePauliOp): Hamiltonian on the ansatz qubits
+        median_of_means (int): See ``shadow_expectations``
+
+    Returns:
+        float: Energy estimate
+    """
+    estimates, _ = shadow_expectations(bases, bit_array, operator.paulis, median_of_means)
+    return float(np.real(estimates @ operator.coeffs))
+
+
+def shadow_size(paulis, epsilon=0.1, delta=0.01):
+    """Number of single-shot snapshots that bound every estimate's error
+
+    Bound of Huang, Kueng and Preskill for random Pauli measurements: with
+    this many snapshots (settings times shots) all ``len(paulis)`` estimates
+    are within ``epsilon`` with probability ``1 - delta``, using a median of
+    ``2 log(2 L / delta)`` means. It grows with the log of the number of
+    Paulis and with ``3**weight`` of the heaviest one.
+
+    Parameters:
+        paulis (PauliList): Paulis to estimate
+        epsilon (float): Additive error
+        delta (float): Failure probability
+
+    Returns:
+        tuple: (number of snapshots, number of batches for ``median_of_means``)
+    """
+    weight = int((paulis.x | paulis.z).sum(axis=1).max(initial=0))
+    batches = int(np.ceil(2 * np.log(2 * len(paulis) / delta)))
+    per_batch = int(np.ceil(34 * 3 ** weight / epsilon ** 2))
+    return batches * per_batch, batches
@@ -0,0 +1,298 @@
+# Serverless uploads each working_dir alone, so vqe/ and transpile_parallel/
+# both ship this module; the two copies are kept identical
+import base64
+import io
+import json
+import struct
+import zlib
+from collections.abc import Mapping
+
+import numpy as np
+
+# Marker key of an encoded payload, with the format version as its value
+MARKER = "__transport__"
+
+# Compressed parts above this size are split further when possible, in bytes
+DEFAULT_CHUNK_SIZE = 1 << 20
+
+
+def available_codecs():
+    """List the usable compression codecs, fastest to decode first
+
+    ``zstd`` needs the ``zstandard`` package and ``lz4`` the ``lz4`` package;
+    ``zlib`` from the standard library is always available.
+
+    Returns:
+        list: Codec names accepted by ``encode``
+    """
+    codecs = []
+    for name in ("zstd", "lz4"):
+        try:
+            _codec(name)
+        except ImportError:
+            continue
+        codecs.append(name)
+    return codecs + ["zlib"]
+
+
+def encode(payload, codec=None, chunk_size=DEFAULT_CHUNK_SIZE, level=None):
+    """Pack serverless arguments or results into a small JSON-safe dictionary
+
+    Circuits are stored as QPY, ``SparsePauliOp``s as packed Pauli bits plus
+    their coefficients, numeric arrays and lists as raw NumPy buffers and
+    other plain values as JSON. Every part is compressed on its own and
+    lists of circuits and long arrays are split into parts of roughly
+    ``chunk_size`` bytes, so ``decode`` can expand them lazily. Values of
+    any other type (e.g. a ``QiskitRuntimeService``) are passed through as
+    they are.
+
+    Parameters:
+        payload (dict): Arguments for ``get_arguments`` or a ``save_result`` dict
+        codec (str): ``"zstd"``, ``"lz4"`` or ``"zlib"``, the first available if omitted
+        chunk_size (int): Target size of one part before compression, in bytes
+        level (int): Compression level, the codec default if omitted
+
+    Returns:
+        dict: Encoded payload to pass instead of ``payload``
+    """
+    codec = available_codecs()[0] if codec is None else codec
+    compress, _ = _codec(codec, level)
+    fields = {}
+    passthrough = {}
+    for key, value in payload.items():
+        packed = _pack(value, chunk_size)
+        if packed is None:
+            passthrough[key] = value
+            continue
+        kind, meta, parts = packed
+        fields[key] = {
+            "kind": kind,
+            "meta": meta,
+            "parts": [base64.b64encode(compress(part)).decode("ascii") for part in parts],
+        }
+    return {MARKER: 1, "codec": codec, "fields": fields, **passthrough}
+
+
+def decode(payload):
+    """Open a payload made by ``encode``; fields are decoded on first access
+
+    Parameters:
+        payload (dict): Output of ``encode``, or a plain dictionary which is
+            returned unchanged
+
+    Returns:
+        Mapping: Read-only view of the original payload
+    """
+    if not is_encoded(payload):
+        return payload
+    return _LazyPayload(payload)
+
+
+def is_encoded(payload):
+    """Tell whether a dictionary was produced by ``encode``"""
+    return isinstance(payload, Mapping) and MARKER in payload and not isinstance(payload, _LazyPayload)
+
+
+def iter_field(payload, key):
+    """Decode one field part by part, e.g. transpiled circuits as they are needed
+
+    Parameters:
+        payload (dict): Output of ``encode``
+        key (str): Field name
+
+    Returns:
+        generator: Circuits or operators one at a time for list fields,
+        otherwise the whole value once
+    """
+    field = payload["fields"][key]
+    _, decompress = _codec(payload["codec"])
+    kind = field["kind"]
+    for part in field["parts"]:
+        value = _unpack_part(kind, field["meta"], decompress(base64.b64decode(part)))
+        if kind in ("circuits", "operators"):
+            yield from value
+        else:
+            yield value
+
+
+class _LazyPayload(Mapping):
+    """Mapping view of an encoded payload that decodes each field once, when read"""
+
+    def __init__(self, payload):
+        self._payload = payload
+        self._fields = payload["fields"]
+        self._plain = {k: v for k, v in payload.items() if k not in (MARKER, "codec", "fields")}
+        self._decoded = {}
+
+    def __getitem__(self, key):
+        if key in self._plain:
+            return self._plain[key]
+        if key not in self._decoded:
+            if key not in self._fields:
+                raise KeyError(key)
+            self._decoded[key] = _join(self._fields[key], list(iter_field(self._payload, key)))
+        return self._decoded[key]
+
+    def __iter__(self):
+        yield from self._fields
+        yield from self._plain
+
+    def __len__(self):
+        return len(self._fields) + len(self._plain)
+
+
+def _codec(name, level=None):
+    """(compress, decompress) functions of a codec"""
+    if name == "zstd":
+        import zstandard
+
+        compressor = zstandard.ZstdCompressor(level=3 if level is None else level)
+        return compressor.compress, zstandard.ZstdDecompressor().decompress
+    if name == "lz4":
+        import lz4.frame
+
+        return (lambda data: lz4.frame.compress(data, compression_level=level or 0)), lz4.frame.decompress
+    if name == "zlib":
+        return (lambda data: zlib.compress(data, 6 if level is None else level)), zlib.decompress
+    raise ValueError(f"Unknown codec {name}")
+
+
+def _pack(value, chunk_size):
+    """Return (kind, JSON metadata, list of raw parts), or None to pass the value through"""
+    from qiskit import QuantumCircuit
+    from qiskit.quantum_info import SparsePauliOp
+
+    if isinstance(value, QuantumCircuit):
+        return "circuit", {}, [_qpy([value])]
+    if isinstance(value, SparsePauliOp):
+        return "operator", {}, [_operator_bytes(value)]
+    if isinstance(value, (list, tuple)) and value and all(isinstance(v, QuantumCircuit) for v in value):
+        return "circuits", {}, _grouped(value, _qpy, chunk_size)
+    if isinstance(value, (list, tuple)) and value and all(isinstance(v, SparsePauliOp) for v in value):
+        return "operators", {}, [_operator_bytes(op) for op in value]
+    array = _numeric_array(value)
+    if array is not None:
+        if array.ndim == 0 or len(array) == 0:
+            parts = [_array_bytes(array)]
+        else:
+            rows = max(1, chunk_size // max(1, array.nbytes // len(array)))
+            parts = [_array_bytes(array[i:i + rows]) for i in range(0, len(array), rows)]
+        return "array", {"list": not isinstance(value, np.ndarray), "shape": list(array.shape)}, parts
+    try:
+        return "json", {}, [json.dumps(value, default=_json_default).encode()]
+    except TypeError:
+        return None
+
+
+def _numeric_array(value):
+    """Value as a numeric ndarray if it is one or a rectangular list of numbers"""
+    if isinstance(value, np.ndarray):
+        return value if value.dtype.kind in "biufc" else None
+    if isinstance(value, (list, tuple)) and value:
+        try:
+            array = np.asarray(value)
+        except ValueError:
+            return None
+        if array.dtype.kind in "biufc" and array.size > 1:
+            return array
+    return None
+
+
+def _grouped(items, dump, chunk_size):
+    """Length-prefixed dumps of single items, joined into parts of about chunk_size bytes"""
+    parts, part = [], b""
+    for item in items:
+        data = dump([item])
+        if part and len(part) + len(data) > chunk_size:
+            parts.append(part)
+            part = b""
+        part += struct.pack("<Q", len(data)) + data
+    parts.append(part)
+    return parts
+
+
+def _split(data):
+    """Inverse of the framing used by ``_grouped``"""
+    offset = 0
+    while offset < len(data):
+        (length,) = struct.unpack_from("<Q", data, offset)
+        yield data[offset + 8:offset + 8 + length]
+        offset += 8 + length
+
+
+def _qpy(circuits):
+    from qiskit import qpy
+
+    buffer = io.BytesIO()
+    qpy.dump(list(circuits), buffer)
+    return buffer.getvalue()
+
+
+def _array_bytes(array):
+    array = np.ascontiguousarray(array)
+    header = json.dumps({"dtype": array.dtype.str, "shape": array.shape}).encode()
+    return struct.pack("<I", len(header)) + header + array.tobytes()
+
+
+def _array_from_bytes(data):
+    (length,) = struct.unpack_from("<I", data)
+    header = json.loads(data[4:4 + length])
+    return np.frombuffer(data, dtype=header["dtype"], offset=4 + length).reshape(header["shape"])
+
+
+def _operator_bytes(op):
+    paulis = op.paulis
+    # Phases of the Pauli list are already folded into the coefficients of a SparsePauliOp
+    bits = np.packbits(np.concatenate([paulis.z, paulis.x], axis=1), axis=1)
+    return _array_bytes(np.array([op.num_qubits], dtype=np.int64)) + _array_bytes(bits) + _array_bytes(op.coeffs)
+
+
+def _operator_from_bytes(data):
+    from qiskit.quantum_info import PauliList, SparsePauliOp
+
+    arrays = []
+    offset = 0
+    for _ in range(3):
+        (length,) = struct.unpack_from("<I", data, offset)
+        header = json.loads(data[offset + 4:offset + 4 + length])
+        size = int(np.prod(header["shape"], dtype=np.int64)) * np.dtype(header["dtype"]).itemsize
+        end = offset + 4 + length + size
+        arrays.append(_array_from_bytes(data[offset:end]))
+        offset = end
+    num_qubits = int(arrays[0][0])
+    bits = np.unpackbits(arrays[1], axis=1, count=2 * num_qubits).astype(bool)
+    paulis = PauliList.from_symplectic(bits[:, :num_qubits], bits[:, num_qubits:])
+    return SparsePauliOp(paulis, arrays[2].copy(), ignore_pauli_phase=True)
+
+
+def _unpack_part(kind, meta, data):
+    if kind in ("circuit", "circuits"):
+        from qiskit import qpy
+
+        if kind == "circuit":
+            return qpy.load(io.BytesIO(data))[0]
+        return [qpy.load(io.BytesIO(chunk))[0] for chunk in _split(data)]
+    if kind in ("operator", "operators"):
+        op = _operator_from_bytes(data)
+        return op if kind == "operator" else [op]
+    if kind == "array":
+        return _array_from_bytes(data)
+    return json.loads(data)
+
+
+def _join(field, parts):
+    """Whole value of a field from its decoded parts"""
+    kind, meta = field["kind"], field["meta"]
+    if kind in ("circuits", "operators"):
+        return parts
+    if kind == "array":
+        array = np.concatenate(parts) if len(parts) > 1 else parts[0].copy()
+        array = array.reshape(meta["shape"])
+        return array.tolist() if meta["list"] else array
+    return parts[0]
+
+
+def _json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
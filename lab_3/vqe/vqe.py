@@ -1,26 +1,12 @@
-from qiskit_aer import AerSimulator
-import logging
-from typing import Optional
+import threading
 import time
 import numpy as np
-from scipy.optimize import minimize
-
-from qiskit import QuantumCircuit
-from qiskit_ibm_runtime import (
-    EstimatorV2 as Estimator,
-    SamplerV2 as Sampler,
-    QiskitRuntimeService,
-    Session,
-)
-from qiskit.transpiler.preset_passmanagers import generate_preset_pass_manager
-from qiskit_serverless import (
-    distribute_task,
-    get_arguments,
-    get,
-    save_result,
-)
-
-def run(params, ansatz, hamiltonian, estimator, callback_dict):
+
+# Heavy packages (qiskit_ibm_runtime, qiskit_aer, scipy, qiskit_serverless) are
+# imported inside the functions that need them, so a cold start only pays for
+# the path actually taken. See lab_3/startup.py for the import-time profile.
+
+def run(params, ansatz, hamiltonian, estimator, callback_dict, precision=None):
     """Return callback function that uses Estimator instance,
     and stores intermediate values into a dictionary.
 
@@ -30,13 +16,26 @@ def run(params, ansatz, hamiltonian, estimator, callback_dict):
         hamiltonian (SparsePauliOp): Operator representation of Hamiltonian
         estimator (Estimator): Estimator primitive instance
         callback_dict (dict): Mutable dict for storing values
+        precision (float): Target precision of the estimate, the estimator default if omitted
 
     Returns:
         Callable: Callback function object
     """
-    result = estimator.run([(ansatz, [hamiltonian], [params])]).result()
+    result = estimator.run([(ansatz, [hamiltonian], [params])], precision=precision).result()
     energy = result[0].data.evs[0]
-    
+    track_iteration(callback_dict, params, energy)
+    return energy, result
+
+
+def track_iteration(callback_dict, params, energy, verbose=True):
+    """Record one cost evaluation in a callback dictionary
+
+    Parameters:
+        callback_dict (dict): Mutable dict for storing values
+        params (ndarray): Array of ansatz parameters
+        energy (float): Energy estimate at params
+        verbose (bool): Print the progress line
+    """
     # Keep track of the number of iterations
     callback_dict["iters"] += 1
     # Set the prev_vector to the latest one
@@ -50,6 +49,8 @@ def run(params, ansatz, hamiltonian, estimator, callback_dict):
         callback_dict["_total_time"] += current_time - callback_dict["_prev_time"]
     # Set the previous time to the current time
     callback_dict["_prev_time"] = current_time
+    if not verbose:
+        return
     # Compute the average time per iteration and round it
     time_str = (
         round(callback_dict["_total_time"] / (callback_dict["iters"] - 1), 2)
@@ -64,8 +65,6 @@ def run(params, ansatz, hamiltonian, estimator, callback_dict):
         end="\r",
         flush=True,
     )
-    
-    return energy, result
 
 
 def cost_func(*args, **kwargs):
@@ -84,14 +83,20 @@ def cost_func(*args, **kwargs):
     return energy
 
 
-def run_vqe(initial_parameters, ansatz, operator, estimator, method):
-    callback_dict = {
+def new_callback_dict():
+    return {
         "prev_vector": None,
         "iters": 0,
         "cost_history": [],
         "_total_time": 0,
         "_prev_time": None,
     }
+
+
+def run_vqe(initial_parameters, ansatz, operator, estimator, method):
+    from scipy.optimize import minimize
+
+    callback_dict = new_callback_dict()
    
     result = minimize(
         cost_func,
@@ -102,55 +107,433 @@ def run_vqe(initial_parameters, ansatz, operator, estimator, method):
     return result, callback_dict
 
 
-if __name__ == "__main__":
+def run_vqe_adaptive(initial_parameters, ansatz, operator, estimator, method, schedule=None):
+    """VQE that starts at a loose estimator precision and tightens it as it converges
+
+    The optimal point is re-evaluated at the ``evaluation`` precision of
+    the schedule, and that value is reported as ``fun``.
+
+    Parameters:
+        initial_parameters (ndarray): Starting point
+        ansatz (QuantumCircuit): Parameterized ansatz circuit
+        operator (SparsePauliOp): Operator representation of Hamiltonian
+        estimator (Estimator): Estimator primitive instance
+        method (str): scipy.optimize.minimize method
+        schedule (dict): Output of ``precision.precision_schedule``, the
+            defaults if omitted
+
+    Returns:
+        tuple: (OptimizeResult, callback_dict), the callback dict also holding
+        the ``precision_history`` and the estimated ``shots`` per PUB
+    """
+    from scipy.optimize import minimize
+    from precision import precision_schedule, scheduled_cost
+
+    schedule = precision_schedule() if schedule is None else schedule
+    callback_dict = new_callback_dict()
+
+    def cost(params, precision):
+        energy, _ = run(params, ansatz, operator, estimator, callback_dict, precision)
+        return energy
+
+    result = minimize(scheduled_cost(cost, schedule), initial_parameters, method=method)
+    final = schedule["evaluation"]
+    result.fun, _ = run(result.x, ansatz, operator, estimator, new_callback_dict(), final)
+    callback_dict["precision_history"] = [precision for precision, _ in schedule["history"]]
+    callback_dict["shots"] = schedule["shots"] + int(np.ceil(1 / final ** 2))
+    return result, callback_dict
+
+
+def grouped_cost_func(params, circuits, plan, coeffs, sampler, callback_dict, shots=None):
+    """Return estimate of energy from one sampler job over the measurement groups
+
+    Parameters:
+        params (ndarray): Array of ansatz parameters
+        circuits (list): Output of ``measurement.measurement_circuits``
+        plan (dict): Output of ``measurement.measurement_plan``
+        coeffs (ndarray): Coefficients of the operator
+        sampler (Sampler): Sampler primitive instance
+        callback_dict (dict): Mutable dict for storing values
+        shots (int): Shots per measurement circuit, the sampler default if omitted
+
+    Returns:
+        float: Energy estimate
+    """
+    from measurement import grouped_energy
+
+    result = sampler.run([(circ, params) for circ in circuits], shots=shots).result()
+    energy = grouped_energy(plan, coeffs, [pub.data.meas for pub in result])
+    track_iteration(callback_dict, params, energy)
+    return energy
+
+
+def run_vqe_grouped(initial_parameters, ansatz, operator, sampler, method, grouping="qubitwise", pm=None,
+                    shots=None):
+    """VQE measuring commuting groups of the operator with a sampler
+
+    Each iteration runs one circuit per group instead of leaving the
+    grouping of a large operator to the estimator.
+
+    Parameters:
+        initial_parameters (ndarray): Starting point
+        ansatz (QuantumCircuit): Parameterized ansatz circuit, virtual
+        operator (SparsePauliOp): Hamiltonian on the ansatz qubits
+        sampler (Sampler): Sampler primitive instance
+        method (str): scipy.optimize.minimize method
+        grouping (str): ``"qubitwise"`` or ``"commuting"``
+        pm (PassManager): Transpiles the measurement circuits if given
+        shots (int): Shots per measurement circuit
+
+    Returns:
+        tuple: (OptimizeResult, callback_dict)
+    """
+    from scipy.optimize import minimize
+    from measurement import measurement_circuits, measurement_plan
+
+    plan = measurement_plan(operator, grouping)
+    circuits = measurement_circuits(ansatz, plan, pm)
+    callback_dict = new_callback_dict()
+    result = minimize(
+        grouped_cost_func,
+        initial_parameters,
+        args=(circuits, plan, operator.coeffs, sampler, callback_dict, shots),
+        method=method,
+    )
+    return result, callback_dict
+
+
+def shadow_cost_func(params, template, bases, operator, sampler, callback_dict, shots=None):
+    """Return estimate of energy from one classical-shadow PUB
+
+    Parameters:
+        params (ndarray): Array of ansatz parameters
+        template (dict): Output of ``shadows.shadow_template``
+        bases (ndarray): Output of ``shadows.random_bases``
+        operator (SparsePauliOp): Operator representation of Hamiltonian
+        sampler (Sampler): Sampler primitive instance
+        callback_dict (dict): Mutable dict for storing values
+        shots (int): Shots per random basis
+
+    Returns:
+        float: Energy estimate
+    """
+    from shadows import shadow_energy, shadow_pub
+
+    result = sampler.run([shadow_pub(template, params, bases, shots)]).result()
+    energy = shadow_energy(bases, result[0].data.meas, operator)
+    track_iteration(callback_dict, params, energy)
+    return energy
+
+
+def run_vqe_shadows(initial_parameters, ansatz, operator, sampler, method, num_bases=1000, pm=None, shots=None,
+                    seed=None):
+    """VQE estimating every term of the operator from one classical shadow per iteration
+
+    The random bases are drawn once, so all iterations sample the same
+    transpiled template and the optimizer sees a cost that only varies by
+    shot noise.
+
+    Parameters:
+        initial_parameters (ndarray): Starting point
+        ansatz (QuantumCircuit): Parameterized ansatz circuit, virtual
+        operator (SparsePauliOp): Hamiltonian on the ansatz qubits
+        sampler (Sampler): Sampler primitive instance
+        method (str): scipy.optimize.minimize method
+        num_bases (int): Number of random measurement settings
+        pm (PassManager): Transpiles the template if given
+        shots (int): Shots per setting
+        seed (int): Seed of the random bases
+
+    Returns:
+        tuple: (OptimizeResult, callback_dict)
+    """
+    from scipy.optimize import minimize
+    from shadows import random_bases, shadow_template
+
+    template = shadow_template(ansatz, pm)
+    bases = random_bases(num_bases, ansatz.num_qubits, seed)
+    callback_dict = new_callback_dict()
+    result = minimize(
+        shadow_cost_func,
+        initial_parameters,
+        args=(template, bases, operator, sampler, callback_dict, shots),
+        method=method,
+    )
+    return result, callback_dict
+
+
+def run_vqe_batch(initial_parameters, ansatz, operators, estimator, method):
+    """Minimize several operators over one ansatz with batched estimator calls
+
+    Each problem runs its own optimizer in a thread. A cost evaluation waits
+    until every optimizer still running has asked for one; then all of them
+    go to the estimator as a single PUB that broadcasts the ansatz over the
+    pending (operator, parameters) pairs. N problems therefore cost one
+    estimator job per iteration instead of N.
+
+    Parameters:
+        initial_parameters (list): One starting point per operator
+        ansatz (QuantumCircuit): Parameterized ansatz circuit, already ISA
+        operators (list): SparsePauliOp per problem, laid out like the ansatz
+        estimator (Estimator): Estimator primitive instance
+        method (str): scipy.optimize.minimize method
+
+    Returns:
+        list: (OptimizeResult, callback_dict) per operator
+    """
+    from scipy.optimize import minimize
+
+    shared = _SharedEstimator(estimator, ansatz, len(operators))
+    outcomes = [None] * len(operators)
+
+    def solve(k):
+        callback_dict = new_callback_dict()
+
+        def cost(params):
+            energy = shared.evaluate(k, operators[k], params)
+            track_iteration(callback_dict, params, energy, verbose=False)
+            return energy
+
+        try:
+            outcomes[k] = (minimize(cost, initial_parameters[k], method=method), callback_dict)
+        except Exception as error:  # re-raised in the calling thread below
+            outcomes[k] = error
+        finally:
+            shared.done()
+
+    threads = [threading.Thread(target=solve, args=(k,)) for k in range(len(operators))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for outcome in outcomes:
+        if isinstance(outcome, Exception):
+            raise outcome
+    return outcomes
+
+
+def prepare_batch(ansatz, operators, backend=None, optimization_level=3, virtual=True):
+    """Transpile the ansatz once and lay out every operator to match it
+
+    Parameters:
+        ansatz (QuantumCircuit): Ansatz, transpiled for ``backend`` if it has no layout yet
+        operators (list): SparsePauliOp per problem
+        backend (BackendV2): Backend to transpile for, none to keep the ansatz as it is
+        optimization_level (int): Preset pass manager level
+        virtual (bool): Whether the operators act on the virtual qubits of the
+            ansatz; they are then all moved through its layout, including the
+            routing permutation, even when the widths happen to be equal.
+            ``False`` takes them as already laid out on the physical qubits
+
+    Returns:
+        tuple: (ISA ansatz, operators on its physical qubits)
+    """
+    if backend is not None and ansatz.layout is None:
+        from qiskit.transpiler.preset_passmanagers import generate_preset_pass_manager
+        pm = generate_preset_pass_manager(optimization_level=optimization_level, backend=backend)
+        ansatz = pm.run(ansatz)
+    if not virtual:
+        for op in operators:
+            if op.num_qubits != ansatz.num_qubits:
+                raise ValueError(f"A physical operator needs {ansatz.num_qubits} qubits, got {op.num_qubits}")
+        return ansatz, list(operators)
+    if ansatz.layout is None:
+        return ansatz, list(operators)
+
+    from observables import apply_layout_batch
+    return ansatz, apply_layout_batch(operators, ansatz.layout)
+
+
+def summarize(vqe_result, callback_dict):
+    """JSON-friendly result of one VQE run"""
+    summary = {
+        "optimal_point": vqe_result.x.tolist(),
+        "optimal_value": float(vqe_result.fun),
+        "optimizer_time": callback_dict.get("_total_time", 0),
+        "iters": callback_dict["iters"],
+        "cost_history" : callback_dict["cost_history"]
+    }
+    for key in ("precision_history", "shots"):
+        if key in callback_dict:
+            summary[key] = callback_dict[key]
+    return summary
+
+
+class _SharedEstimator:
+    """Collects one cost evaluation per running optimizer and runs them as one PUB"""
+
+    def __init__(self, estimator, ansatz, num_problems):
+        self._estimator = estimator
+        self._ansatz = ansatz
+        self._active = num_problems
+        self._pending = {}
+        self._results = {}
+        self._condition = threading.Condition()
+
+    def evaluate(self, k, operator, params):
+        with self._condition:
+            self._pending[k] = (operator, params)
+            self._flush_if_ready()
+            while k not in self._results:
+                self._condition.wait()
+            value = self._results.pop(k)
+        if isinstance(value, Exception):
+            raise value
+        return value
+
+    def done(self):
+        with self._condition:
+            self._active -= 1
+            self._flush_if_ready()
+
+    def _flush_if_ready(self):
+        if not self._pending or len(self._pending) < self._active:
+            return
+        keys = sorted(self._pending)
+        observables = [self._pending[k][0] for k in keys]
+        params = np.array([self._pending[k][1] for k in keys])
+        self._pending.clear()
+        try:
+            evs = self._estimator.run([(self._ansatz, observables, params)]).result()[0].data.evs
+            self._results.update(zip(keys, (float(e) for e in evs)))
+        except Exception as error:
+            self._results.update((k, error) for k in keys)
+        self._condition.notify_all()
+
+
+def make_estimator(service=None, session=None, local_estimator="runtime"):
+    """Create the Estimator importing only the packages of the chosen path
+
+    Parameters:
+        service (QiskitRuntimeService): Runtime service, a local simulator is used if omitted
+        session (Session): Open session on the service's backend
+        local_estimator (str): Local primitive, ``"runtime"`` for the
+            qiskit_ibm_runtime local mode (shot-based) or ``"aer"`` for the
+            exact qiskit_aer ``EstimatorV2``, which starts without importing
+            qiskit_ibm_runtime
+
+    Returns:
+        BaseEstimatorV2: Estimator primitive instance
+    """
+    if service:
+        from qiskit_ibm_runtime import EstimatorV2 as Estimator
+        return Estimator(session=session)
+    if local_estimator == "aer":
+        from qiskit_aer.primitives import EstimatorV2 as AerEstimator
+        # Noiseless and exact, so Aer picks its automatic (statevector) method
+        return AerEstimator()
+    from qiskit_aer import AerSimulator
+    from qiskit_ibm_runtime import EstimatorV2 as Estimator
+    return Estimator(backend=AerSimulator(method='density_matrix'))
+
+
+def make_sampler(service=None, session=None, local_sampler="runtime"):
+    """Create the Sampler importing only the packages of the chosen path
+
+    Parameters:
+        service (QiskitRuntimeService): Runtime service, a local simulator is used if omitted
+        session (Session): Open session on the service's backend
+        local_sampler (str): ``"runtime"`` or ``"aer"``, as in ``make_estimator``
+
+    Returns:
+        BaseSamplerV2: Sampler primitive instance
+    """
+    if service:
+        from qiskit_ibm_runtime import SamplerV2 as Sampler
+        return Sampler(session=session)
+    if local_sampler == "aer":
+        from qiskit_aer.primitives import SamplerV2 as AerSampler
+        return AerSampler()
+    from qiskit_aer import AerSimulator
+    from qiskit_ibm_runtime import SamplerV2 as Sampler
+    return Sampler(backend=AerSimulator(method='density_matrix'))
+
+
+def main():
+    from qiskit_serverless import get_arguments, save_result
+
     arguments = get_arguments()
+    # Arguments packed by transport.encode (transport.py sits next to this file in the working_dir)
+    # are decoded lazily, and the results are then packed the same way
+    encoded = "__transport__" in arguments
+    if encoded:
+        from transport import decode, encode
+        arguments = decode(arguments)
 
     service = arguments.get("service")
 
     ansatz = arguments.get("ansatz")
     operator = arguments.get("operator")
+    # Batch mode: a list of operators sharing the ansatz, one result per operator
+    operators = arguments.get("operators")
+    # False when the batch operators are already on the physical qubits of an ISA ansatz
+    virtual_operators = arguments.get("virtual_operators", True)
     method = arguments.get("method", "COBYLA")
     initial_parameters = arguments.get("initial_parameters")
+    local_estimator = arguments.get("local_estimator", "runtime")
+    # "qubitwise" or "commuting": measure grouped circuits with a sampler instead of the estimator,
+    # "shadows": estimate all terms from num_bases random-basis settings of one template circuit
+    grouping = arguments.get("grouping")
+    shots = arguments.get("shots")
+    num_bases = arguments.get("num_bases", 1000)
+    # Keyword arguments of precision.precision_schedule to train at an adaptive precision
+    adaptive_precision = arguments.get("adaptive_precision")
+    if grouping and operators is not None:
+        raise ValueError("grouping applies to a single operator, not to batches")
+    if adaptive_precision is not None and (grouping or operators is not None):
+        raise ValueError("adaptive_precision applies to a single operator measured with the estimator, "
+                         "not to grouping or batches")
         
-    if initial_parameters is None:
+    if operators is not None:
+        if initial_parameters is None:
+            initial_parameters = [2 * np.pi * np.random.rand(ansatz.num_parameters) for _ in operators]
+        elif np.ndim(initial_parameters) == 1:
+            initial_parameters = [initial_parameters] * len(operators)
+    elif initial_parameters is None:
         initial_parameters = 2 * np.pi * np.random.rand(ansatz.num_parameters)
 
-    
-    if service:
-        backend = service.least_busy(operational=True, simulator=False)
-    else:
-        backend = AerSimulator(method='density_matrix')
-        
-    if initial_parameters is None:
-        initial_parameters = 2 * np.pi * np.random.rand(ansatz.num_parameters)
-    
-    if service:
-        with Session(service=service, backend=backend) as session:
-            estimator = Estimator(session=session)
-            vqe_result, callback_dict = run_vqe(
+    def solve(primitive, backend=None):
+        if grouping:
+            pm = None
+            if backend is not None:
+                from qiskit.transpiler.preset_passmanagers import generate_preset_pass_manager
+                pm = generate_preset_pass_manager(optimization_level=3, backend=backend)
+            if grouping == "shadows":
+                return [run_vqe_shadows(initial_parameters, ansatz, operator, primitive, method, num_bases, pm,
+                                        shots)]
+            return [run_vqe_grouped(initial_parameters, ansatz, operator, primitive, method, grouping, pm, shots)]
+        if adaptive_precision is not None:
+            from precision import precision_schedule
+
+            schedule = precision_schedule(**adaptive_precision)
+            return [run_vqe_adaptive(initial_parameters, ansatz, operator, primitive, method, schedule)]
+        if operators is None:
+            return [run_vqe(
                 initial_parameters=initial_parameters,
                 ansatz=ansatz,
                 operator=operator,
-                estimator=estimator,
+                estimator=primitive,
                 method=method,
-            )
-    else:
-        estimator = Estimator(backend=backend)
-        vqe_result, callback_dict = run_vqe(
-            initial_parameters=initial_parameters,
-            ansatz=ansatz,
-            operator=operator,
-            estimator=estimator,
-            method=method,
-        )
+            )]
+        isa_ansatz, isa_operators = prepare_batch(ansatz, operators, backend, virtual=virtual_operators)
+        return run_vqe_batch(initial_parameters, isa_ansatz, isa_operators, primitive, method)
     
+    if service:
+        from qiskit_ibm_runtime import Session
+
+        backend = service.least_busy(operational=True, simulator=False)
+        with Session(service=service, backend=backend) as session:
+            primitive = make_sampler(service, session) if grouping else make_estimator(service, session)
+            outcomes = solve(primitive, backend)
+    else:
+        primitive = make_sampler(local_sampler=local_estimator) if grouping \
+            else make_estimator(local_estimator=local_estimator)
+        outcomes = solve(primitive)
     
-    save_result(
-        {
-            "optimal_point": vqe_result.x.tolist(),
-            "optimal_value": vqe_result.fun,
-            "optimizer_time": callback_dict.get("_total_time", 0),
-             "iters": callback_dict["iters"],
-            "cost_history" : callback_dict["cost_history"]
-        }
-    )
+    results = [summarize(vqe_result, callback_dict) for vqe_result, callback_dict in outcomes]
+    result = results[0] if operators is None else {"problems": results}
+    save_result(encode(result) if encoded else result)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+import numpy as np
+
+# Set bits of every byte value, summed over the packed bytes of masked outcomes
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def packed_counts(bit_array):
+    """Compact counts of a sampler result, without building bitstring keys
+
+    Each outcome is stored as a row of big-endian uint64 words (the last
+    word holds bits 0-63, as in Qiskit bitstrings), and repeated outcomes
+    are merged with ``np.unique``. Memory scales with the number of distinct
+    outcomes times ``num_bits / 64`` words.
+
+    Parameters:
+        bit_array (BitArray): Measurement data, e.g. ``result[0].data.meas``
+
+    Returns:
+        dict: ``words`` (outcomes x words uint64), ``counts`` (int64 per
+        outcome) and ``num_bits``
+    """
+    array = np.asarray(bit_array.array, dtype=np.uint8).reshape(-1, bit_array.array.shape[-1])
+    return _unique(_to_words(array), np.ones(len(array), dtype=np.int64), bit_array.num_bits)
+
+
+def merge_counts(*counts):
+    """Combine packed counts of several jobs over the same classical bits
+
+    Parameters:
+        *counts (dict): Packed counts from ``packed_counts``
+
+    Returns:
+        dict: Packed counts of all shots together
+    """
+    num_bits = counts[0]["num_bits"]
+    if any(item["num_bits"] != num_bits for item in counts):
+        raise ValueError("Cannot merge counts over different numbers of bits")
+    words = np.concatenate([item["words"] for item in counts])
+    return _unique(words, np.concatenate([item["counts"] for item in counts]), num_bits)
+
+
+def marginal_counts(counts, indices):
+    """Marginalize packed counts onto a subset of bits
+
+    Parameters:
+        counts (dict): Packed counts
+        indices (list): Bits to keep; bit ``indices[j]`` becomes bit ``j``
+
+    Returns:
+        dict: Packed counts over ``len(indices)`` bits
+    """
+    indices = np.asarray(indices, dtype=np.int64)
+    kept = _bits(counts, indices)
+    num_words = max(1, -(-len(indices) // 64))
+    words = np.zeros((len(kept), num_words), dtype=np.uint64)
+    for j in range(len(indices)):
+        words[:, num_words - 1 - j // 64] |= kept[:, j].astype(np.uint64) << np.uint64(j % 64)
+    return _unique(words, counts["counts"], len(indices))
+
+
+def expectation_z(counts, paulis):
+    """Expectation values of Z-strings from packed counts
+
+    Parameters:
+        counts (dict): Packed counts
+        paulis (str or list): Pauli labels made of ``I`` and ``Z`` (leftmost
+            character is the highest bit, as in ``SparsePauliOp``), or lists
+            of bit indices whose parity is taken
+
+    Returns:
+        ndarray: Expectation value of each Z-string
+    """
+    paulis = [paulis] if isinstance(paulis, str) else paulis
+    masks = np.stack([_mask(counts, pauli) for pauli in paulis])
+    # Parity of every outcome under every mask, counted byte by byte
+    overlap = counts["words"][:, None, :] & masks[None, :, :]
+    ones = _POPCOUNT[overlap.view(np.uint8)].reshape(len(overlap), len(masks), -1).sum(axis=2)
+    signs = 1 - 2 * (ones & 1).astype(np.int64)
+    return counts["counts"] @ signs / counts["counts"].sum()
+
+
+def top_k(counts, k=10):
+    """Most frequent outcomes as a bitstring dict, e.g. for ``plot_distribution``
+
+    Only the ``k`` selected outcomes are converted to strings.
+
+    Parameters:
+        counts (dict): Packed counts
+        k (int): Number of outcomes to return
+
+    Returns:
+        dict: Bitstring to count of the ``k`` most frequent outcomes
+    """
+    k = min(k, len(counts["counts"]))
+    order = np.argpartition(-counts["counts"], k - 1)[:k] if k else []
+    order = sorted(order, key=lambda i: -counts["counts"][i])
+    num_bits = counts["num_bits"]
+    return {
+        "".join(f"{int(word):064b}" for word in counts["words"][i])[-num_bits:]: int(counts["counts"][i])
+        for i in order
+    }
+
+
+def _to_words(array):
+    """Pack big-endian uint8 rows into big-endian uint64 rows"""
+    num_words = max(1, -(-array.shape[1] // 8))
+    padded = np.zeros((len(array), 8 * num_words), dtype=np.uint8)
+    padded[:, padded.shape[1] - array.shape[1]:] = array
+    return padded.view(">u8").astype(np.uint64)
+
+
+def _unique(words, weights, num_bits):
+    """Merge equal rows of words, summing their weights"""
+    if words.shape[1] == 1:
+        unique, inverse = np.unique(words[:, 0], return_inverse=True)
+        unique = unique[:, None]
+    else:
+        unique, inverse = np.unique(words, axis=0, return_inverse=True)
+    counts = np.bincount(inverse.ravel(), weights=weights, minlength=len(unique)).astype(np.int64)
+    return {"words": unique, "counts": counts, "num_bits": num_bits}
+
+
+def _bits(counts, indices):
+    """Values (outcomes x len(indices)) of the given bits of every outcome"""
+    words = counts["words"]
+    if np.any(indices >= counts["num_bits"]) or np.any(indices < 0):
+        raise IndexError(f"Bit indices must be below {counts['num_bits']}")
+    columns = words[:, words.shape[1] - 1 - indices // 64]
+    return (columns >> (indices % 64).astype(np.uint64)) & np.uint64(1)
+
+
+def _mask(counts, pauli):
+    """Word mask selecting the Z positions of a label or list of bit indices"""
+    if isinstance(pauli, str):
+        if len(pauli) != counts["num_bits"] or set(pauli) - set("IZ"):
+            raise ValueError(f"Expected a {counts['num_bits']}-character I/Z label, got '{pauli}'")
+        indices = [i for i, char in enumerate(reversed(pauli)) if char == "Z"]
+    else:
+        indices = list(pauli)
+    mask = np.zeros(counts["words"].shape[1], dtype=np.uint64)
+    for i in indices:
+        mask[len(mask) - 1 - i // 64] |= np.uint64(1) << np.uint64(i % 64)
+    return mask
@@ -0,0 +1,411 @@
+import numpy as np
+from scipy.linalg import null_space
+
+from qiskit import QuantumCircuit
+from qiskit.circuit.library import StatePreparation, UnitaryGate
+
+
+def compile_embedding(amplitudes, num_qubits=None, atol=1e-8, max_dense_qubits=4):
+    """Build the shallowest known preparation circuit for an amplitude vector
+
+    The support and phase structure of the vector are inspected and the
+    first matching construction is emitted:
+
+    * ``basis``: a single basis state, X gates only
+    * ``sparse``: a few basis states whose bits are affine (XOR) functions of
+      a small set of pivot qubits, e.g. GHZ-like states. The pivots are
+      prepared densely and every other qubit is fanned out with CX gates
+    * ``product``: a product state, one single-qubit rotation per qubit
+    * ``mps``: a state of Schmidt rank <= 2 across every cut, prepared by a
+      staircase of two-qubit unitaries
+    * ``initialize``: anything else falls back to ``qc.initialize``
+
+    Parameters:
+        amplitudes (array_like or dict): Dense amplitude vector, or a sparse
+            mapping of basis index (int or bitstring) to amplitude
+        num_qubits (int): Number of qubits, inferred when omitted
+        atol (float): Tolerance used to detect zero amplitudes and ranks
+        max_dense_qubits (int): Largest pivot register prepared densely in
+            the ``sparse`` construction
+
+    Returns:
+        QuantumCircuit: Embedding circuit named ``embedding_<kind>``
+    """
+    kind, build = _plan_embedding(amplitudes, num_qubits, atol, max_dense_qubits)
+    return build()
+
+
+def embedding_kind(amplitudes, num_qubits=None, atol=1e-8, max_dense_qubits=4):
+    """Return the structure ``compile_embedding`` would exploit
+
+    Parameters:
+        amplitudes (array_like or dict): Amplitudes as for ``compile_embedding``
+        num_qubits (int): Number of qubits, inferred when omitted
+        atol (float): Tolerance used to detect zero amplitudes and ranks
+        max_dense_qubits (int): Largest pivot register prepared densely
+
+    Returns:
+        str: One of ``basis``, ``sparse``, ``product``, ``mps`` or ``initialize``
+    """
+    kind, build = _plan_embedding(amplitudes, num_qubits, atol, max_dense_qubits)
+    return kind
+
+
+def _plan_embedding(amplitudes, num_qubits, atol, max_dense_qubits):
+    indices, values, num_qubits = _to_sparse(amplitudes, num_qubits, atol)
+    norm = np.linalg.norm(values)
+    if not np.isclose(norm, 1, atol=max(atol, 1e-6)):
+        raise ValueError(f"Amplitudes are not normalized (norm = {norm})")
+    values = values / norm
+
+    bits = (indices[:, None] >> np.arange(num_qubits)) & 1
+    if len(indices) <= 2**max_dense_qubits:
+        plan = _affine_plan(bits, max_dense_qubits)
+        if plan is not None:
+            pivots, fanout = plan
+            kind = "basis" if not pivots else "sparse"
+            return kind, lambda: _build_sparse(num_qubits, bits, values, pivots, fanout, kind)
+
+    if num_qubits <= 24:
+        dense = np.zeros(2**num_qubits, dtype=complex)
+        dense[indices] = values
+        tensors = _right_canonical_mps(dense, num_qubits, atol)
+        if tensors is not None:
+            if all(t.shape[0] == 1 and t.shape[2] == 1 for t in tensors):
+                return "product", lambda: _build_product(num_qubits, tensors)
+            return "mps", lambda: _build_mps(num_qubits, tensors)
+
+        def build_initialize():
+            qc = QuantumCircuit(num_qubits, name="embedding_initialize")
+            qc.initialize(dense, range(num_qubits))
+            return qc
+
+        return "initialize", build_initialize
+
+    raise ValueError(
+        f"No structured embedding found for a {num_qubits}-qubit state "
+        f"with {len(indices)} nonzero amplitudes"
+    )
+
+
+def _to_sparse(amplitudes, num_qubits, atol):
+    """Normalize the input into (indices, values, num_qubits)"""
+    if isinstance(amplitudes, dict):
+        keys = list(amplitudes)
+        if not keys:
+            raise ValueError("No amplitudes given")
+        if all(isinstance(key, str) for key in keys):
+            lengths = {len(key) for key in keys}
+            if len(lengths) > 1:
+                raise ValueError(f"Bitstrings of different lengths {sorted(lengths)}")
+            length = lengths.pop()
+            if any(set(key) - {"0", "1"} for key in keys) or length == 0:
+                raise ValueError("Bitstring keys must be nonempty strings of 0 and 1")
+            if num_qubits is None:
+                num_qubits = length
+            elif length != num_qubits:
+                raise ValueError(f"Bitstrings of {length} bits do not fit {num_qubits} qubits")
+            indices = np.array([int(key, 2) for key in keys], dtype=np.int64)
+        elif all(isinstance(key, (int, np.integer)) for key in keys):
+            indices = np.array(keys, dtype=np.int64)
+            if indices.min() < 0:
+                raise ValueError(f"Negative basis index {int(indices.min())}")
+            if num_qubits is None:
+                num_qubits = max(int(indices.max()).bit_length(), 1)
+            elif indices.max() >= 2**num_qubits:
+                raise ValueError(f"Basis index {int(indices.max())} does not fit {num_qubits} qubits")
+        else:
+            raise ValueError("Keys must be all basis indices or all bitstrings")
+        values = np.array([amplitudes[key] for key in keys], dtype=complex)
+    else:
+        dense = np.asarray(amplitudes, dtype=complex).ravel()
+        if len(dense) == 0:
+            raise ValueError("No amplitudes given")
+        if num_qubits is None:
+            num_qubits = int(np.log2(len(dense)))
+        if len(dense) != 2**num_qubits:
+            raise ValueError(f"Expected {2**num_qubits} amplitudes, got {len(dense)}")
+        indices = np.flatnonzero(np.abs(dense) > atol)
+        values = dense[indices]
+
+    keep = np.abs(values) > atol
+    if not keep.any():
+        raise ValueError("All amplitudes are zero")
+    return indices[keep], values[keep], num_qubits
+
+
+def _affine_plan(bits, max_pivots):
+    """Find pivot qubits such that every other qubit is an affine function of them
+
+    Parameters:
+        bits (ndarray): Support bit matrix, one row per basis state
+        max_pivots (int): Maximum number of pivot qubits
+
+    Returns:
+        tuple or None: (pivots, fanout) where ``fanout`` maps each remaining
+        qubit to (constant bit, list of pivot qubits to XOR in)
+    """
+    num_states, num_qubits = bits.shape
+    pivots = []
+    labels = np.zeros(num_states, dtype=np.int64)
+    # Greedily pick the qubit that separates the most support states
+    while len(np.unique(labels)) < num_states:
+        if len(pivots) == max_pivots:
+            return None
+        best, best_count = None, -1
+        for q in range(num_qubits):
+            if q in pivots:
+                continue
+            count = len(np.unique(2 * labels + bits[:, q]))
+            if count > best_count:
+                best, best_count = q, count
+        pivots.append(best)
+        labels = 2 * labels + bits[:, best]
+
+    system = np.hstack([np.ones((num_states, 1), dtype=np.int64), bits[:, pivots]])
+    fanout = {}
+    for q in range(num_qubits):
+        if q in pivots:
+            continue
+        solution = _gf2_solve(system, bits[:, q])
+        if solution is None:
+            return None
+        fanout[q] = (int(solution[0]), [p for p, x in zip(pivots, solution[1:]) if x])
+    return pivots, fanout
+
+
+def _gf2_solve(matrix, rhs):
+    """Solve ``matrix @ x = rhs`` over GF(2), returning None if inconsistent"""
+    aug = np.hstack([matrix, rhs[:, None]]).astype(np.uint8) % 2
+    rows, cols = matrix.shape
+    pivot_cols = []
+    r = 0
+    for c in range(cols):
+        hits = np.flatnonzero(aug[r:, c]) + r
+        if len(hits) == 0:
+            continue
+        aug[[r, hits[0]]] = aug[[hits[0], r]]
+        others = np.flatnonzero(aug[:, c])
+        others = others[others != r]
+        aug[others] ^= aug[r]
+        pivot_cols.append(c)
+        r += 1
+        if r == rows:
+            break
+    if np.any(aug[r:, -1]):
+        return None
+    x = np.zeros(cols, dtype=np.uint8)
+    for i, c in enumerate(pivot_cols):
+        x[c] = aug[i, -1]
+    return x
+
+
+def _build_sparse(num_qubits, bits, values, pivots, fanout, kind):
+    qc = QuantumCircuit(num_qubits, name=f"embedding_{kind}")
+    if pivots:
+        # Amplitudes of the pivot register, pivots[0] is the least significant bit
+        local = np.zeros(2 ** len(pivots), dtype=complex)
+        weights = 1 << np.arange(len(pivots))
+        local[bits[:, pivots] @ weights] = values
+        qc.append(StatePreparation(local), pivots)
+    else:
+        qc.global_phase = np.angle(values[0])
+
+    # Qubits copying a single pivot share a log-depth copy tree, every copy
+    # is taken before any X so already-copied qubits can act as sources
+    copies = {}
+    for q, (constant, sources) in fanout.items():
+        if len(sources) == 1:
+            copies.setdefault(sources[0], []).append(q)
+        else:
+            for p in sources:
+                qc.cx(p, q)
+    for p, targets in copies.items():
+        for control, target in _broadcast_rounds([p] + targets):
+            qc.cx(control, target)
+    for q, (constant, sources) in fanout.items():
+        if constant:
+            qc.x(q)
+    return qc
+
+
+def generate_GHZ(num_qubits, coupling_map=None, root=None):
+    """Build a GHZ state whose CX fan-out follows the device coupling map
+
+    Without a coupling map the fan-out doubles the entangled set every layer,
+    giving ``ceil(log2(num_qubits))`` two-qubit depth. With a coupling map, a
+    connected set of physical qubits of minimal radius around ``root`` is
+    chosen and the state is broadcast along a BFS spanning tree, children
+    with the deepest subtrees first. Every CX then lies on a coupling edge,
+    so passing the returned layout as ``initial_layout`` leaves the router
+    nothing to do.
+
+    Parameters:
+        num_qubits (int): Number of qubits in the GHZ state
+        coupling_map (CouplingMap or list): Device coupling map or edge list
+        root (int): Physical qubit holding the Hadamard, chosen to minimize
+            the fan-out depth when omitted
+
+    Returns:
+        tuple: (QuantumCircuit, list) the GHZ circuit on virtual qubits and the
+        physical qubit of each virtual qubit, or None without a coupling map
+    """
+    qc = QuantumCircuit(num_qubits, name="ghz")
+    qc.h(0)
+    if coupling_map is None:
+        for control, target in _broadcast_rounds(list(range(num_qubits))):
+            qc.cx(control, target)
+        return qc, None
+
+    neighbors = _neighbors(coupling_map)
+    if root is None:
+        root = min(neighbors, key=lambda node: _tree_depth(_bfs_tree(node, neighbors, num_qubits)))
+    parents = _bfs_tree(root, neighbors, num_qubits)
+    if len(parents) < num_qubits:
+        raise ValueError(f"Coupling map component of qubit {root} has fewer than {num_qubits} qubits")
+
+    layout = list(parents)
+    virtual = {physical: i for i, physical in enumerate(layout)}
+    for control, target in _tree_broadcast(root, parents):
+        qc.cx(virtual[control], virtual[target])
+    return qc, layout
+
+
+def _broadcast_rounds(qubits):
+    """All-to-all copy tree: every qubit holding the value copies it once per layer"""
+    order = []
+    have = 1
+    while have < len(qubits):
+        for i in range(min(have, len(qubits) - have)):
+            order.append((qubits[i], qubits[have + i]))
+        have *= 2
+    return order
+
+
+def _neighbors(coupling_map):
+    edges = coupling_map.get_edges() if hasattr(coupling_map, "get_edges") else coupling_map
+    neighbors = {}
+    for a, b in edges:
+        neighbors.setdefault(a, set()).add(b)
+        neighbors.setdefault(b, set()).add(a)
+    return {node: sorted(adjacent) for node, adjacent in neighbors.items()}
+
+
+def _bfs_tree(root, neighbors, size):
+    """Parent of each of the first ``size`` nodes reached from ``root``, in BFS order"""
+    parents = {root: None}
+    frontier = [root]
+    while frontier and len(parents) < size:
+        next_frontier = []
+        for node in frontier:
+            for child in neighbors[node]:
+                if child not in parents and len(parents) < size:
+                    parents[child] = node
+                    next_frontier.append(child)
+        frontier = next_frontier
+    return parents
+
+
+def _children(parents):
+    children = {node: [] for node in parents}
+    for node, parent in parents.items():
+        if parent is not None:
+            children[parent].append(node)
+    return children
+
+
+def _broadcast_times(parents):
+    """Layers needed to finish broadcasting each subtree, deepest children first"""
+    children = _children(parents)
+    times = {}
+    for node in reversed(list(parents)):
+        ordered = sorted((times[child] for child in children[node]), reverse=True)
+        times[node] = max((i + 1 + t for i, t in enumerate(ordered)), default=0)
+    return times, children
+
+
+def _tree_depth(parents):
+    times, _ = _broadcast_times(parents)
+    return times[next(iter(parents))]
+
+
+def _tree_broadcast(root, parents):
+    """CX list of an optimal broadcast schedule along the spanning tree, by layer"""
+    times, children = _broadcast_times(parents)
+    start = {root: 0}
+    gates = []
+    for node in parents:
+        ordered = sorted(children[node], key=lambda child: times[child], reverse=True)
+        for i, child in enumerate(ordered):
+            start[child] = start[node] + i + 1
+            gates.append((start[child], node, child))
+    gates.sort()
+    return [(control, target) for _, control, target in gates]
+
+
+def _right_canonical_mps(dense, num_qubits, atol, max_bond=2):
+    """Decompose a state into right-canonical tensors of bond dimension <= max_bond
+
+    Parameters:
+        dense (ndarray): Normalized amplitude vector
+        num_qubits (int): Number of qubits
+        atol (float): Singular values below this are truncated
+        max_bond (int): Largest allowed bond dimension
+
+    Returns:
+        list or None: Tensors of shape (left, 2, right) for qubits 0..n-1, with
+        the norm carried by the qubit-0 tensor, or None if the rank is too high
+    """
+    # Axis k of the reshaped tensor is qubit k
+    rest = dense.reshape([2] * num_qubits).transpose(range(num_qubits - 1, -1, -1))
+    rest = rest.reshape(-1, 2)
+    tensors = []
+    right = 1
+    for q in range(num_qubits - 1, 0, -1):
+        matrix = rest.reshape(-1, 2 * right)
+        u, s, vh = np.linalg.svd(matrix, full_matrices=False)
+        bond = int(np.sum(s > atol))
+        if bond > max_bond:
+            return None
+        tensors.append(vh[:bond].reshape(bond, 2, right))
+        rest = u[:, :bond] * s[:bond]
+        right = bond
+    tensors.append(rest.reshape(1, 2, right))
+    return tensors[::-1]
+
+
+def _build_product(num_qubits, tensors):
+    qc = QuantumCircuit(num_qubits, name="embedding_product")
+    for q, tensor in enumerate(tensors):
+        qc.append(StatePreparation(tensor[0, :, 0]), [q])
+    return qc
+
+
+def _build_mps(num_qubits, tensors):
+    qc = QuantumCircuit(num_qubits, name="embedding_mps")
+    for q, tensor in enumerate(tensors):
+        left, _, right = tensor.shape
+        if q == num_qubits - 1:
+            # Final 2x2 isometry from the incoming bond to the last qubit
+            columns = np.zeros((2, 2), dtype=complex)
+            columns[:, :left] = tensor[:, :, 0].T
+            qc.append(UnitaryGate(_complete_unitary(columns, left)), [q])
+            continue
+        # Column ``alpha`` holds |b>_q |beta>_{q+1}, index b + 2 * beta
+        columns = np.zeros((4, 2), dtype=complex)
+        for alpha in range(left):
+            block = np.zeros((2, 2), dtype=complex)
+            block[:, :right] = tensor[alpha]
+            columns[:, alpha] = block.T.ravel()
+        qc.append(UnitaryGate(_complete_unitary(columns, left)), [q, q + 1])
+    return qc
+
+
+def _complete_unitary(columns, num_used):
+    """Extend the first ``num_used`` orthonormal columns into a unitary matrix"""
+    dim = columns.shape[0]
+    known = columns[:, :num_used]
+    unitary = np.zeros((dim, dim), dtype=complex)
+    unitary[:, :num_used] = known
+    unitary[:, num_used:] = null_space(known.conj().T)
+    return unitary
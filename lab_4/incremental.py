@@ -0,0 +1,307 @@
+import dataclasses
+
+import numpy as np
+from qiskit import QuantumCircuit
+from qiskit.circuit import CircuitError, CircuitInstruction, Parameter, ParameterExpression, ParameterVector
+from qiskit.circuit.library import get_standard_gate_name_mapping
+from qiskit.transpiler import Layout
+from qiskit.transpiler.passes.routing.algorithms import ApproximateTokenSwapper
+from qiskit.transpiler.preset_passmanagers import generate_preset_pass_manager
+
+# Gates whose numeric angles are lifted into parameters so that circuits
+# differing only in those angles share one transpiled template
+_TEMPLATE_GATES = {
+    "rx", "ry", "rz", "p", "r", "u", "u1", "u2", "u3",
+    "rxx", "ryy", "rzz", "rzx", "crx", "cry", "crz", "cp", "cu1", "cu3",
+}
+
+# Instructions kept as they are; any other instruction is decomposed first
+_STANDARD = set(get_standard_gate_name_mapping()) | {"barrier", "delay", "measure", "reset"}
+
+# Slot parameters shared by all templates, so equal templates have equal keys
+_SLOTS = ParameterVector("_slot", 0)
+
+
+def incremental_cache(backend, optimization_level=3, seed_transpiler=None, maxsize=128):
+    """Create the state reused by ``transpile_incremental`` and ``transpile_composed``
+
+    Parameters:
+        backend (BackendV2): Backend to transpile for, e.g. a ``GenericBackendV2``
+        optimization_level (int): Preset pass manager level
+        seed_transpiler (int): Transpiler seed
+        maxsize (int): ISA circuits kept for exact repeats, least recently
+            used dropped first; 0 turns the exact cache off. Re-angled
+            circuits are served by the templates either way
+
+    Returns:
+        dict: Pass manager and target, the exact, template and prefix caches,
+        and ``stats`` counting how each request was served
+    """
+    return {
+        "pm": generate_preset_pass_manager(optimization_level=optimization_level, backend=backend,
+                                           seed_transpiler=seed_transpiler),
+        "target": backend.target,
+        "optimization_level": optimization_level,
+        "seed_transpiler": seed_transpiler,
+        "exact": {},
+        "maxsize": maxsize,
+        "templates": {},
+        "prefix_pms": {},
+        "stats": {"exact": 0, "template": 0, "full": 0},
+    }
+
+
+def transpile_incremental(circuit, cache):
+    """Transpile a circuit, reusing earlier work for repeated or re-angled circuits
+
+    A recently seen circuit is returned from the cache. Otherwise composite
+    instructions (library blueprints, ``StatePreparation``, ...) are
+    decomposed to standard gates, numeric rotation angles are replaced by
+    parameters and the resulting template is looked up. A circuit that
+    differs from an earlier one only in angle values, bound parameter
+    values or amplitudes of the same shape therefore reuses that layout,
+    routing and translation and just binds the new values. Only a new
+    template is transpiled in full.
+
+    Templates keep symbolic angles through optimization, so gates that a
+    numeric transpile would merge or resynthesize can remain and the ISA
+    circuit may be somewhat deeper.
+
+    Parameters:
+        circuit (QuantumCircuit): Circuit to transpile
+        cache (dict): State from ``incremental_cache``, updated in place
+
+    Returns:
+        QuantumCircuit: ISA circuit with its ``layout`` set
+    """
+    key = structure_key(circuit)
+    isa = _recall(cache, key)
+    if isa is not None:
+        return isa
+
+    isa, _ = _via_template(circuit, (), lambda template: (cache["pm"].run(template), None), cache)
+    _remember(cache, key, isa)
+    return isa
+
+
+def transpile_composed(prefix, suffix, cache):
+    """Transpile ``prefix.compose(suffix)``, reusing the transpiled suffix
+
+    This fits circuits such as the lab 4 classifier, an embedding that
+    changes per sample followed by a fixed ansatz. The suffix goes through
+    ``transpile_incremental``, and the prefix template is compiled once per
+    suffix layout to end on the physical qubits where the suffix expects
+    its inputs. A unitary prefix gets there by routing its inverse out of
+    those qubits and inverting the result. Other prefixes (e.g. with
+    ``initialize``) are routed forwards and SWAPs along the coupling map
+    move the qubits back.
+
+    Parameters:
+        prefix (QuantumCircuit): Changing head, e.g. ``compile_embedding(amplitudes)``
+        suffix (QuantumCircuit): Fixed tail, e.g. the ansatz
+        cache (dict): State from ``incremental_cache``, updated in place
+
+    Returns:
+        QuantumCircuit: ISA circuit whose ``layout`` accounts for the prefix
+        routing, so ``obs.apply_layout(layout=circuit.layout)`` works as usual
+    """
+    if prefix.num_qubits > suffix.num_qubits:
+        raise ValueError("The prefix cannot act on more qubits than the suffix")
+    key = (structure_key(prefix), structure_key(suffix))
+    combined = _recall(cache, key)
+    if combined is not None:
+        return combined
+
+    isa_suffix = transpile_incremental(suffix, cache)
+    layout = tuple(isa_suffix.layout.initial_index_layout(filter_ancillas=True)[:prefix.num_qubits])
+    isa_prefix, sigma = _via_template(prefix, layout, lambda template: _route_prefix(template, layout, cache), cache)
+
+    combined = isa_prefix.copy_empty_like()
+    combined.compose(isa_prefix, inplace=True)
+    combined.compose(isa_suffix, inplace=True)
+    combined._layout = _shifted_layout(isa_suffix, combined, sigma)
+    _remember(cache, key, combined)
+    return combined
+
+
+def _recall(cache, key):
+    """ISA circuit cached for an exact repeat, marked as most recently used"""
+    isa = cache["exact"].pop(key, None)
+    if isa is not None:
+        cache["stats"]["exact"] += 1
+        cache["exact"][key] = isa
+    return isa
+
+
+def _remember(cache, key, isa):
+    """Cache an ISA circuit for exact repeats, dropping the least recently used beyond maxsize"""
+    exact = cache["exact"]
+    exact[key] = isa
+    while len(exact) > cache["maxsize"]:
+        exact.pop(next(iter(exact)))
+
+
+def _via_template(circuit, salt, compile_template, cache):
+    """Bind ``circuit``'s angles into its cached transpiled template, compiling it if new
+
+    Returns:
+        tuple: (ISA circuit, extra data returned by ``compile_template``)
+    """
+    template, slots, values = _template(circuit)
+    key = (salt, structure_key(template))
+    if key in cache["templates"]:
+        cache["stats"]["template"] += 1
+        isa_template, slots, extra = cache["templates"][key]
+    else:
+        cache["stats"]["full"] += 1
+        isa_template, extra = compile_template(template)
+        cache["templates"][key] = (isa_template, slots, extra)
+    isa = isa_template.assign_parameters(dict(zip(slots, values)), strict=False)
+    return isa, extra
+
+
+def _route_prefix(template, layout, cache):
+    """Compile a prefix ending on ``layout``; return it with its qubit movement sigma"""
+    pm = cache["prefix_pms"].get(layout)
+    if pm is None:
+        pm = generate_preset_pass_manager(optimization_level=cache["optimization_level"], target=cache["target"],
+                                          initial_layout=list(layout), seed_transpiler=cache["seed_transpiler"])
+        cache["prefix_pms"][layout] = pm
+
+    try:
+        inverse = template.inverse()
+    except CircuitError:
+        inverse = None
+    if inverse is not None:
+        # Routing the inverse out of the suffix's start positions and inverting the
+        # result gives a prefix that ends exactly where the suffix begins
+        routed = pm.run(inverse)
+        moved = _permutation(routed)
+        sigma = np.empty_like(moved)
+        sigma[moved] = np.arange(len(moved))
+        return routed.inverse(), sigma
+
+    isa = pm.run(template)
+    final = isa.layout.final_index_layout(filter_ancillas=True)
+    moves = {physical: layout[v] for v, physical in enumerate(final) if physical != layout[v]}
+    if moves:
+        isa = isa.compose(_restore_swaps(moves, cache))
+    return isa, np.arange(isa.num_qubits)
+
+
+def _permutation(circuit):
+    """Physical qubit where the state starting on each physical qubit ends up"""
+    final = circuit.layout.final_layout if circuit.layout is not None else None
+    if final is None:
+        return np.arange(circuit.num_qubits)
+    return np.array([final[qubit] for qubit in circuit.qubits])
+
+
+def _shifted_layout(isa_suffix, combined, sigma):
+    """Layout of a prefix moving physical p to sigma[p], followed by the suffix"""
+    layout = isa_suffix.layout
+    if np.array_equal(sigma, np.arange(len(sigma))):
+        return layout
+    virtual = layout.initial_layout.get_physical_bits()
+    after = _permutation(isa_suffix)
+    return dataclasses.replace(
+        layout,
+        initial_layout=Layout({virtual[int(sigma[p])]: p for p in range(len(sigma))}),
+        final_layout=Layout({combined.qubits[p]: int(after[sigma[p]]) for p in range(len(sigma))}),
+    )
+
+
+def _restore_swaps(moves, cache):
+    """ISA circuit of the SWAPs moving each qubit from its key to its value position"""
+    target = cache["target"]
+    if "swap_pm" not in cache:
+        graph = target.build_coupling_map().graph.to_undirected(multigraph=False)
+        trivial = list(range(target.num_qubits))
+        cache["swapper"] = ApproximateTokenSwapper(graph, seed=cache["seed_transpiler"])
+        cache["swap_pm"] = generate_preset_pass_manager(optimization_level=1, target=target, initial_layout=trivial,
+                                                        routing_method="none")
+    swaps = QuantumCircuit(target.num_qubits)
+    for a, b in cache["swapper"].map(moves):
+        swaps.swap(a, b)
+    isa = cache["swap_pm"].run(swaps)
+    isa._layout = None
+    return isa
+
+
+def _template(circuit):
+    """Standard-gate copy of circuit with numeric rotation angles lifted into fresh parameters
+
+    Returns:
+        tuple: (template circuit, slot parameters, their numeric values)
+    """
+    while True:
+        composite = {item.operation.name for item in circuit.data if item.operation.name not in _STANDARD}
+        if not composite:
+            break
+        circuit = circuit.decompose(gates_to_decompose=list(composite))
+
+    lifted = [
+        item.operation.name in _TEMPLATE_GATES
+        and not any(isinstance(p, ParameterExpression) for p in item.operation.params)
+        for item in circuit.data
+    ]
+    num_slots = sum(len(item.operation.params) for item, lift in zip(circuit.data, lifted) if lift)
+    if num_slots > len(_SLOTS):
+        _SLOTS.resize(num_slots)
+    # A plain circuit, since copying a library blueprint would rebuild its gates
+    template = QuantumCircuit(circuit.qubits, circuit.clbits, global_phase=circuit.global_phase)
+    for register in circuit.qregs + circuit.cregs:
+        template.add_register(register)
+    values = []
+    for item, lift in zip(circuit.data, lifted):
+        if lift:
+            operation = item.operation.copy()
+            start = len(values)
+            values.extend(float(p) for p in operation.params)
+            operation.params = list(_SLOTS[start:len(values)])
+            item = CircuitInstruction(operation, item.qubits, item.clbits)
+        template._append(item)
+    return template, list(_SLOTS[:num_slots]), values
+
+
+def structure_key(circuit):
+    """Hashable key that is equal for structurally identical circuits
+
+    Parameters are compared exactly: numbers and arrays (``UnitaryGate``
+    matrices, ``StatePreparation`` amplitudes, ...) by their dtype, shape and
+    bytes, and nested circuits by their own key.
+
+    Parameters:
+        circuit (QuantumCircuit): Circuit of interest
+
+    Returns:
+        tuple: Register sizes plus every instruction's name, parameters,
+        qubit indices and clbit indices
+    """
+    qubits = {bit: i for i, bit in enumerate(circuit.qubits)}
+    clbits = {bit: i for i, bit in enumerate(circuit.clbits)}
+    return (
+        circuit.num_qubits,
+        tuple((reg.name, reg.size) for reg in circuit.cregs),
+        tuple(
+            (
+                item.operation.name,
+                tuple(_param_key(p) for p in item.operation.params),
+                tuple(qubits[q] for q in item.qubits),
+                tuple(clbits[c] for c in item.clbits),
+            )
+            for item in circuit.data
+        ),
+    )
+
+
+def _param_key(param):
+    if isinstance(param, Parameter):
+        return param
+    if isinstance(param, ParameterExpression):
+        return str(param)
+    if isinstance(param, QuantumCircuit):
+        return structure_key(param)
+    # Arrays (unitaries, amplitudes) compare by their exact bytes
+    array = np.asarray(param)
+    return (array.dtype.str, array.shape, array.tobytes())
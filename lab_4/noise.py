@@ -0,0 +1,98 @@
+import copy
+
+import numpy as np
+from qiskit.transpiler import InstructionProperties
+
+
+def update_error_rates(backend, error_rates):
+    """Generalized version of the lab's ``update_error_rate``
+
+    Every ``<gate>_error`` entry is applied to all qargs of that gate in the
+    target, not only to a fixed list of gates, through the public
+    ``update_instruction_properties`` so the target's cached durations stay
+    consistent. Values may be scalars or per-qarg arrays ordered as
+    ``backend.target[<gate>]``.
+
+    Parameters:
+        backend (BackendV2): Backend to update in place
+        error_rates (dict): Dictionary of error rates, optionally with a
+            ``default_duration`` applied to every updated instruction
+
+    Returns:
+        None
+    """
+    target = backend.target
+    duration = error_rates.get("default_duration", 1e-8)
+    for key, value in error_rates.items():
+        if not key.endswith("_error"):
+            continue
+        name = key[: -len("_error")]
+        if name not in target:
+            raise KeyError(f"Provided instruction: '{name}' not in this Target")
+        qargs = [qarg for qarg in target[name] if qarg is not None]
+        if np.ndim(value) == 0:
+            # One shared properties object is enough for a uniform rate
+            properties = [InstructionProperties(error=float(value), duration=duration)] * len(qargs)
+        else:
+            values = np.asarray(value, dtype=float)
+            if values.shape != (len(qargs),):
+                raise ValueError(f"Expected {len(qargs)} values for '{key}', got {values.shape}")
+            properties = [InstructionProperties(error=error, duration=duration) for error in values.tolist()]
+        for qarg, props in zip(qargs, properties):
+            target.update_instruction_properties(name, qarg, props)
+
+
+def error_rate_grid(values, keys=("rz_error", "cx_error"), base=None):
+    """Yield error-rate dictionaries sweeping ``keys`` together over ``values``
+
+    Parameters:
+        values (iterable): Error rates to sweep
+        keys (tuple): Error-rate entries set to each value
+        base (dict): Fixed entries shared by every grid point
+
+    Returns:
+        generator: One error-rate dictionary per value
+    """
+    base = {} if base is None else base
+    for value in values:
+        error_rates = dict(base)
+        error_rates.update(dict.fromkeys(keys, value))
+        yield error_rates
+
+
+def noise_sweep(backend, grid, noise_model=False):
+    """Lazily generate a family of backends, one per error-rate grid point
+
+    The backend is deep-copied once and the copy is updated for each grid
+    point, so the caller's backend is never modified. Gates set by an earlier
+    point but not by the current one get their original properties back. The
+    same copy is yielded every time; ``copy.deepcopy`` it if a point must
+    outlive the next iteration.
+
+    Parameters:
+        backend (BackendV2): Backend to clone, e.g. a ``GenericBackendV2``
+        grid (iterable): Error-rate dictionaries, see ``error_rate_grid``
+        noise_model (bool): Yield an Aer ``NoiseModel`` instead of the backend
+
+    Returns:
+        generator: (error_rates, backend or NoiseModel) pairs
+    """
+    clone = copy.deepcopy(backend)
+    if noise_model:
+        from qiskit_aer.noise import NoiseModel
+
+    # Properties of the gates changed so far, as they were in the backend
+    original = {}
+    for error_rates in grid:
+        names = {key[: -len("_error")] for key in error_rates if key.endswith("_error")}
+        for name in set(original) - names:
+            for qarg, props in original.pop(name).items():
+                clone.target.update_instruction_properties(name, qarg, props)
+        for name in names - set(original):
+            if name in clone.target:
+                original[name] = {qarg: props for qarg, props in clone.target[name].items() if qarg is not None}
+        update_error_rates(clone, error_rates)
+        if noise_model:
+            yield error_rates, NoiseModel.from_backend(clone)
+        else:
+            yield error_rates, clone
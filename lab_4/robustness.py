@@ -0,0 +1,95 @@
+import copy
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from qiskit.transpiler.preset_passmanagers import generate_preset_pass_manager
+
+from embedding import compile_embedding
+from noise import update_error_rates
+
+# Read-only state shared by every task of a worker process
+_worker = {}
+
+
+def robustness_sweep(list_coefficients, list_labels, ansatz, obs, opt_params, backend, grid,
+                     shots=5000, max_workers=None, seed=0):
+    """Evaluate a trained classifier over a grid of noise settings in parallel
+
+    The classifiers are embedded and transpiled once against ``backend``.
+    The ISA circuits, observables, labels and parameters are handed to each
+    worker process a single time through the pool initializer, so a grid
+    point only ships its error rates (or noise model) and returns its costs.
+
+    Parameters:
+        list_coefficients (list): List of arrays of complex coefficients
+        list_labels (list): List of labels
+        ansatz (QuantumCircuit): Parameterized ansatz circuit
+        obs (SparsePauliOp): Observable
+        opt_params (ndarray): Array of trained parameters
+        backend (BackendV2): Base backend, e.g. a ``GenericBackendV2``
+        grid (iterable): Error-rate dictionaries (see ``noise.error_rate_grid``)
+            each applied to a fresh copy of ``backend``, or Aer ``NoiseModel`` objects
+        shots (int): Estimator shots per classifier
+        max_workers (int): Number of worker processes, 1 runs in-process
+        seed (int): Transpiler and simulator seed
+
+    Returns:
+        dict: ``grid``, ``costs`` (points x samples), ``accuracy`` (fraction of
+        samples with cost below 0.5 per point) and ``times`` (seconds per point)
+    """
+    grid = list(grid)
+    pm = generate_preset_pass_manager(optimization_level=3, backend=backend, seed_transpiler=seed)
+    classifiers = [compile_embedding(amplitudes).compose(ansatz) for amplitudes in list_coefficients]
+    transpiled = pm.run(classifiers)
+    pubs = [
+        (circuit, obs.apply_layout(layout=circuit.layout), opt_params)
+        for circuit in transpiled
+    ]
+    initargs = (pubs, np.asarray(list_labels, dtype=float), backend, shots, seed)
+
+    if max_workers == 1:
+        _init_worker(*initargs)
+        rows = [_evaluate_point(point) for point in grid]
+    else:
+        # Spawned workers avoid forking a parent whose Aer/OpenMP threads are running
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=context,
+                                 initializer=_init_worker, initargs=initargs) as pool:
+            rows = list(pool.map(_evaluate_point, grid))
+
+    costs = np.array([row[0] for row in rows])
+    return {
+        "grid": grid,
+        "costs": costs,
+        "accuracy": np.mean(costs < 0.5, axis=1),
+        "times": np.array([row[1] for row in rows]),
+    }
+
+
+def _init_worker(pubs, labels, backend, shots, seed):
+    _worker.update(pubs=pubs, labels=labels, backend=backend, shots=shots, seed=seed)
+
+
+def _evaluate_point(point):
+    """Return (costs, elapsed seconds) for one error-rate dict or noise model"""
+    from qiskit_aer.noise import NoiseModel
+    from qiskit_aer.primitives import EstimatorV2 as Estimator
+
+    start = time.perf_counter()
+    if isinstance(point, dict):
+        # Each point starts from the base backend, so keys set by earlier points
+        # of the same worker do not carry over
+        backend = copy.deepcopy(_worker["backend"])
+        update_error_rates(backend, point)
+        noise_model = NoiseModel.from_backend(backend)
+    else:
+        noise_model = point
+    estimator = Estimator(options={
+        "backend_options": {"noise_model": noise_model},
+        "run_options": {"seed": _worker["seed"], "shots": _worker["shots"]},
+    })
+    result = estimator.run(_worker["pubs"]).result()
+    evs = np.array([float(np.real(pub_result.data.evs)) for pub_result in result])
+    return np.abs(evs - _worker["labels"]), time.perf_counter() - start
@@ -0,0 +1,16 @@
+import os
+import sys
+import warnings
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The lab modules import their siblings by plain name, as they do when run from their own folder
+sys.path[:0] = [
+    os.path.join(ROOT, "lab_2"),
+    os.path.join(ROOT, "lab_3"),
+    os.path.join(ROOT, "lab_3", "vqe"),
+    os.path.join(ROOT, "lab_3", "transpile_parallel"),
+    os.path.join(ROOT, "lab_4"),
+]
+
+warnings.filterwarnings("ignore", category=DeprecationWarning)
@@ -0,0 +1,46 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+from qiskit.quantum_info import Statevector
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+import run_benchmarks
+
+
+def test_vqe_iteration_runs_vqe_run_to_the_exact_energy():
+    from qiskit.circuit.library import TwoLocal
+    from qiskit.quantum_info import SparsePauliOp
+
+    ansatz = TwoLocal(3, ["ry", "rz"], "cz", "full", reps=1, insert_barriers=True)
+    params = np.random.default_rng(run_benchmarks.SEED).uniform(0, 2 * np.pi, ansatz.num_parameters)
+    exact = Statevector(ansatz.assign_parameters(params)).expectation_value(
+        SparsePauliOp(["ZII", "IZI", "IIZ"])).real
+    cases = list(run_benchmarks.bench_vqe_iteration(quick=True))
+    assert [name for name, _, _ in cases] == ["vqe_iteration[statevector]", "vqe_iteration[density_matrix]"]
+    for _, case, _ in cases:
+        energy, _ = case()
+        # Default estimator precision of 1/64 per term
+        assert float(energy) == pytest.approx(exact, abs=0.1)
+
+
+@pytest.mark.parametrize("bench", [run_benchmarks.bench_preset_pass_managers, run_benchmarks.bench_efficient_su2])
+def test_each_transpile_case_runs_its_own_pass_manager_and_circuit(bench):
+    cases = list(bench(quick=True))
+    assert len({name for name, _, _ in cases}) == len(cases) > 1
+    for _, case, info in cases:
+        assert run_benchmarks._isa_info(case()) == info
+
+
+def test_each_scoring_case_scores_its_own_backend():
+    scores = [case() for _, case, _ in run_benchmarks.bench_transpile_scoring(quick=True)]
+    assert len(scores) == 2 and scores[0] != scores[1]
+
+
+def test_baselines_from_another_environment_are_reported():
+    results = {"meta": {key: "here" for key in run_benchmarks.ENVIRONMENT}}
+    baseline = {"meta": dict(results["meta"], machine="there")}
+    assert run_benchmarks.environment_mismatch(results, results) == []
+    assert run_benchmarks.environment_mismatch(results, baseline) == [("machine", "there", "here")]
+    assert run_benchmarks.environment_mismatch(results, {"meta": {}})[0] == ("machine", None, "here")
@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+from qiskit.primitives.containers import BitArray
+
+from counts import expectation_z, marginal_counts, merge_counts, packed_counts, top_k
+
+
+def random_bit_array(num_shots, num_bits, seed):
+    rng = np.random.default_rng(seed)
+    # Few distinct outcomes so counts repeat
+    rows = rng.integers(0, 2, size=(7, num_bits)).astype(bool)
+    return BitArray.from_bool_array(rows[rng.integers(0, 7, size=num_shots)])
+
+
+def as_dict(counts):
+    return top_k(counts, len(counts["counts"]))
+
+
+@pytest.mark.parametrize("num_bits", [5, 64, 70])
+def test_counts_match_bit_array_counts(num_bits):
+    first, second = random_bit_array(300, num_bits, 1), random_bit_array(200, num_bits, 2)
+    assert as_dict(packed_counts(first)) == first.get_counts()
+    merged = merge_counts(packed_counts(first), packed_counts(second))
+    expected = first.get_counts()
+    for key, value in second.get_counts().items():
+        expected[key] = expected.get(key, 0) + value
+    assert as_dict(merged) == expected
+
+    indices = [0, num_bits - 1, 2]
+    marginal = {}
+    for key, value in expected.items():
+        bits = "".join(key[::-1][i] for i in reversed(indices))
+        marginal[bits] = marginal.get(bits, 0) + value
+    assert as_dict(marginal_counts(merged, indices)) == marginal
+
+
+@pytest.mark.parametrize("num_bits", [5, 70])
+def test_expectation_z_matches_the_bitstring_parities(num_bits):
+    bit_array = random_bit_array(500, num_bits, 3)
+    counts = bit_array.get_counts()
+    labels = ["Z" * num_bits, "I" * (num_bits - 1) + "Z", "Z" + "I" * (num_bits - 2) + "Z"]
+    expected = []
+    for label in labels:
+        parities = {key: sum(int(b) for b, p in zip(key, label) if p == "Z") % 2 for key in counts}
+        expected.append(sum(value * (1 - 2 * parities[key]) for key, value in counts.items()) / 500)
+    assert expectation_z(packed_counts(bit_array), labels) == pytest.approx(expected)
+    assert expectation_z(packed_counts(bit_array), [[0, num_bits - 1]]) == pytest.approx(expected[2:])
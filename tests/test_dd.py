@@ -0,0 +1,66 @@
+import pytest
+from qiskit import QuantumCircuit
+from qiskit.circuit.library import XGate, YGate
+from qiskit.transpiler import PassManager
+from qiskit.transpiler.passes import ConstrainedReschedule, PadDelay, TimeUnitConversion
+from qiskit.transpiler.passes.scheduling import ALAPScheduleAnalysis, ASAPScheduleAnalysis, PadDynamicalDecoupling
+from qiskit.transpiler.preset_passmanagers import generate_preset_pass_manager
+from qiskit_ibm_runtime.fake_provider import FakeSherbrooke, FakeTorino
+
+from dd import dd_backend, dd_engine, pad_circuits, score_dd
+from util import fast_scoring
+
+SEQUENCES = {"none": None, "XX": [XGate(), XGate()], "XYXY": [XGate(), YGate(), XGate(), YGate()]}
+
+
+def isa_circuits(backend):
+    qc = QuantumCircuit(4)
+    qc.h(0)
+    for q in range(3):
+        qc.cx(q, q + 1)
+    qc.rz(0.3, 3)
+    qc.cx(2, 3)
+    qc.measure_all()
+    return [generate_preset_pass_manager(1, backend, seed_transpiler=seed).run(qc) for seed in range(3)]
+
+
+def reference_pm(backend, sequence, scheduling_method):
+    target = backend.target
+    timing = target.timing_constraints()
+    analysis = {"asap": ASAPScheduleAnalysis, "alap": ALAPScheduleAnalysis}[scheduling_method]
+    passes = [TimeUnitConversion(target=target), analysis(target=target),
+              ConstrainedReschedule(acquire_alignment=timing.acquire_alignment,
+                                    pulse_alignment=timing.pulse_alignment)]
+    if sequence:
+        passes.append(PadDynamicalDecoupling(target=target, dd_sequence=list(sequence)))
+    else:
+        passes.append(PadDelay(target=target))
+    return PassManager(passes)
+
+
+@pytest.mark.parametrize("scheduling_method", ["asap", "alap"])
+@pytest.mark.parametrize("backend_class", [FakeTorino, FakeSherbrooke])
+def test_padding_matches_the_pass_manager(backend_class, scheduling_method):
+    # Sherbrooke has pulse and acquire alignment constraints, Torino has none
+    backend = backend_class()
+    circuits = isa_circuits(backend)
+    engine = dd_engine(backend, SEQUENCES, scheduling_method)
+    extended = dd_backend(backend, (XGate(), YGate()))
+    for circ, variants in zip(circuits, pad_circuits(circuits, engine)):
+        for name, sequence in SEQUENCES.items():
+            expected = reference_pm(extended, sequence, scheduling_method).run(circ)
+            assert variants[name] == expected
+            assert variants[name].layout == circ.layout
+
+
+def test_scores_are_fast_scoring_of_the_padded_circuits():
+    backend = FakeTorino()
+    circuits = isa_circuits(backend)
+    engine = dd_engine(backend, SEQUENCES)
+    serial = score_dd(circuits, engine)
+    for row in serial:
+        for name, padded in row["circuits"].items():
+            assert row["fidelity"][name] == pytest.approx(fast_scoring(padded, engine["backend"]), rel=1e-12)
+        assert row["best"] == max(row["fidelity"], key=row["fidelity"].get)
+    parallel = score_dd(circuits, backend=backend, sequences=SEQUENCES, max_workers=2)
+    assert [row["fidelity"] for row in parallel] == [row["fidelity"] for row in serial]
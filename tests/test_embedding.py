@@ -0,0 +1,106 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+from qiskit.quantum_info import Statevector
+from qiskit_ibm_runtime.fake_provider import FakeManilaV2
+
+from embedding import compile_embedding, embedding_kind, generate_GHZ
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def overlap(circuit, amplitudes):
+    return abs(np.vdot(Statevector(circuit).data, amplitudes))
+
+
+def normalized(vector):
+    vector = np.asarray(vector, dtype=complex)
+    return vector / np.linalg.norm(vector)
+
+
+def product_state(rng, num_qubits):
+    state = np.ones(1)
+    for _ in range(num_qubits):
+        state = np.kron(normalized(rng.normal(size=2) + 1j * rng.normal(size=2)), state)
+    return state
+
+
+def bond_two_state(rng, num_qubits):
+    # Sum of two product states has Schmidt rank <= 2 across every cut
+    return normalized(product_state(rng, num_qubits) + product_state(rng, num_qubits))
+
+
+def ghz_like(num_qubits):
+    state = np.zeros(2 ** num_qubits, dtype=complex)
+    state[0b00101] = 1
+    state[0b11010] = 1j
+    return normalized(state)
+
+
+@pytest.mark.parametrize("kind, make", [
+    ("basis", lambda rng: np.eye(32)[13]),
+    ("sparse", lambda rng: ghz_like(5)),
+    ("product", lambda rng: product_state(rng, 5)),
+    ("mps", lambda rng: bond_two_state(rng, 5)),
+    ("initialize", lambda rng: normalized(rng.normal(size=32) + 1j * rng.normal(size=32))),
+])
+def test_each_construction_prepares_the_state(kind, make):
+    amplitudes = make(np.random.default_rng(4))
+    assert embedding_kind(amplitudes) == kind
+    assert overlap(compile_embedding(amplitudes), amplitudes) == pytest.approx(1.0, abs=1e-8)
+
+
+def test_sparse_mapping_and_bird_data():
+    state = ghz_like(5)
+    by_bitstring = {"00101": state[0b00101], "11010": state[0b11010]}
+    by_index = {0b00101: state[0b00101], 0b11010: state[0b11010]}
+    for mapping in (by_bitstring, by_index):
+        assert overlap(compile_embedding(mapping, num_qubits=5), state) == pytest.approx(1.0, abs=1e-8)
+    dataset = pd.read_csv(os.path.join(ROOT, "lab_4", "birds_dataset.csv"))
+    for row in dataset.values[:, 1:]:
+        amplitudes = np.array(row, dtype=np.complex128)
+        assert overlap(compile_embedding(amplitudes), amplitudes) == pytest.approx(1.0, abs=1e-8)
+
+
+def ghz_amplitudes(num_qubits):
+    state = np.zeros(2 ** num_qubits)
+    state[[0, -1]] = 1 / np.sqrt(2)
+    return state
+
+
+@pytest.mark.parametrize("num_qubits", [1, 2, 5, 8])
+def test_ghz_without_coupling_map_has_log_depth(num_qubits):
+    qc, layout = generate_GHZ(num_qubits)
+    assert layout is None
+    assert overlap(qc, ghz_amplitudes(num_qubits)) == pytest.approx(1.0, abs=1e-10)
+    assert qc.depth(lambda x: len(x.qubits) == 2) == int(np.ceil(np.log2(num_qubits)))
+
+
+def test_ghz_on_a_coupling_map_needs_no_routing():
+    coupling_map = FakeManilaV2().coupling_map
+    qc, layout = generate_GHZ(5, coupling_map)
+    assert overlap(qc, ghz_amplitudes(5)) == pytest.approx(1.0, abs=1e-10)
+    edges = set(coupling_map.get_edges())
+    for item in qc.data:
+        if len(item.qubits) == 2:
+            a, b = (layout[qc.find_bit(q).index] for q in item.qubits)
+            assert (a, b) in edges or (b, a) in edges
+
+
+@pytest.mark.parametrize("amplitudes, num_qubits, message", [
+    ({5: 1.0}, 2, "does not fit"),
+    ({-1: 1.0}, None, "Negative"),
+    ({"01": 0.6, "1": 0.8}, None, "different lengths"),
+    ({"011": 1.0}, 2, "do not fit"),
+    ({"0": 0.6, 1: 0.8}, None, "all basis indices or all bitstrings"),
+    ({}, None, "No amplitudes"),
+    ([], None, "No amplitudes"),
+    ([0, 0, 0, 0], None, "All amplitudes are zero"),
+    ({"00": 0.0}, None, "All amplitudes are zero"),
+    ([1, 1, 0, 0], None, "not normalized"),
+])
+def test_invalid_amplitudes_raise_value_error(amplitudes, num_qubits, message):
+    with pytest.raises(ValueError, match=message):
+        compile_embedding(amplitudes, num_qubits=num_qubits)
@@ -0,0 +1,81 @@
+import inspect
+
+import numpy as np
+import pytest
+from qiskit import QuantumCircuit
+from qiskit.circuit.library import RealAmplitudes
+from qiskit.primitives import StatevectorEstimator
+from qiskit.quantum_info import SparsePauliOp, Statevector
+from qiskit_ibm_runtime.fake_provider import FakeManilaV2
+
+import incremental
+import knitting
+from embedding import compile_embedding
+from incremental import incremental_cache, transpile_composed, transpile_incremental
+
+
+def rotations(angles):
+    circuit = QuantumCircuit(3)
+    circuit.ry(angles[0], 0)
+    circuit.cx(0, 1)
+    circuit.rzz(angles[1], 1, 2)
+    circuit.rx(angles[2], 2)
+    circuit.cp(angles[3], 2, 0)
+    return circuit
+
+
+def expectations(isa, observables):
+    pubs = [(isa, obs.apply_layout(isa.layout)) for obs in observables]
+    return [float(result.data.evs) for result in StatevectorEstimator().run(pubs).result()]
+
+
+def test_re_angled_circuits_reuse_the_template_and_stay_equivalent():
+    cache = incremental_cache(FakeManilaV2(), seed_transpiler=0)
+    observables = [SparsePauliOp(label) for label in ["ZZI", "XIX", "IYZ", "YXZ"]]
+    rng = np.random.default_rng(1)
+    for _ in range(4):
+        circuit = rotations(rng.uniform(-np.pi, np.pi, 4))
+        isa = transpile_incremental(circuit, cache)
+        exact = [Statevector(circuit).expectation_value(obs).real for obs in observables]
+        assert expectations(isa, observables) == pytest.approx(exact, abs=1e-8)
+    assert transpile_incremental(circuit, cache) is isa
+    assert cache["stats"] == {"exact": 1, "template": 3, "full": 1}
+
+
+def test_composed_classifier_matches_the_exact_expectation():
+    cache = incremental_cache(FakeManilaV2(), seed_transpiler=0)
+    ansatz = RealAmplitudes(3, reps=1)
+    suffix = ansatz.assign_parameters(np.linspace(0.2, 1.4, ansatz.num_parameters))
+    obs = SparsePauliOp(["ZZI", "IXZ"], [0.6, 0.4])
+    rng = np.random.default_rng(2)
+    for _ in range(3):
+        amplitudes = rng.normal(size=8) + 1j * rng.normal(size=8)
+        amplitudes /= np.linalg.norm(amplitudes)
+        prefix = compile_embedding(amplitudes)
+        isa = transpile_composed(prefix, suffix, cache)
+        exact = Statevector(prefix.compose(suffix)).expectation_value(obs).real
+        assert expectations(isa, [obs])[0] == pytest.approx(exact, abs=1e-8)
+
+
+def test_exact_cache_keeps_the_most_recently_used_circuits():
+    cache = incremental_cache(FakeManilaV2(), seed_transpiler=0, maxsize=2)
+    circuits = [rotations([0.1 * k, 0.2, 0.3, 0.4]) for k in range(1, 4)]
+    first, second, _ = [transpile_incremental(circuit, cache) for circuit in circuits]
+    assert len(cache["exact"]) == 2
+    # The second circuit is used again, so adding the first back drops the third
+    assert transpile_incremental(circuits[1], cache) is second
+    again = transpile_incremental(circuits[0], cache)
+    assert again is not first and cache["stats"] == {"exact": 1, "template": 3, "full": 1}
+    assert transpile_incremental(circuits[1], cache) is second
+    assert transpile_incremental(circuits[2], cache) is not None and cache["stats"]["template"] == 4
+
+    off = incremental_cache(FakeManilaV2(), seed_transpiler=0, maxsize=0)
+    transpile_incremental(circuits[0], off)
+    transpile_incremental(circuits[0], off)
+    assert off["exact"] == {} and off["stats"] == {"exact": 0, "template": 1, "full": 1}
+
+
+def test_structure_key_is_the_knitting_implementation():
+    # lab_3 and lab_4 are run from their own folders, so each keeps a copy
+    for name in ("structure_key", "_param_key"):
+        assert inspect.getsource(getattr(incremental, name)) == inspect.getsource(getattr(knitting, name))
@@ -0,0 +1,140 @@
+import numpy as np
+import pytest
+from circuit_knitting.cutting import cut_gates, generate_cutting_experiments, partition_problem
+from qiskit import QuantumCircuit
+from qiskit.circuit.library import EfficientSU2, UnitaryGate
+from qiskit.primitives import StatevectorEstimator
+from qiskit.quantum_info import SparsePauliOp, Statevector, random_unitary
+from qiskit.transpiler import CouplingMap
+from qiskit.transpiler.preset_passmanagers import generate_preset_pass_manager
+from qiskit_aer import AerSimulator
+from qiskit_ibm_runtime import SamplerV2
+from qiskit_ibm_runtime.fake_provider import FakeManilaV2
+
+from knitting import (deduplicate, find_cuts, sample_sub_experiments, sampling_overhead, structure_key,
+                      transpile_sub_experiments)
+
+
+def sub_experiments():
+    circuit = EfficientSU2(4, entanglement="linear", reps=2).decompose()
+    circuit.assign_parameters([0.1 * i for i in range(circuit.num_parameters)], inplace=True)
+    problem = partition_problem(circuit, "AABB", observables=SparsePauliOp(["ZZII", "IZZI", "XIXI"]).paulis)
+    experiments, _ = generate_cutting_experiments(problem.subcircuits, problem.subobservables,
+                                                  num_samples=float("inf"))
+    return experiments["A"]
+
+
+@pytest.mark.parametrize("num_processes", [1, 2])
+def test_cached_transpile_matches_transpiling_each_circuit(num_processes):
+    circuits = sub_experiments()
+    keys, unique = deduplicate(circuits)
+    assert len(unique) < len(circuits)
+    for key, circuit in zip(keys, circuits):
+        assert unique[key] == circuit
+    pm = generate_preset_pass_manager(1, FakeManilaV2(), seed_transpiler=0)
+    cache = {}
+    isa = transpile_sub_experiments(circuits, pm, cache, num_processes)
+    assert [structure_key(circuit) for circuit in isa] == [structure_key(pm.run(c)) for c in circuits]
+    # A second call is served from the cache
+    assert all(a is b for a, b in zip(transpile_sub_experiments(circuits, pm, cache), isa))
+
+
+def test_structure_keys_tell_close_arrays_apart():
+    # numpy's repr rounds the first matrix and elides the middle of the 64 x 64 one
+    small = random_unitary(4, seed=1).data
+    nudged = small @ np.diag([1, 1, 1, np.exp(1e-12j)])
+    large = random_unitary(64, seed=1).data
+    swapped = large[[*range(10), 20, *range(11, 20), 10, *range(21, 64)]]
+    for a, b in [(small, nudged), (large, swapped)]:
+        circuits = []
+        for matrix in (a, b):
+            gate = UnitaryGate(matrix, check_input=False)
+            circuit = QuantumCircuit(gate.num_qubits)
+            circuit.append(gate, range(gate.num_qubits))
+            circuits.append(circuit)
+        assert str(a) == str(b)
+        assert structure_key(circuits[0]) != structure_key(circuits[1])
+        assert structure_key(circuits[0]) == structure_key(circuits[0].copy())
+
+    # A cached transpilation of one unitary is not served for the other
+    wide = random_unitary(4, seed=2).data
+    circuits = [QuantumCircuit(2), QuantumCircuit(2)]
+    circuits[0].append(UnitaryGate(wide), [0, 1])
+    circuits[1].append(UnitaryGate(wide @ np.diag([1, 1, 1, np.exp(1e-3j)])), [0, 1])
+    pm = generate_preset_pass_manager(1, FakeManilaV2(), seed_transpiler=0)
+    isa = transpile_sub_experiments(circuits, pm, {}, num_processes=1)
+    observables = [SparsePauliOp(label) for label in ["ZZ", "XY", "YI"]]
+    for circuit, transpiled in zip(circuits, isa):
+        expected = [Statevector(circuit).expectation_value(obs).real for obs in observables]
+        pubs = [(transpiled, obs.apply_layout(transpiled.layout)) for obs in observables]
+        assert [float(pub.data.evs) for pub in StatevectorEstimator().run(pubs).result()] == \
+            pytest.approx(expected, abs=1e-9)
+
+
+def test_sampling_shares_pubs_between_duplicates():
+    circuits = sub_experiments()[:12]
+    pm = generate_preset_pass_manager(1, FakeManilaV2(), seed_transpiler=0)
+    isa = transpile_sub_experiments(circuits, pm, num_processes=1)
+    sampler = SamplerV2(backend=AerSimulator(seed_simulator=1))
+    seen = []
+    for indices, results in sample_sub_experiments(sampler, isa, batch_size=4, shots=10):
+        for group, result in zip(indices, results):
+            assert len({id(isa[i]) for i in group}) == 1
+            assert result.data.observable_measurements.num_shots == 10
+            seen += group
+    assert sorted(seen) == list(range(len(circuits)))
+
+
+def uncut_components(circuit, cuts):
+    parent = list(range(circuit.num_qubits))
+
+    def root(q):
+        while parent[q] != q:
+            q = parent[q]
+        return q
+
+    for i, item in enumerate(circuit.data):
+        qubits = [circuit.find_bit(q).index for q in item.qubits]
+        if i not in cuts and len(qubits) > 1:
+            for q in qubits[1:]:
+                parent[root(q)] = root(qubits[0])
+    return np.bincount([root(q) for q in range(circuit.num_qubits)])
+
+
+@pytest.mark.parametrize("name, params", [("cx", ()), ("cz", ()), ("rzz", (0.7,)), ("rzx", (2.0,)),
+                                          ("cp", (0.7,)), ("cry", (-1.2,)), ("swap", ()), ("iswap", ())])
+def test_sampling_overhead_matches_circuit_knitting(name, params):
+    circuit = QuantumCircuit(2)
+    getattr(circuit, name)(*params, 0, 1)
+    _, bases = cut_gates(circuit, [0])
+    assert sampling_overhead(circuit, [0]) == pytest.approx(bases[0].overhead)
+
+
+def test_partition_cuts_fit_the_budget_with_the_qpd_overhead():
+    circuit = EfficientSU2(6, entanglement="linear", reps=2).decompose()
+    circuit.rzz(0.3, 2, 3)
+    cuts = find_cuts(circuit, qubit_budget=3)
+    assert uncut_components(circuit, set(cuts)).max() <= 3
+    _, bases = cut_gates(circuit, cuts)
+    assert sampling_overhead(circuit, cuts) == pytest.approx(np.prod([basis.overhead for basis in bases]))
+
+
+def test_gates_on_three_qubits_are_never_split():
+    circuit = QuantumCircuit(4)
+    circuit.cx(0, 1)
+    circuit.ccx(1, 2, 3)
+    assert uncut_components(circuit, set(find_cuts(circuit, qubit_budget=3))).max() <= 3
+    with pytest.raises(ValueError, match="cannot be cut"):
+        find_cuts(circuit, qubit_budget=2)
+
+
+def test_infeasible_depth_target_raises():
+    circuit = QuantumCircuit(3)
+    for _ in range(3):
+        circuit.cx(0, 2)
+        circuit.h(1)
+    line = CouplingMap.from_line(3)
+    cuts = find_cuts(circuit, line, depth_target=6)
+    assert cuts and all(circuit.data[i].operation.name == "cx" for i in cuts)
+    with pytest.raises(ValueError, match="No cut set reaches depth 2"):
+        find_cuts(circuit, line, depth_target=2)
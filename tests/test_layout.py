@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+from qiskit import QuantumCircuit
+from qiskit_ibm_runtime.fake_provider import FakeTorino
+
+from layout import error_model, interaction_graph, preselect_layouts, score_layouts
+from util import qubit_error
+
+
+def ghz_chain(num_qubits, triangle=False):
+    circ = QuantumCircuit(num_qubits)
+    circ.h(0)
+    for q in range(num_qubits - 1):
+        circ.cx(q, q + 1)
+    if triangle:
+        # Cannot be embedded in a heavy-hex lattice
+        circ.cx(0, 2)
+    circ.measure_all()
+    return circ
+
+
+def score_one(layout, circ, backend):
+    # Term-by-term reading of the score_layouts docstring
+    target = backend.target
+    errors = [props.error for props in target["cz"].values() if props is not None]
+    mean_error = np.mean(errors)
+    distance = backend.coupling_map.distance_matrix
+    score = 0.0
+    for item in circ.data:
+        qubits = [layout[circ.find_bit(q).index] for q in item.qubits]
+        name = item.operation.name
+        if name == "barrier":
+            continue
+        if len(qubits) == 2:
+            a, b = qubits
+            hops = int(min(distance[a, b], distance[b, a]))
+            if hops == 1:
+                error = min(target["cz"][pair].error for pair in [(a, b), (b, a)] if pair in target["cz"])
+                score += np.log1p(-error)
+            else:
+                score += (1 + 3 * (hops - 1)) * np.log1p(-mean_error)
+        elif name == "measure":
+            score += np.log1p(-target["measure"][(qubits[0],)].error)
+        else:
+            score += np.log1p(-target["sx"][(qubits[0],)].error)
+    gate_time = np.mean([props.duration for props in target["cz"].values() if props is not None])
+    for physical in layout:
+        props = backend.qubit_properties(int(physical))
+        score += np.log1p(-qubit_error(circ.depth() * gate_time, props.t1, props.t2))
+    return score
+
+
+def test_vectorized_scores_match_a_per_gate_sum():
+    backend = FakeTorino()
+    circ = ghz_chain(5, triangle=True)
+    rng = np.random.default_rng(0)
+    layouts = np.array([rng.choice(backend.num_qubits, 5, replace=False) for _ in range(20)])
+    scores = score_layouts(layouts, interaction_graph(circ), error_model(backend))
+    assert scores == pytest.approx([score_one(layout, circ, backend) for layout in layouts], rel=1e-9)
+
+
+def test_preselected_layouts_need_no_swaps_and_are_ranked():
+    backend = FakeTorino()
+    circ = ghz_chain(5)
+    distance = backend.coupling_map.distance_matrix
+    best = preselect_layouts(circ, backend, top_k=5)
+    assert len(best) == 5
+    for layout, score in best:
+        for item in circ.data:
+            if len(item.qubits) == 2:
+                a, b = (layout[circ.find_bit(q).index] for q in item.qubits)
+                assert min(distance[a, b], distance[b, a]) == 1
+        assert score == pytest.approx(score_one(layout, circ, backend), rel=1e-9)
+    assert [score for _, score in best] == sorted((score for _, score in best), reverse=True)
+
+
+def test_unembeddable_circuits_still_get_ranked_layouts():
+    backend = FakeTorino()
+    circ = ghz_chain(5, triangle=True)
+    best = preselect_layouts(circ, backend, top_k=3)
+    assert best and all(len(set(layout)) == 5 for layout, _ in best)
+    for layout, score in best:
+        assert score == pytest.approx(score_one(layout, circ, backend), rel=1e-9)
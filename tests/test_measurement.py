@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+from qiskit.circuit.library import EfficientSU2
+from qiskit.primitives import StatevectorSampler
+from qiskit.primitives.containers import BitArray
+from qiskit.quantum_info import SparsePauliOp, Statevector, random_pauli_list
+
+from measurement import grouped_energy, measurement_circuits, measurement_plan, parity_expectations, z_masks
+
+
+def test_parity_expectations_match_bitstrings():
+    rng = np.random.default_rng(0)
+    bits = rng.integers(0, 2, size=(500, 11))
+    z = rng.integers(0, 2, size=(7, 11)).astype(bool)
+    # BitArray layout: qubit 0 is the last bit of the bitstring
+    strings = ["".join(map(str, row[::-1])) for row in bits]
+    array = BitArray.from_bool_array(bits[:, ::-1].astype(bool)).array
+    assert BitArray.from_samples(strings, 11).array.tolist() == array.tolist()
+    expected = (1 - 2 * ((bits[:, None, :] & z[None, :, :]).sum(axis=2) % 2)).mean(axis=0)
+    assert parity_expectations(array, z_masks(z)) == pytest.approx(expected)
+
+
+@pytest.mark.parametrize("kind", ["qubitwise", "commuting"])
+def test_grouped_energy_matches_the_exact_energy(kind):
+    num_qubits = 4
+    operator = SparsePauliOp(random_pauli_list(num_qubits, 30, seed=2, phase=False),
+                             np.random.default_rng(2).normal(size=30)).simplify()
+    ansatz = EfficientSU2(num_qubits, reps=1)
+    params = np.linspace(0.2, 2.0, ansatz.num_parameters)
+    exact = Statevector(ansatz.assign_parameters(params)).expectation_value(operator).real
+
+    plan = measurement_plan(operator, kind)
+    for group in plan["groups"]:
+        terms = operator.paulis[group]
+        assert all(a.commutes(b) for a in terms for b in terms)
+    shots = 40000
+    result = StatevectorSampler(seed=3).run(
+        [(circ, params) for circ in measurement_circuits(ansatz, plan)], shots=shots).result()
+    energy = grouped_energy(plan, operator.coeffs, [pub.data.meas for pub in result])
+    assert energy == pytest.approx(exact, abs=5 * np.abs(operator.coeffs).sum() / np.sqrt(shots))
@@ -0,0 +1,89 @@
+import pytest
+from qiskit.circuit.library import EfficientSU2, XGate
+from qiskit.transpiler import PassManager
+from qiskit.transpiler.passes import ASAPScheduleAnalysis, PadDelay
+from qiskit.transpiler.preset_passmanagers import generate_preset_pass_manager
+from qiskit_ibm_runtime.fake_provider import FakeTorino
+
+from metrics import circuit_metrics, instruction_table, rank_circuits
+
+
+def isa_circuit(backend, seed=0):
+    circ = EfficientSU2(4, entanglement="full", reps=2)
+    circ.measure_all()
+    return generate_preset_pass_manager(3, backend, seed_transpiler=seed).run(circ)
+
+
+def asap_seconds(circ, backend):
+    durations = backend.target.durations()
+    scheduled = PassManager([ASAPScheduleAnalysis(durations), PadDelay(target=backend.target)]).run(circ)
+    return scheduled.duration * backend.dt
+
+
+def test_metrics_match_qiskit():
+    backend = FakeTorino()
+    isa = isa_circuit(backend)
+    metrics = circuit_metrics(isa, backend)
+    assert metrics["depth"] == isa.depth()
+    assert metrics["depth_2q"] == isa.depth(lambda x: len(x.qubits) == 2)
+    assert metrics["count_ops"] == dict(isa.count_ops())
+    assert metrics["size"] == isa.size()
+    assert metrics["num_nonlocal_gates"] == isa.num_nonlocal_gates()
+    # The critical path is the length of the ASAP schedule
+    assert metrics["duration"] == pytest.approx(asap_seconds(isa, backend), rel=1e-9)
+
+
+def test_cache_is_not_shared_by_copies_or_tables():
+    backend = FakeTorino()
+    isa = isa_circuit(backend)
+    table = instruction_table(backend)
+    assert circuit_metrics(isa, table=table) is circuit_metrics(isa, table=instruction_table(backend))
+    # A same-length copy with other instructions
+    other = isa.copy()
+    other.data = [item.replace(operation=XGate()) if item.operation.name == "sx" else item
+                  for item in other.data]
+    assert circuit_metrics(other, table=table)["count_ops"] == dict(other.count_ops())
+    # A table with doubled durations is a different duration source
+    slow = dict(table, durations={k: 2 * v for k, v in table["durations"].items()})
+    slow.pop("key")
+    assert circuit_metrics(isa, table=slow)["duration"] == pytest.approx(
+        2 * circuit_metrics(isa, table=table)["duration"])
+    # Metrics with durations answer the duration-free request
+    assert circuit_metrics(isa)["depth"] == isa.depth()
+
+
+def test_rank_circuits_matches_schedules_and_depths():
+    backend = FakeTorino()
+    circuits = [isa_circuit(backend, seed) for seed in range(4)]
+    order, scores = rank_circuits(circuits, backend, "time")
+    assert scores == pytest.approx([asap_seconds(circ, backend) for circ in circuits], rel=1e-9)
+    assert list(scores[order]) == sorted(scores)
+    order, scores = rank_circuits(circuits, objective="depth")
+    assert list(scores) == [circ.depth() for circ in circuits]
+    # Precomputed metrics give the same ranking
+    table = instruction_table(backend)
+    metrics = [circuit_metrics(circ, table=table) for circ in circuits]
+    for objective in ("depth", "time", "time_fidelity"):
+        expected = rank_circuits(circuits, backend, objective, table)
+        given = rank_circuits(circuits, backend, objective, table, metrics)
+        assert list(given[0]) == list(expected[0]) and list(given[1]) == list(expected[1])
+
+
+@pytest.mark.parametrize("objective", ["time", "time_fidelity"])
+def test_time_objectives_need_a_backend(objective):
+    circuits = [isa_circuit(FakeTorino(), seed) for seed in range(2)]
+    with pytest.raises(ValueError, match="requires a backend"):
+        rank_circuits(circuits, objective=objective)
+    with pytest.raises(ValueError, match="requires a backend"):
+        rank_circuits(circuits, objective=objective, metrics=[circuit_metrics(circ) for circ in circuits])
+
+
+@pytest.mark.parametrize("objective", ["time", "time_fidelity"])
+def test_process_transpiled_circuits_checks_the_backend_first(objective):
+    # utils plots with matplotlib, which the lab environment provides
+    pytest.importorskip("matplotlib")
+    from utils import process_transpiled_circuits
+
+    circuits = [isa_circuit(FakeTorino(), seed) for seed in range(2)]
+    with pytest.raises(ValueError, match=f"objective '{objective}' requires a backend"):
+        process_transpiled_circuits([{"optimization_level": 1}], circuits, objective=objective)
@@ -0,0 +1,69 @@
+import copy
+
+import numpy as np
+import pytest
+from qiskit.providers.fake_provider import GenericBackendV2
+from qiskit.transpiler import InstructionProperties
+
+from noise import error_rate_grid, noise_sweep, update_error_rates
+
+
+def update_one_by_one(backend, error_rates):
+    # The lab's update_error_rate: one update_instruction_properties call per qarg
+    duration = error_rates.get("default_duration", 1e-8)
+    for key, value in error_rates.items():
+        if not key.endswith("_error"):
+            continue
+        name = key[: -len("_error")]
+        qargs = [qarg for qarg in backend.target[name] if qarg is not None]
+        values = np.broadcast_to(value, len(qargs))
+        for qarg, error in zip(qargs, values):
+            backend.target.update_instruction_properties(
+                name, qarg, InstructionProperties(error=float(error), duration=duration))
+
+
+def properties(backend, names):
+    return {(name, qarg): (props.error, props.duration)
+            for name in names for qarg, props in backend.target[name].items() if qarg is not None}
+
+
+def test_update_matches_the_lab_update():
+    backend = GenericBackendV2(5, seed=2)
+    num_cx = len([qarg for qarg in backend.target["cx"] if qarg is not None])
+    error_rates = {"rz_error": 1e-3, "cx_error": np.linspace(0.01, 0.02, num_cx), "default_duration": 5e-8}
+    expected = copy.deepcopy(backend)
+    update_one_by_one(expected, error_rates)
+    update_error_rates(backend, error_rates)
+    assert properties(backend, ["rz", "cx"]) == properties(expected, ["rz", "cx"])
+    # Values read back through the public Target API, and durations derived from it, follow every qarg
+    errors = dict(zip([qarg for qarg in backend.target["cx"] if qarg is not None], error_rates["cx_error"]))
+    checked = 0
+    for index, (operation, qarg) in enumerate(backend.target.instructions):
+        if operation.name == "cx":
+            assert backend.target.instruction_properties(index).error == errors[qarg]
+            checked += 1
+    assert checked == num_cx
+    durations = backend.target.durations()
+    assert all(durations.get("cx", qarg, unit="s") == pytest.approx(5e-8) for qarg in errors)
+    assert all(durations.get("rz", (q,), unit="s") == pytest.approx(5e-8) for q in range(5))
+    with pytest.raises(ValueError):
+        update_error_rates(backend, {"cx_error": [0.1, 0.2]})
+
+
+def test_noise_sweep_leaves_the_backend_untouched():
+    backend = GenericBackendV2(3, seed=2)
+    before = properties(backend, ["cx"])
+    grid = list(error_rate_grid([0.01, 0.05]))
+    for error_rates, swept in noise_sweep(backend, grid):
+        assert {error for error, _ in properties(swept, ["cx"]).values()} == {error_rates["cx_error"]}
+    assert properties(backend, ["cx"]) == before
+
+
+def test_noise_sweep_points_do_not_inherit_earlier_gates():
+    backend = GenericBackendV2(3, seed=2)
+    grid = [{"cx_error": 0.2}, {"sx_error": 0.0}, {"cx_error": 0.1}]
+    seen = [(properties(swept, ["cx"]), properties(swept, ["sx"])) for _, swept in noise_sweep(backend, grid)]
+    for error_rates, (cx, sx) in zip(grid, seen):
+        expected = copy.deepcopy(backend)
+        update_error_rates(expected, error_rates)
+        assert cx == properties(expected, ["cx"]) and sx == properties(expected, ["sx"])
@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+from qiskit.circuit.library import EfficientSU2
+from qiskit.quantum_info import SparsePauliOp, random_pauli_list
+from qiskit.transpiler.preset_passmanagers import generate_preset_pass_manager
+from qiskit_ibm_runtime.fake_provider import FakeManilaV2
+
+from observables import apply_layout, apply_layout_batch
+
+
+def random_operator(num_qubits, num_terms, seed):
+    paulis = random_pauli_list(num_qubits, num_terms, seed=seed, phase=False)
+    return SparsePauliOp(paulis, np.random.default_rng(seed).normal(size=num_terms))
+
+
+def test_matches_qiskit_for_layouts_and_none():
+    isa = generate_preset_pass_manager(3, FakeManilaV2(), seed_transpiler=0).run(
+        EfficientSU2(3, entanglement="full", reps=1))
+    op = random_operator(3, 20, seed=1)
+    cases = [(isa.layout, None), ([2, 0, 1], None), ([4, 0, 2], 5), ([2, 0, 1], 6), (None, None), (None, 5)]
+    for layout, num_qubits in cases:
+        assert apply_layout(op, layout, num_qubits) == op.apply_layout(layout, num_qubits)
+    with pytest.raises(ValueError):
+        apply_layout(op, None, 2)
+
+
+def test_batch_and_cache_follow_the_coefficients():
+    ops = [random_operator(4, 10, seed) for seed in range(3)]
+    layout = [3, 1, 0, 2]
+    assert apply_layout_batch(ops, layout, 5) == [op.apply_layout(layout, 5) for op in ops]
+    # Same Paulis, other coefficients: not served from the cache
+    scaled = SparsePauliOp(ops[0].paulis, 2 * ops[0].coeffs)
+    assert apply_layout(scaled, layout, 5) == scaled.apply_layout(layout, 5)
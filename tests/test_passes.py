@@ -0,0 +1,29 @@
+import pytest
+from qiskit.circuit.library import EfficientSU2
+from qiskit.providers.fake_provider import GenericBackendV2
+from qiskit.quantum_info import Operator
+from qiskit.transpiler import PassManager
+from qiskit.transpiler.preset_passmanagers import generate_preset_pass_manager
+
+from passes import FidelityAnalysis, fidelity_optimization
+from util import transpile_scoring
+
+
+def backend():
+    # transpile_scoring knows the cz and ecr two-qubit gates
+    return GenericBackendV2(4, basis_gates=["cz", "rz", "sx", "x"], seed=5)
+
+
+@pytest.mark.parametrize("max_iterations", [1, 2, 20])
+def test_fidelity_loop_keeps_an_equivalent_circuit(max_iterations):
+    device = backend()
+    circ = EfficientSU2(4, entanglement="full", reps=2).decompose()
+    circ.assign_parameters(range(circ.num_parameters), inplace=True)
+    pm = generate_preset_pass_manager(3, device, seed_transpiler=1)
+    pm.optimization = fidelity_optimization(device, max_iterations=max_iterations)
+    isa = pm.run(circ)
+    assert Operator.from_circuit(isa).equiv(Operator(circ))
+
+    analysis = PassManager([FidelityAnalysis(device)])
+    analysis.run(isa)
+    assert analysis.property_set["fidelity"] == pytest.approx(transpile_scoring(isa, None, device), rel=1e-12)
@@ -0,0 +1,29 @@
+import numpy as np
+import pytest
+from qiskit.circuit.library import EfficientSU2
+from qiskit.primitives import StatevectorEstimator
+from qiskit.quantum_info import SparsePauliOp
+
+import vqe
+from precision import precision_schedule, update_precision
+
+
+def test_schedule_tightens_on_stalls_down_to_final():
+    schedule = precision_schedule(initial=0.1, final=0.02, factor=0.5, patience=2)
+    precisions = [update_precision(schedule, [float(i)], 1.0) for i in range(12)]
+    # The first cost is an improvement, then every 2 stalls halve the precision until final
+    assert precisions[:5] == pytest.approx([0.1, 0.1, 0.05, 0.05, 0.025])
+    assert precisions[-1] == 0.02 and np.all(np.diff(precisions) <= 0)
+    used = [0.1] + precisions[:-1]
+    assert schedule["shots"] == sum(int(np.ceil(1 / p ** 2)) for p in used)
+
+
+def test_adaptive_vqe_reaches_the_ground_energy():
+    ansatz = EfficientSU2(2, reps=1)
+    operator = SparsePauliOp(["ZZ", "XI", "IX"], [1.0, 0.5, 0.5])
+    ground = np.linalg.eigvalsh(operator.to_matrix()).min()
+    schedule = precision_schedule(initial=0.05, final=0.005, evaluation=0.001, noise_scale=2.0)
+    result, callback_dict = vqe.run_vqe_adaptive(np.full(ansatz.num_parameters, 0.3), ansatz, operator,
+                                                 StatevectorEstimator(seed=7), "COBYLA", schedule)
+    assert result.fun == pytest.approx(ground, abs=0.05)
+    assert callback_dict["precision_history"][-1] < callback_dict["precision_history"][0]
@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+from circuit_knitting.cutting import cut_gates, generate_cutting_experiments
+from circuit_knitting.cutting import reconstruct_expectation_values as toolbox_reconstruct
+from qiskit.circuit.library import EfficientSU2
+from qiskit.quantum_info import PauliList, Statevector
+from qiskit_aer import AerSimulator
+from qiskit_ibm_runtime import SamplerV2
+
+from qpd import (accumulate, allocate_shots, qpd_accumulator, reconstruct, reconstruct_expectation_values,
+                 sample_adaptive)
+
+OBSERVABLES = PauliList(["ZZII", "IZZI", "XIIX", "IYYI"])
+
+
+def cut_problem():
+    circuit = EfficientSU2(4, entanglement="linear", reps=1).decompose()
+    circuit.assign_parameters(np.linspace(0.1, 2.5, circuit.num_parameters), inplace=True)
+    cuts = [i for i, item in enumerate(circuit.data) if item.operation.name == "cx" and
+            {circuit.find_bit(q).index for q in item.qubits} == {1, 2}]
+    qpd_circuit, _ = cut_gates(circuit, cuts)
+    experiments, coefficients = generate_cutting_experiments(qpd_circuit, OBSERVABLES, num_samples=np.inf)
+    return circuit, experiments, coefficients
+
+
+def test_reconstruction_matches_the_toolbox_and_the_exact_values():
+    circuit, experiments, coefficients = cut_problem()
+    results = SamplerV2(backend=AerSimulator(seed_simulator=3)).run(experiments, shots=4000).result()
+    expvals, variances = reconstruct_expectation_values(results, coefficients, OBSERVABLES)
+    assert expvals == pytest.approx(toolbox_reconstruct(results, coefficients, OBSERVABLES), abs=1e-12)
+
+    exact = [Statevector(circuit).expectation_value(pauli).real for pauli in OBSERVABLES]
+    assert np.all(np.abs(expvals - exact) < 5 * np.sqrt(variances) + 1e-9)
+
+    # Folding the results in two batches gives the same values
+    accumulator = qpd_accumulator(coefficients, OBSERVABLES)
+    half = len(results) // 2
+    accumulate(accumulator, list(range(half)), [results[i] for i in range(half)])
+    accumulate(accumulator, list(range(half, len(results))), [results[i] for i in range(half, len(results))])
+    assert reconstruct(accumulator)[0] == pytest.approx(expvals, abs=1e-12)
+
+
+def test_allocation_follows_the_coefficients_and_the_budget():
+    _, experiments, coefficients = cut_problem()
+    accumulator = qpd_accumulator(coefficients, OBSERVABLES)
+    num_groups = accumulator["weights"].shape[0]
+    shots = allocate_shots(accumulator, 100000)
+    assert shots.sum() == 100000 and len(shots) == len(experiments)
+    # Without a pilot every sigma is the same, so shots follow |c_i|
+    weights = np.repeat(np.abs(accumulator["coefficients"]), num_groups)
+    expected = 100000 * weights / weights.sum()
+    assert np.all(np.abs(shots - expected) <= 1)
+    # The floors win over a budget too small to give every sub-experiment a shot
+    assert allocate_shots(accumulator, 10, min_shots=1).tolist() == [1] * len(experiments)
+
+
+def test_adaptive_sampling_spends_the_budget_and_matches_the_exact_values():
+    circuit, experiments, coefficients = cut_problem()
+    accumulator = qpd_accumulator(coefficients, OBSERVABLES)
+    sampler = SamplerV2(backend=AerSimulator(seed_simulator=4))
+    sample_adaptive(sampler, experiments, accumulator, total_shots=60000)
+    assert accumulator["shots"].sum() == 60000
+    expvals, variances = reconstruct(accumulator)
+    exact = [Statevector(circuit).expectation_value(pauli).real for pauli in OBSERVABLES]
+    assert np.all(np.abs(expvals - exact) < 5 * np.sqrt(variances) + 1e-9)
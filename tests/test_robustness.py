@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+from qiskit.circuit.library import RealAmplitudes
+from qiskit.primitives import StatevectorEstimator
+from qiskit.providers.fake_provider import GenericBackendV2
+from qiskit.quantum_info import SparsePauliOp
+from qiskit_aer.noise import NoiseModel
+
+from embedding import compile_embedding
+from robustness import robustness_sweep
+
+
+def classifier():
+    rng = np.random.default_rng(3)
+    coefficients = []
+    for _ in range(3):
+        amplitudes = rng.normal(size=4) + 1j * rng.normal(size=4)
+        coefficients.append(amplitudes / np.linalg.norm(amplitudes))
+    labels = [0, 1, 1]
+    ansatz = RealAmplitudes(2, reps=1)
+    obs = SparsePauliOp(["ZZ", "IX"], [0.7, 0.3])
+    params = np.linspace(0.1, 0.9, ansatz.num_parameters)
+    return coefficients, labels, ansatz, obs, params
+
+
+def test_noiseless_point_matches_exact_costs_in_parallel():
+    coefficients, labels, ansatz, obs, params = classifier()
+    backend = GenericBackendV2(4, seed=1)
+
+    exact = StatevectorEstimator().run([
+        (compile_embedding(amplitudes).compose(ansatz), obs, params) for amplitudes in coefficients
+    ]).result()
+    expected = np.abs([float(result.data.evs) for result in exact] - np.array(labels))
+
+    grid = [NoiseModel(), NoiseModel()]
+    serial = robustness_sweep(coefficients, labels, ansatz, obs, params, backend, grid,
+                              shots=20000, max_workers=1)
+    parallel = robustness_sweep(coefficients, labels, ansatz, obs, params, backend, grid,
+                                shots=20000, max_workers=2)
+    assert serial["costs"] == pytest.approx(expected[None, :].repeat(2, axis=0), abs=0.03)
+    np.testing.assert_allclose(parallel["costs"], serial["costs"])
+    np.testing.assert_allclose(parallel["accuracy"], np.mean(expected < 0.5))
+
+
+def test_points_do_not_inherit_rates_of_earlier_points():
+    coefficients, labels, ansatz, obs, params = classifier()
+    backend = GenericBackendV2(4, seed=1)
+    noisy_cx = {"cx_error": 0.2}
+    clean_sx = {"sx_error": 0.0}
+    alone = robustness_sweep(coefficients, labels, ansatz, obs, params, backend, [clean_sx], max_workers=1)
+    after = robustness_sweep(coefficients, labels, ansatz, obs, params, backend, [noisy_cx, clean_sx],
+                             max_workers=1)
+    np.testing.assert_array_equal(after["costs"][1], alone["costs"][0])
+    assert not np.array_equal(after["costs"][0], alone["costs"][0])
+    assert backend.target["cx"][(0, 1)].error != 0.2
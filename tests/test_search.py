@@ -0,0 +1,46 @@
+import time
+
+import pytest
+from qiskit.circuit.library import EfficientSU2
+from qiskit.transpiler.preset_passmanagers import generate_preset_pass_manager
+from qiskit_ibm_runtime.fake_provider import FakeManilaV2, FakeSherbrooke, FakeTorino
+
+from search import SLOW_ROUTING, search_space, transpile_search
+from util import fast_scoring, transpile_scoring
+
+
+def test_fast_scoring_matches_transpile_scoring():
+    # transpile_scoring knows the cz and ecr two-qubit gates
+    backend = FakeTorino()
+    circ = EfficientSU2(4, entanglement="full", reps=2).decompose()
+    for seed in range(3):
+        isa = generate_preset_pass_manager(3, backend, seed_transpiler=seed).run(circ)
+        assert fast_scoring(isa, backend) == pytest.approx(transpile_scoring(isa, None, backend), rel=1e-12)
+
+
+def test_default_space_leaves_out_slow_routing():
+    configs = search_space(seeds=[0])
+    assert configs and not {config["routing_method"] for config in configs} & {"none", *SLOW_ROUTING}
+
+
+def test_search_keeps_the_best_scored_candidate():
+    backend = FakeManilaV2()
+    circ = EfficientSU2(4, entanglement="full", reps=2).decompose()
+    configs = search_space(seeds=range(2), layout_methods=["sabre", "dense"], routing_methods=["sabre"],
+                           translation_methods=["translator"])
+    best = transpile_search(circ, backend, configs)
+    scores = [fast_scoring(generate_preset_pass_manager(3, backend, **config).run(circ), backend)
+              for config in configs]
+    assert best["fidelity"] == pytest.approx(max(scores), rel=1e-12)
+    assert fast_scoring(best["circuit"], backend) == pytest.approx(best["fidelity"], rel=1e-12)
+
+
+def test_deadline_terminates_running_candidates():
+    # A single lookahead routing of this circuit takes minutes
+    backend = FakeSherbrooke()
+    circ = EfficientSU2(40, entanglement="full", reps=1).decompose()
+    configs = [{"routing_method": "lookahead", "seed_transpiler": 0}]
+    start = time.perf_counter()
+    best = transpile_search(circ, backend, configs, optimization_level=1, time_budget=5, max_workers=2)
+    assert time.perf_counter() - start < 30
+    assert best["circuit"] is None and best["history"] == [] and best["cancelled"] == configs
@@ -0,0 +1,61 @@
+import itertools
+
+import numpy as np
+import pytest
+from qiskit.circuit.library import EfficientSU2
+from qiskit.quantum_info import PauliList, SparsePauliOp, Statevector
+from qiskit_aer.primitives import SamplerV2
+
+from shadows import X_BASIS, Y_BASIS, Z_BASIS, random_bases, shadow_energy, shadow_expectations, shadow_pub, \
+    shadow_template
+
+NUM_QUBITS = 3
+LETTERS = {X_BASIS: "X", Y_BASIS: "Y", Z_BASIS: "Z"}
+
+
+def setup():
+    ansatz = EfficientSU2(NUM_QUBITS, reps=1).decompose()
+    params = np.linspace(0.3, 2.7, ansatz.num_parameters)
+    state = Statevector(ansatz.assign_parameters(params))
+    # Every Pauli on three qubits except the identity
+    paulis = PauliList(["".join(p) for p in itertools.product("IXYZ", repeat=NUM_QUBITS)][1:])
+    return ansatz, params, state, paulis
+
+
+def test_template_measures_the_chosen_bases():
+    ansatz, params, state, _ = setup()
+    template = shadow_template(ansatz)
+    bases = np.array(list(itertools.product(range(3), repeat=NUM_QUBITS)), dtype=np.int8)
+    circuit, values, _ = shadow_pub(template, params, bases)
+    unmeasured = circuit.remove_final_measurements(inplace=False)
+    for basis, row in zip(bases, values):
+        probabilities = Statevector(unmeasured.assign_parameters(row)).probabilities()
+        outcomes = np.arange(2 ** NUM_QUBITS)
+        # The Z parity of the rotated state is the expectation of the basis' Pauli on the ansatz state
+        label = "".join(LETTERS[b] for b in basis[::-1])
+        parity = 1 - 2 * (np.array([bin(o).count("1") for o in outcomes]) % 2)
+        assert probabilities @ parity == pytest.approx(state.expectation_value(SparsePauliOp(label)).real, abs=1e-12)
+
+
+def test_shadow_estimates_match_exact_expectations():
+    ansatz, params, state, paulis = setup()
+    template = shadow_template(ansatz)
+    bases = random_bases(3000, NUM_QUBITS, seed=0)
+    # StatevectorSampler repeats the same samples for repeated bases, Aer draws them independently
+    result = SamplerV2(seed=1).run([shadow_pub(template, params, bases, shots=10)]).result()
+    bit_array = result[0].data.meas
+    estimates, errors = shadow_expectations(bases, bit_array, paulis)
+    exact = np.array([state.expectation_value(SparsePauliOp(p)).real for p in paulis])
+    assert np.all(np.abs(estimates - exact) < 5 * errors + 1e-9)
+
+    operator = SparsePauliOp(paulis[:12], np.linspace(-1, 1, 12))
+    energy = state.expectation_value(operator).real
+    spread = np.sqrt(np.sum((operator.coeffs.real * errors[:12]) ** 2))
+    assert shadow_energy(bases, bit_array, operator) == pytest.approx(energy, abs=5 * spread)
+    assert shadow_energy(bases, bit_array, operator, median_of_means=3) == pytest.approx(energy, abs=0.1)
+
+
+def test_random_bases_are_uniform():
+    bases = random_bases(30000, NUM_QUBITS, seed=0)
+    assert bases.shape == (30000, NUM_QUBITS) and set(np.unique(bases)) == {X_BASIS, Y_BASIS, Z_BASIS}
+    assert np.bincount(bases.ravel(), minlength=3) / bases.size == pytest.approx([1 / 3] * 3, abs=0.01)
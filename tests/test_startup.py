@@ -0,0 +1,46 @@
+import json
+import subprocess
+import sys
+
+from startup import import_profile, prewarmed_pool, shutdown_pools
+
+STATEMENT = "import fractions, json, statistics"
+
+# Modules a statement imports, and how long it takes, measured in a fresh interpreter
+MEASURE = f"""
+import sys, time
+before = set(sys.modules)
+start = time.perf_counter()
+exec({STATEMENT!r})
+elapsed = time.perf_counter() - start
+modules = sorted(set(sys.modules) - before)
+import json
+print(json.dumps({{"modules": modules, "elapsed": elapsed}}))
+"""
+
+
+def loaded(module):
+    return module in sys.modules
+
+
+def test_import_profile_reports_every_imported_module():
+    reference = json.loads(subprocess.run([sys.executable, "-c", MEASURE], capture_output=True, text=True,
+                                          check=True).stdout)
+    profile = import_profile(STATEMENT, top=None)
+    assert {name for name, _, _ in profile["modules"]} == set(reference["modules"])
+    # Timing makes the profiled run slower than the plain one, never many times faster
+    assert 0 < profile["total"] and reference["elapsed"] < 10 * profile["total"]
+    cumulative = [row[1] for row in profile["modules"]]
+    assert cumulative == sorted(cumulative, reverse=True)
+    assert all(own <= total for _, total, own in profile["modules"])
+
+
+def test_prewarmed_workers_have_the_modules():
+    modules = ("qiskit.quantum_info",)
+    try:
+        pool = prewarmed_pool(2, modules)
+        assert prewarmed_pool(2, modules) is pool
+        # Each worker reports whether it imported the module before any task asked for it
+        assert list(pool.map(loaded, ["qiskit.quantum_info", "qiskit_aer"] * 2)) == [True, False] * 2
+    finally:
+        shutdown_pools()
@@ -0,0 +1,59 @@
+import pytest
+from qiskit import QuantumCircuit
+from qiskit.circuit.library import XGate, YGate
+from qiskit.transpiler import PassManager
+from qiskit.transpiler.passes import ConstrainedReschedule, PadDelay, TimeUnitConversion
+from qiskit.transpiler.passes.scheduling import ALAPScheduleAnalysis, ASAPScheduleAnalysis, PadDynamicalDecoupling
+from qiskit.transpiler.preset_passmanagers import generate_preset_pass_manager
+from qiskit_ibm_runtime.fake_provider import FakeSherbrooke, FakeTorino
+
+from dd import dd_backend
+from util import fast_scoring, timeline_scoring, transpile_scoring
+
+SEQUENCES = [None, ["x", "x"], ["x", "y", "x", "y"]]
+
+
+def isa_circuit(backend):
+    qc = QuantumCircuit(5)
+    qc.h(0)
+    for q in range(4):
+        qc.cx(q, q + 1)
+    qc.rz(0.3, 4)
+    qc.cx(3, 4)
+    qc.sx(1)
+    qc.measure_all()
+    return generate_preset_pass_manager(1, backend, seed_transpiler=0).run(qc)
+
+
+def schedule(circ, backend, scheduling_method, sequence):
+    target = backend.target
+    timing = target.timing_constraints()
+    analysis = {"asap": ASAPScheduleAnalysis, "alap": ALAPScheduleAnalysis}[scheduling_method]
+    gates = {"x": XGate(), "y": YGate()}
+    pad = (PadDynamicalDecoupling(target=target, dd_sequence=[gates[name] for name in sequence])
+           if sequence else PadDelay(target=target))
+    return PassManager([TimeUnitConversion(target=target), analysis(target=target),
+                        ConstrainedReschedule(acquire_alignment=timing.acquire_alignment,
+                                              pulse_alignment=timing.pulse_alignment),
+                        pad]).run(circ)
+
+
+@pytest.mark.parametrize("sequence", SEQUENCES)
+@pytest.mark.parametrize("scheduling_method", ["asap", "alap"])
+def test_timeline_matches_scoring_of_the_scheduled_circuit(scheduling_method, sequence):
+    backend = dd_backend(FakeTorino(), (XGate(), YGate()))
+    isa = isa_circuit(backend)
+    scheduled = schedule(isa, backend, scheduling_method, sequence)
+    expected = fast_scoring(scheduled, backend)
+    assert expected == pytest.approx(transpile_scoring(scheduled, None, backend), rel=1e-12)
+    assert timeline_scoring(isa, backend, scheduling_method, sequence) == pytest.approx(expected, rel=1e-9)
+
+
+@pytest.mark.parametrize("sequence", SEQUENCES)
+def test_timeline_follows_pulse_alignment(sequence):
+    # Sherbrooke aligns pulses to 16 dt; transpile_scoring knows its ecr gates
+    backend = dd_backend(FakeSherbrooke(), (XGate(), YGate()))
+    isa = isa_circuit(backend)
+    scheduled = schedule(isa, backend, "alap", sequence)
+    expected = transpile_scoring(scheduled, None, backend)
+    assert timeline_scoring(isa, backend, "alap", sequence) == pytest.approx(expected, rel=1e-9)
@@ -0,0 +1,139 @@
+import json
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+from qiskit import QuantumCircuit
+from qiskit.circuit.library import EfficientSU2
+from qiskit.primitives import StatevectorEstimator
+from qiskit.quantum_info import Operator, PauliList, SparsePauliOp, Statevector
+from qiskit.transpiler.preset_passmanagers import generate_preset_pass_manager
+from qiskit_ibm_runtime.fake_provider import FakeTorino
+
+from transport import available_codecs, decode, encode, is_encoded, iter_field
+
+LAB_3 = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "lab_3")
+
+# Serverless entry points read JSON arguments and write JSON results; this
+# module plays the runtime's part for a local run of main()
+SERVERLESS = """
+import json, os
+
+def get_arguments():
+    with open(os.environ["ARGUMENTS"]) as file:
+        return json.load(file)
+
+def save_result(result):
+    with open(os.environ["RESULT"], "w") as file:
+        json.dump(result, file)
+
+def distribute_task(target=None):
+    return lambda function: function
+
+def get(references):
+    return references
+"""
+
+
+def payload():
+    backend = FakeTorino()
+    ansatz = EfficientSU2(4, reps=1)
+    circuits = [generate_preset_pass_manager(1, backend, seed_transpiler=seed).run(ansatz) for seed in range(4)]
+    # The phase of -iYIXX is folded into its coefficient
+    hamiltonian = SparsePauliOp(PauliList(["IXYZ", "ZZII", "-iYIXX", "IIII"]), [0.5, -1.25j, 2.0, 0.1])
+    return {
+        "ansatz": ansatz,
+        "circuits": circuits,
+        "hamiltonian": hamiltonian,
+        "operators": [hamiltonian, SparsePauliOp("XXXX")],
+        "params": np.random.default_rng(0).random((64, ansatz.num_parameters)),
+        "x0": [0.1, 0.2, 0.3],
+        "config": {"shots": 1000, "method": "COBYLA", "tol": None},
+        "service": object(),
+    }
+
+
+@pytest.mark.parametrize("codec", available_codecs())
+def test_round_trip_through_json(codec):
+    original = payload()
+    # A small chunk size splits the circuit list and the array into several parts
+    encoded = encode(original, codec=codec, chunk_size=2048)
+    assert is_encoded(encoded) and len(encoded["fields"]["circuits"]["parts"]) > 1
+    assert len(encoded["fields"]["params"]["parts"]) > 1
+    service = encoded.pop("service")
+    assert service is original["service"]
+    decoded = decode(json.loads(json.dumps(encoded)))
+
+    assert decoded["ansatz"] == original["ansatz"]
+    for circ, expected in zip(decoded["circuits"], original["circuits"], strict=True):
+        assert circ == expected
+        assert circ.layout.final_index_layout() == expected.layout.final_index_layout()
+    for op, expected in zip(decoded["operators"], original["operators"], strict=True):
+        assert op == expected
+    assert Operator(decoded["hamiltonian"]) == Operator(original["hamiltonian"])
+    np.testing.assert_array_equal(decoded["params"], original["params"])
+    assert decoded["x0"] == original["x0"] and decoded["config"] == original["config"]
+    assert list(iter_field(encoded, "circuits")) == original["circuits"]
+
+
+def test_plain_payloads_pass_through():
+    plain = {"circuit": QuantumCircuit(1)}
+    assert decode(plain) is plain and not is_encoded(plain)
+
+
+def run_main(tmp_path, working_dir, entrypoint, arguments):
+    """Run an entry point from its working_dir alone, as serverless does, and return its decoded result"""
+    (tmp_path / "qiskit_serverless.py").write_text(SERVERLESS)
+    (tmp_path / "arguments.json").write_text(json.dumps(encode(arguments)))
+    env = dict(os.environ, PYTHONPATH=str(tmp_path), ARGUMENTS=str(tmp_path / "arguments.json"),
+               RESULT=str(tmp_path / "result.json"))
+    code = f"import {entrypoint}; {entrypoint}.main()"
+    completed = subprocess.run([sys.executable, "-c", code], cwd=os.path.join(LAB_3, working_dir), env=env,
+                               capture_output=True, text=True)
+    assert completed.returncode == 0, completed.stderr
+    result = json.loads((tmp_path / "result.json").read_text())
+    assert is_encoded(result)
+    return decode(result)
+
+
+def test_working_dirs_ship_the_same_transport():
+    with open(os.path.join(LAB_3, "vqe", "transport.py")) as vqe_copy, \
+            open(os.path.join(LAB_3, "transpile_parallel", "transport.py")) as transpile_copy:
+        assert vqe_copy.read() == transpile_copy.read()
+
+
+def test_vqe_main_with_encoded_arguments(tmp_path):
+    ansatz = EfficientSU2(2, reps=1).decompose()
+    operator = SparsePauliOp(["ZI", "IZ", "XX"], [1, 1, 0.5])
+    result = run_main(tmp_path, "vqe", "vqe", {
+        "ansatz": ansatz,
+        "operator": operator,
+        "initial_parameters": np.full(ansatz.num_parameters, 0.1),
+        "local_estimator": "aer",
+        "method": "COBYLA",
+    })
+    assert result["iters"] == len(result["cost_history"]) > 0
+    exact = Statevector(ansatz.assign_parameters(result["optimal_point"])).expectation_value(operator).real
+    assert result["optimal_value"] == pytest.approx(exact, abs=1e-9)
+    assert result["optimal_value"] == pytest.approx(min(result["cost_history"]), abs=1e-9)
+
+
+def test_transpile_parallel_main_with_encoded_arguments(tmp_path):
+    circuits = [EfficientSU2(3, reps=1).decompose().assign_parameters(np.linspace(0, 1, 12) + k)
+                for k in range(2)]
+    result = run_main(tmp_path, "transpile_parallel", "transpile_parallel", {
+        "circuits": circuits,
+        "backend_name": "fake_manila",
+        "transpiler_service": False,
+    })
+    transpiled = result["transpiled_circuits"]
+    # One circuit per optimization level 1, 2 and 3, for every input circuit
+    assert len(transpiled) == 3 * len(circuits)
+    observables = [SparsePauliOp(label) for label in ["ZZI", "XIX", "IYZ"]]
+    for k, circ in enumerate(transpiled):
+        expected = [Statevector(circuits[k // 3]).expectation_value(obs).real for obs in observables]
+        pubs = [(circ, obs.apply_layout(circ.layout)) for obs in observables]
+        evs = [float(pub.data.evs) for pub in StatevectorEstimator().run(pubs).result()]
+        assert evs == pytest.approx(expected, abs=1e-9)
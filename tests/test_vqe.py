@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+from qiskit.circuit.library import EfficientSU2
+from qiskit.primitives import StatevectorEstimator
+from qiskit.quantum_info import SparsePauliOp, Statevector
+from qiskit_ibm_runtime.fake_provider import FakeManilaV2
+
+import vqe
+
+
+def exact_energy(ansatz, operator, params):
+    return Statevector(ansatz.assign_parameters(params)).expectation_value(operator).real
+
+
+def test_prepare_batch_lays_out_operators_as_wide_as_the_backend():
+    # 5 virtual qubits on the 5-qubit FakeManilaV2: equal widths, permuted by layout and routing
+    ansatz = EfficientSU2(5, entanglement="full", reps=1)
+    operators = [
+        SparsePauliOp(["ZZIII", "IXXIZ", "YIIIY"], [1, 0.5, 0.3]),
+        SparsePauliOp(["IIIIZ", "ZIIII"], [1, -1]),
+    ]
+    isa, laid_out = vqe.prepare_batch(ansatz, operators, FakeManilaV2())
+    params = np.linspace(0, 1, ansatz.num_parameters)
+    for operator, physical in zip(operators, laid_out):
+        assert physical == operator.apply_layout(isa.layout)
+        energy = StatevectorEstimator().run([(isa, physical, params)]).result()[0].data.evs
+        assert float(energy) == pytest.approx(exact_energy(ansatz, operator, params), abs=1e-9)
+
+
+def test_prepare_batch_keeps_physical_operators():
+    ansatz = EfficientSU2(5, reps=1)
+    isa, _ = vqe.prepare_batch(ansatz, [], FakeManilaV2())
+    physical = [SparsePauliOp(["ZIIII"])]
+    assert vqe.prepare_batch(isa, physical, virtual=False)[1] == physical
+    with pytest.raises(ValueError):
+        vqe.prepare_batch(isa, [SparsePauliOp(["ZII"])], virtual=False)
+
+
+def test_run_vqe_batch_matches_separate_runs():
+    ansatz = EfficientSU2(2, reps=1)
+    operators = [SparsePauliOp(["ZI", "IZ", "XX"], [1, 1, g]) for g in (0.0, 0.5)]
+    starts = [np.full(ansatz.num_parameters, 0.1 * (k + 1)) for k in range(len(operators))]
+    estimator = StatevectorEstimator()
+    batched = vqe.run_vqe_batch(starts, ansatz, operators, estimator, "COBYLA")
+    for start, operator, (result, callback_dict) in zip(starts, operators, batched):
+        single, _ = vqe.run_vqe(start, ansatz, operator, estimator, "COBYLA")
+        assert result.fun == pytest.approx(single.fun, abs=1e-12)
+        assert callback_dict["iters"] == single.nfev
+        assert result.fun == pytest.approx(exact_energy(ansatz, operator, result.x), abs=1e-9)